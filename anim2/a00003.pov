@@ -0,0 +1,137 @@
+// this file is generated
+// from pypovlib V0.1.22 written by Oliver Cordes (C) 2015-2020
+
+// set the povray version for this file
+#version 3.7;
+
+
+camera{
+    perspective
+    location <20.000000,5.000000,-10.000000>
+    look_at <20.000000,0.000000,0.000000>
+    sky <0.000000,1.000000,0.000000>
+    angle 60.000000
+    right x * image_width/image_height
+}
+
+union{
+    // Union Item #11
+    sphere{
+        <-10.000000,0.000000,50.000000>, 1.000000
+    }
+    split_union off
+}
+union{
+    // Union Item #9
+    sphere{
+        <0.000000,0.000000,30.000000>, 1.000000
+    }
+    // Union Item #10
+    sphere{
+        <0.000000,0.000000,40.000000>, 1.000000
+    }
+    // Union Item #11
+    sphere{
+        <0.000000,0.000000,50.000000>, 1.000000
+    }
+    split_union off
+}
+union{
+    // Union Item #7
+    sphere{
+        <10.000000,0.000000,10.000000>, 1.000000
+    }
+    // Union Item #8
+    sphere{
+        <10.000000,0.000000,20.000000>, 1.000000
+    }
+    // Union Item #9
+    sphere{
+        <10.000000,0.000000,30.000000>, 1.000000
+    }
+    // Union Item #10
+    sphere{
+        <10.000000,0.000000,40.000000>, 1.000000
+    }
+    // Union Item #11
+    sphere{
+        <10.000000,0.000000,50.000000>, 1.000000
+    }
+    split_union off
+}
+union{
+    // Union Item #6
+    sphere{
+        <20.000000,0.000000,0.000000>, 1.000000
+    }
+    // Union Item #7
+    sphere{
+        <20.000000,0.000000,10.000000>, 1.000000
+    }
+    // Union Item #8
+    sphere{
+        <20.000000,0.000000,20.000000>, 1.000000
+    }
+    // Union Item #9
+    sphere{
+        <20.000000,0.000000,30.000000>, 1.000000
+    }
+    // Union Item #10
+    sphere{
+        <20.000000,0.000000,40.000000>, 1.000000
+    }
+    // Union Item #11
+    sphere{
+        <20.000000,0.000000,50.000000>, 1.000000
+    }
+    split_union off
+}
+union{
+    // Union Item #7
+    sphere{
+        <30.000000,0.000000,10.000000>, 1.000000
+    }
+    // Union Item #8
+    sphere{
+        <30.000000,0.000000,20.000000>, 1.000000
+    }
+    // Union Item #9
+    sphere{
+        <30.000000,0.000000,30.000000>, 1.000000
+    }
+    // Union Item #10
+    sphere{
+        <30.000000,0.000000,40.000000>, 1.000000
+    }
+    // Union Item #11
+    sphere{
+        <30.000000,0.000000,50.000000>, 1.000000
+    }
+    split_union off
+}
+union{
+    // Union Item #9
+    sphere{
+        <40.000000,0.000000,30.000000>, 1.000000
+    }
+    // Union Item #10
+    sphere{
+        <40.000000,0.000000,40.000000>, 1.000000
+    }
+    // Union Item #11
+    sphere{
+        <40.000000,0.000000,50.000000>, 1.000000
+    }
+    split_union off
+}
+union{
+    // Union Item #11
+    sphere{
+        <50.000000,0.000000,50.000000>, 1.000000
+    }
+    split_union off
+}
+
+
+
+// end of generated file
@@ -0,0 +1,555 @@
+// this file is generated
+// from pypovlib V0.1.22 written by Oliver Cordes (C) 2015-2020
+
+// set the povray version for this file
+#version 3.7;
+
+
+camera{
+    perspective
+    location <0.000000,5.000000,-10.000000>
+    look_at <0.000000,0.000000,0.000000>
+    sky <0.000000,1.000000,0.000000>
+    angle 60.000000
+    right x * image_width/image_height
+}
+
+union{
+    // Union Item #1
+    sphere{
+        <-50.000000,0.000000,-50.000000>, 1.000000
+    }
+    // Union Item #2
+    sphere{
+        <-50.000000,0.000000,-40.000000>, 1.000000
+    }
+    // Union Item #3
+    sphere{
+        <-50.000000,0.000000,-30.000000>, 1.000000
+    }
+    // Union Item #4
+    sphere{
+        <-50.000000,0.000000,-20.000000>, 1.000000
+    }
+    // Union Item #5
+    sphere{
+        <-50.000000,0.000000,-10.000000>, 1.000000
+    }
+    // Union Item #6
+    sphere{
+        <-50.000000,0.000000,0.000000>, 1.000000
+    }
+    // Union Item #7
+    sphere{
+        <-50.000000,0.000000,10.000000>, 1.000000
+    }
+    // Union Item #8
+    sphere{
+        <-50.000000,0.000000,20.000000>, 1.000000
+    }
+    // Union Item #9
+    sphere{
+        <-50.000000,0.000000,30.000000>, 1.000000
+    }
+    // Union Item #10
+    sphere{
+        <-50.000000,0.000000,40.000000>, 1.000000
+    }
+    // Union Item #11
+    sphere{
+        <-50.000000,0.000000,50.000000>, 1.000000
+    }
+    split_union off
+}
+union{
+    // Union Item #1
+    sphere{
+        <-40.000000,0.000000,-50.000000>, 1.000000
+    }
+    // Union Item #2
+    sphere{
+        <-40.000000,0.000000,-40.000000>, 1.000000
+    }
+    // Union Item #3
+    sphere{
+        <-40.000000,0.000000,-30.000000>, 1.000000
+    }
+    // Union Item #4
+    sphere{
+        <-40.000000,0.000000,-20.000000>, 1.000000
+    }
+    // Union Item #5
+    sphere{
+        <-40.000000,0.000000,-10.000000>, 1.000000
+    }
+    // Union Item #6
+    sphere{
+        <-40.000000,0.000000,0.000000>, 1.000000
+    }
+    // Union Item #7
+    sphere{
+        <-40.000000,0.000000,10.000000>, 1.000000
+    }
+    // Union Item #8
+    sphere{
+        <-40.000000,0.000000,20.000000>, 1.000000
+    }
+    // Union Item #9
+    sphere{
+        <-40.000000,0.000000,30.000000>, 1.000000
+    }
+    // Union Item #10
+    sphere{
+        <-40.000000,0.000000,40.000000>, 1.000000
+    }
+    // Union Item #11
+    sphere{
+        <-40.000000,0.000000,50.000000>, 1.000000
+    }
+    split_union off
+}
+union{
+    // Union Item #1
+    sphere{
+        <-30.000000,0.000000,-50.000000>, 1.000000
+    }
+    // Union Item #2
+    sphere{
+        <-30.000000,0.000000,-40.000000>, 1.000000
+    }
+    // Union Item #3
+    sphere{
+        <-30.000000,0.000000,-30.000000>, 1.000000
+    }
+    // Union Item #4
+    sphere{
+        <-30.000000,0.000000,-20.000000>, 1.000000
+    }
+    // Union Item #5
+    sphere{
+        <-30.000000,0.000000,-10.000000>, 1.000000
+    }
+    // Union Item #6
+    sphere{
+        <-30.000000,0.000000,0.000000>, 1.000000
+    }
+    // Union Item #7
+    sphere{
+        <-30.000000,0.000000,10.000000>, 1.000000
+    }
+    // Union Item #8
+    sphere{
+        <-30.000000,0.000000,20.000000>, 1.000000
+    }
+    // Union Item #9
+    sphere{
+        <-30.000000,0.000000,30.000000>, 1.000000
+    }
+    // Union Item #10
+    sphere{
+        <-30.000000,0.000000,40.000000>, 1.000000
+    }
+    // Union Item #11
+    sphere{
+        <-30.000000,0.000000,50.000000>, 1.000000
+    }
+    split_union off
+}
+union{
+    // Union Item #1
+    sphere{
+        <-20.000000,0.000000,-50.000000>, 1.000000
+    }
+    // Union Item #2
+    sphere{
+        <-20.000000,0.000000,-40.000000>, 1.000000
+    }
+    // Union Item #3
+    sphere{
+        <-20.000000,0.000000,-30.000000>, 1.000000
+    }
+    // Union Item #4
+    sphere{
+        <-20.000000,0.000000,-20.000000>, 1.000000
+    }
+    // Union Item #5
+    sphere{
+        <-20.000000,0.000000,-10.000000>, 1.000000
+    }
+    // Union Item #6
+    sphere{
+        <-20.000000,0.000000,0.000000>, 1.000000
+    }
+    // Union Item #7
+    sphere{
+        <-20.000000,0.000000,10.000000>, 1.000000
+    }
+    // Union Item #8
+    sphere{
+        <-20.000000,0.000000,20.000000>, 1.000000
+    }
+    // Union Item #9
+    sphere{
+        <-20.000000,0.000000,30.000000>, 1.000000
+    }
+    // Union Item #10
+    sphere{
+        <-20.000000,0.000000,40.000000>, 1.000000
+    }
+    // Union Item #11
+    sphere{
+        <-20.000000,0.000000,50.000000>, 1.000000
+    }
+    split_union off
+}
+union{
+    // Union Item #1
+    sphere{
+        <-10.000000,0.000000,-50.000000>, 1.000000
+    }
+    // Union Item #2
+    sphere{
+        <-10.000000,0.000000,-40.000000>, 1.000000
+    }
+    // Union Item #3
+    sphere{
+        <-10.000000,0.000000,-30.000000>, 1.000000
+    }
+    // Union Item #4
+    sphere{
+        <-10.000000,0.000000,-20.000000>, 1.000000
+    }
+    // Union Item #5
+    sphere{
+        <-10.000000,0.000000,-10.000000>, 1.000000
+    }
+    // Union Item #6
+    sphere{
+        <-10.000000,0.000000,0.000000>, 1.000000
+    }
+    // Union Item #7
+    sphere{
+        <-10.000000,0.000000,10.000000>, 1.000000
+    }
+    // Union Item #8
+    sphere{
+        <-10.000000,0.000000,20.000000>, 1.000000
+    }
+    // Union Item #9
+    sphere{
+        <-10.000000,0.000000,30.000000>, 1.000000
+    }
+    // Union Item #10
+    sphere{
+        <-10.000000,0.000000,40.000000>, 1.000000
+    }
+    // Union Item #11
+    sphere{
+        <-10.000000,0.000000,50.000000>, 1.000000
+    }
+    split_union off
+}
+union{
+    // Union Item #1
+    sphere{
+        <0.000000,0.000000,-50.000000>, 1.000000
+    }
+    // Union Item #2
+    sphere{
+        <0.000000,0.000000,-40.000000>, 1.000000
+    }
+    // Union Item #3
+    sphere{
+        <0.000000,0.000000,-30.000000>, 1.000000
+    }
+    // Union Item #4
+    sphere{
+        <0.000000,0.000000,-20.000000>, 1.000000
+    }
+    // Union Item #5
+    sphere{
+        <0.000000,0.000000,-10.000000>, 1.000000
+    }
+    // Union Item #6
+    sphere{
+        <0.000000,0.000000,0.000000>, 1.000000
+    }
+    // Union Item #7
+    sphere{
+        <0.000000,0.000000,10.000000>, 1.000000
+    }
+    // Union Item #8
+    sphere{
+        <0.000000,0.000000,20.000000>, 1.000000
+    }
+    // Union Item #9
+    sphere{
+        <0.000000,0.000000,30.000000>, 1.000000
+    }
+    // Union Item #10
+    sphere{
+        <0.000000,0.000000,40.000000>, 1.000000
+    }
+    // Union Item #11
+    sphere{
+        <0.000000,0.000000,50.000000>, 1.000000
+    }
+    split_union off
+}
+union{
+    // Union Item #1
+    sphere{
+        <10.000000,0.000000,-50.000000>, 1.000000
+    }
+    // Union Item #2
+    sphere{
+        <10.000000,0.000000,-40.000000>, 1.000000
+    }
+    // Union Item #3
+    sphere{
+        <10.000000,0.000000,-30.000000>, 1.000000
+    }
+    // Union Item #4
+    sphere{
+        <10.000000,0.000000,-20.000000>, 1.000000
+    }
+    // Union Item #5
+    sphere{
+        <10.000000,0.000000,-10.000000>, 1.000000
+    }
+    // Union Item #6
+    sphere{
+        <10.000000,0.000000,0.000000>, 1.000000
+    }
+    // Union Item #7
+    sphere{
+        <10.000000,0.000000,10.000000>, 1.000000
+    }
+    // Union Item #8
+    sphere{
+        <10.000000,0.000000,20.000000>, 1.000000
+    }
+    // Union Item #9
+    sphere{
+        <10.000000,0.000000,30.000000>, 1.000000
+    }
+    // Union Item #10
+    sphere{
+        <10.000000,0.000000,40.000000>, 1.000000
+    }
+    // Union Item #11
+    sphere{
+        <10.000000,0.000000,50.000000>, 1.000000
+    }
+    split_union off
+}
+union{
+    // Union Item #1
+    sphere{
+        <20.000000,0.000000,-50.000000>, 1.000000
+    }
+    // Union Item #2
+    sphere{
+        <20.000000,0.000000,-40.000000>, 1.000000
+    }
+    // Union Item #3
+    sphere{
+        <20.000000,0.000000,-30.000000>, 1.000000
+    }
+    // Union Item #4
+    sphere{
+        <20.000000,0.000000,-20.000000>, 1.000000
+    }
+    // Union Item #5
+    sphere{
+        <20.000000,0.000000,-10.000000>, 1.000000
+    }
+    // Union Item #6
+    sphere{
+        <20.000000,0.000000,0.000000>, 1.000000
+    }
+    // Union Item #7
+    sphere{
+        <20.000000,0.000000,10.000000>, 1.000000
+    }
+    // Union Item #8
+    sphere{
+        <20.000000,0.000000,20.000000>, 1.000000
+    }
+    // Union Item #9
+    sphere{
+        <20.000000,0.000000,30.000000>, 1.000000
+    }
+    // Union Item #10
+    sphere{
+        <20.000000,0.000000,40.000000>, 1.000000
+    }
+    // Union Item #11
+    sphere{
+        <20.000000,0.000000,50.000000>, 1.000000
+    }
+    split_union off
+}
+union{
+    // Union Item #1
+    sphere{
+        <30.000000,0.000000,-50.000000>, 1.000000
+    }
+    // Union Item #2
+    sphere{
+        <30.000000,0.000000,-40.000000>, 1.000000
+    }
+    // Union Item #3
+    sphere{
+        <30.000000,0.000000,-30.000000>, 1.000000
+    }
+    // Union Item #4
+    sphere{
+        <30.000000,0.000000,-20.000000>, 1.000000
+    }
+    // Union Item #5
+    sphere{
+        <30.000000,0.000000,-10.000000>, 1.000000
+    }
+    // Union Item #6
+    sphere{
+        <30.000000,0.000000,0.000000>, 1.000000
+    }
+    // Union Item #7
+    sphere{
+        <30.000000,0.000000,10.000000>, 1.000000
+    }
+    // Union Item #8
+    sphere{
+        <30.000000,0.000000,20.000000>, 1.000000
+    }
+    // Union Item #9
+    sphere{
+        <30.000000,0.000000,30.000000>, 1.000000
+    }
+    // Union Item #10
+    sphere{
+        <30.000000,0.000000,40.000000>, 1.000000
+    }
+    // Union Item #11
+    sphere{
+        <30.000000,0.000000,50.000000>, 1.000000
+    }
+    split_union off
+}
+union{
+    // Union Item #1
+    sphere{
+        <40.000000,0.000000,-50.000000>, 1.000000
+    }
+    // Union Item #2
+    sphere{
+        <40.000000,0.000000,-40.000000>, 1.000000
+    }
+    // Union Item #3
+    sphere{
+        <40.000000,0.000000,-30.000000>, 1.000000
+    }
+    // Union Item #4
+    sphere{
+        <40.000000,0.000000,-20.000000>, 1.000000
+    }
+    // Union Item #5
+    sphere{
+        <40.000000,0.000000,-10.000000>, 1.000000
+    }
+    // Union Item #6
+    sphere{
+        <40.000000,0.000000,0.000000>, 1.000000
+    }
+    // Union Item #7
+    sphere{
+        <40.000000,0.000000,10.000000>, 1.000000
+    }
+    // Union Item #8
+    sphere{
+        <40.000000,0.000000,20.000000>, 1.000000
+    }
+    // Union Item #9
+    sphere{
+        <40.000000,0.000000,30.000000>, 1.000000
+    }
+    // Union Item #10
+    sphere{
+        <40.000000,0.000000,40.000000>, 1.000000
+    }
+    // Union Item #11
+    sphere{
+        <40.000000,0.000000,50.000000>, 1.000000
+    }
+    split_union off
+}
+union{
+    // Union Item #1
+    sphere{
+        <50.000000,0.000000,-50.000000>, 1.000000
+    }
+    // Union Item #2
+    sphere{
+        <50.000000,0.000000,-40.000000>, 1.000000
+    }
+    // Union Item #3
+    sphere{
+        <50.000000,0.000000,-30.000000>, 1.000000
+    }
+    // Union Item #4
+    sphere{
+        <50.000000,0.000000,-20.000000>, 1.000000
+    }
+    // Union Item #5
+    sphere{
+        <50.000000,0.000000,-10.000000>, 1.000000
+    }
+    // Union Item #6
+    sphere{
+        <50.000000,0.000000,0.000000>, 1.000000
+    }
+    // Union Item #7
+    sphere{
+        <50.000000,0.000000,10.000000>, 1.000000
+    }
+    // Union Item #8
+    sphere{
+        <50.000000,0.000000,20.000000>, 1.000000
+    }
+    // Union Item #9
+    sphere{
+        <50.000000,0.000000,30.000000>, 1.000000
+    }
+    // Union Item #10
+    sphere{
+        <50.000000,0.000000,40.000000>, 1.000000
+    }
+    // Union Item #11
+    sphere{
+        <50.000000,0.000000,50.000000>, 1.000000
+    }
+    split_union off
+}
+union{
+    // Union Item #1
+    sphere{
+        <0.000000,0.000000,0.000000>, 1.000000
+        translate <100.000000,0.000000,0.000000>
+    }
+    rotate <0.000000,180.000000,0.000000>
+    split_union off
+}
+union{
+    // Union Item #1
+    sphere{
+        <0.000000,0.000000,0.000000>, 1.000000
+        translate <-100.000000,0.000000,0.000000>
+    }
+    rotate <0.000000,180.000000,0.000000>
+    split_union off
+}
+
+
+
+// end of generated file
@@ -1,10 +1,11 @@
 # __init__.py for pypovlib
 #
 # written by: Oliver Cordes 2015-06-06
-# changed by: Oliver Cordes 2019-03-04
+# changed by: Oliver Cordes 2020-05-16
 
 # from pypovobjects import *
 
 __all__= [ 'pypovbase', 'pypovobjects', 'pypovtextures', 'pypovlights',
             'pypovcamera', 'pypovanimation', 'pypovweather',
-            'pypovgenerator', 'pypovrayqueue' ]
+            'pypovgenerator', 'pypovrayqueue', 'pypovmeshio',
+            'pypovbvh' ]
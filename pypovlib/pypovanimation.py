@@ -1,7 +1,7 @@
 # pypovanimation.py
 
 # wirtten by: Oliver Cordes 2015-07-17
-# changed by: Oliver Cordes 2018-04-19
+# changed by: Oliver Cordes 2020-05-16
 
 #
 import sys
@@ -14,11 +14,33 @@ except:
 
 
 from pypovlib.pypovobjects import *
+from pypovlib.pypovobjects import _write_prefix_file, _write_postfix_file
 
 import sys, os
+import multiprocessing
 
 # constants
 
+# the animation which is written by the worker processes, the workers
+# are forked and inherit the complete scene
+_worker_animation = None
+
+
+# helper functions
+
+"""
+frame_random
+
+returns a random generator which depends only on the frame number and
+the keys, so each frame gets the same random numbers in every run and
+in every worker process
+
+:param framenr : number of the frame
+:param keys    : additional integers, e.g. to give objects their own stream
+"""
+def frame_random(framenr, *keys):
+    return np.random.default_rng([framenr] + list(keys))
+
 
 # class
 
@@ -26,8 +48,12 @@ class PovAnimation( PovFile ):
     def __init__(self, directory='.',
                        name_prefix='animation',
                        camera_optimize=False,
-                       verbose=False,):
-        PovFile.__init__(self, camera_optimize=camera_optimize, verbose=verbose)
+                       verbose=False,
+                       cache=False,
+                       static_include=False,
+                       jobs=1):
+        PovFile.__init__(self, camera_optimize=camera_optimize, verbose=verbose,
+                         cache=cache)
 
         self._directory   = directory
         self._name_prefix = name_prefix
@@ -36,6 +62,17 @@ class PovAnimation( PovFile ):
         self._duration    = None
         self._frames      = None
 
+        self._static_include = static_include
+        self._static_file    = None
+        self._dynamic_items  = None
+
+        self._jobs           = jobs
+
+        # files which are shared by all frames
+        self.shared_files    = []
+        # extra files of each frame, e.g. the array data files
+        self.frame_extra_files = {}
+
 
     def set_fps(self, fps):
         if fps is not None:
@@ -52,6 +89,86 @@ class PovAnimation( PovFile ):
             self._frames = frames
 
 
+    def set_static_include(self, static_include):
+        self._static_include = static_include
+
+
+    def set_jobs(self, jobs):
+        if jobs is not None:
+            self._jobs = jobs
+
+
+    """
+    write_static_include
+
+    splits the top-level items into static and animated ones and writes
+    everything which is the same in all frames, the global settings,
+    includes, macros, declares, static objects and their lights and the
+    global lights into a shared include file
+
+    the include is registered in shared_files; the RayQueue service has
+    no project wide files, so RQPovAnimation still packs and uploads it
+    with the archive of every single frame
+
+    :param filename : name of the shared include file
+    """
+    def write_static_include(self, filename):
+        static_items  = []
+        dynamic_items = []
+        for i in self._items:
+            if i.has_animation():
+                dynamic_items.append(i)
+            else:
+                static_items.append(i)
+
+        f = self._open_emitter(filename)
+        _write_prefix_file(f)
+
+        self._write_header(f)
+        self._write_scene_declares(f, static_items, filename)
+        self._write_objects(f, static_items)
+        self._write_lights(f, static_items)
+
+        _write_postfix_file(f)
+        f.close()
+
+        print('Static include \'%s\' written (%i static, %i animated objects)' % (filename, len(static_items), len(dynamic_items)))
+
+        self._static_file   = filename
+        self._dynamic_items = dynamic_items
+        if filename not in self.shared_files:
+            self.shared_files.append(filename)
+
+
+    def write_povfile(self, filename=None, submit=True):
+        if self._static_file is None:
+            PovFile.write_povfile(self, filename=filename, submit=submit)
+            return
+
+        if filename != None:
+            self.set_filename(filename)
+
+        f = self._open_emitter(self._filename)
+        _write_prefix_file(f)
+
+        f.write('// set the povray version for this file\n')
+        f.write('#version %s;\n\n' % self._version)
+
+        f.write('#include "%s"\n\n' % self._static_file)
+
+        self._write_scene_declares(f, self._dynamic_items)
+
+        self._write_camera(f)
+        self._start_culling(f)
+        self._write_objects(f, self._dynamic_items)
+        self._stop_culling(f)
+        self._write_lights(f, self._dynamic_items, global_lights=False)
+
+        self._write_footer(f)
+
+        f.close()
+
+
     def update_timeline( self, time_abs, time_delta, fnr ):
         for i in self._items:
             i.update_timeline( time_abs, time_delta, fnr )
@@ -76,9 +193,50 @@ class PovAnimation( PovFile ):
             self._camera.update_timedelta(time_delta)
 
 
+    def update_properties(self, time_abs, framenr):
+        for i in self._items:
+            if hasattr(i, 'update_properties'):
+                i.update_properties(time_abs, framenr)
+
+        if self._lights is not None:
+            for i in self._lights:
+                i.update_properties(time_abs, framenr)
+
+        if self._camera is not None:
+            self._camera.update_properties(time_abs, framenr)
+
+
+    """
+    needs_timeline
+
+    returns True if any object is changed by the update_* methods, then
+    a frame can only be created after all frames before it were
+    calculated. Otherwise the frames depend only on the time functions
+    and can be created in any order.
+    """
+    def needs_timeline(self):
+        for i in self._items:
+            if getattr(i, 'needs_timeline', None) is None:
+                return True
+            if i.needs_timeline():
+                return True
+
+        if self._lights is not None:
+            for i in self._lights:
+                if i.needs_timeline():
+                    return True
+
+        if self._camera is not None:
+            return self._camera.needs_timeline()
+
+        return False
+
+
     def update_frame(self, framenr):
         for i in self._items:
             i.update_frame(framenr)
+            if i.is_animated():
+                i.invalidate()
 
         if self._camera is not None:
             self._camera.update_frame(framenr)
@@ -106,12 +264,122 @@ class PovAnimation( PovFile ):
         return frames, time_delta
 
 
-    def animate(self, frames = None, duration = None, fps = None, submit=False):
+    """
+    _frame_written
+
+    called in the main process for every finished frame file
+
+    :param filename : name of the frame file
+    """
+    def _frame_written(self, filename):
+        pass
+
+
+    def _frame_filename(self, fnr):
+        return '%s/%s%05i.pov' % (self._directory, self._name_prefix, fnr)
+
+
+    """
+    _write_frames
+
+    writes the frames start ... stop-1. If the scene needs the timeline
+    all frames before start are calculated first, so the state of each
+    frame is the same as in a sequential run. The time functions get
+    framenr * time_delta as time
+
+    :param frames     : total number of frames
+    :param time_delta : time between two frames
+    :param start      : first frame to write
+    :param stop       : frame after the last frame to write
+    :param worker     : True in a worker process, which neither prints
+                        the progress nor reports the written files
+    """
+    def _write_frames(self, frames, time_delta, start, stop, worker=False):
+        if self.needs_timeline():
+            first = 0
+        else:
+            first = start
+        time_abs = first * time_delta
+
+        print_skip = frames // 100.
+        for fnr in range(first, stop):
+            self.update_properties(fnr * time_delta, fnr)
+
+            if fnr >= start:
+                if (not worker) and (frames < 100):
+                    print('creating frame %i/%i ...' % ( fnr+1, frames ), end=' ')
+
+                self.write_povfile(self._frame_filename(fnr))
+                self.frame_extra_files[self._filename] = list(self.extra_files or ())
+                if not worker:
+                    self._frame_written(self._filename)
+
+            self.update_timeline(time_abs, time_delta, fnr)
+
+            self.update_time(time_abs)
+            self.update_timedelta(time_delta)
+            self.update_frame(fnr)
+
+            # prepare the next step
+            time_abs += time_delta
+
+            if (not worker) and (fnr >= start):
+                if (frames  < 100):
+                    print('Done.')
+                else:
+                    if (( fnr % print_skip ) == 0):
+                        print('creating %i/%i frames done.' % ( fnr+1, frames))
+
+
+    def _write_frames_parallel(self, frames, time_delta, jobs, start, stop):
+        global _worker_animation
+
+        try:
+            context = multiprocessing.get_context('fork')
+        except ValueError:
+            print('Warning: no fork on this system, frames are written sequentially')
+            self._write_frames(frames, time_delta, start, stop)
+            return
+
+        # contiguous frame ranges, with the timeline each worker has to
+        # calculate all frames before its range
+        bounds = np.linspace(start, stop, jobs+1).astype(int)
+        ranges = [(frames, time_delta, bounds[i], bounds[i+1])
+                    for i in range(jobs) if bounds[i] < bounds[i+1]]
+
+        _worker_animation = self
+        try:
+            with context.Pool(len(ranges)) as pool:
+                for start, stop, stats, extra_files in pool.imap(_write_frames_worker, ranges):
+                    _add_statistics(stats)
+                    self.frame_extra_files.update(extra_files)
+                    for fnr in range(start, stop):
+                        self._frame_written(self._frame_filename(fnr))
+                    print('creating %i-%i/%i frames done.' % (start+1, stop, frames))
+        finally:
+            _worker_animation = None
+
+
+    """
+    animate
+
+    writes all frames of the animation or the frames of frame_range
+
+    :param frames      : number of frames
+    :param duration    : duration of the animation in seconds
+    :param fps         : frames per second
+    :param jobs        : number of processes which write the frames
+    :param frame_range : (start, stop) writes only the frames start ... stop-1,
+                         e.g. for a shard of the animation
+    """
+    def animate(self, frames = None, duration = None, fps = None, submit=False,
+                      jobs = None, frame_range = None):
         # overwrite given parameters from pypovapp even if the
         # combination of variables are wrong
         self.set_frames(frames)
         self.set_duration(duration)
         self.set_fps(fps)
+        self.set_jobs(jobs)
 
         # create/check directory
         if not os.path.exists( self._directory ):
@@ -128,33 +396,76 @@ class PovAnimation( PovFile ):
             # something wrong
             return False
 
-        time_abs = 0.0
+        if self._cache:
+            reset_cache_statistics()
+        if self._camera_optimize:
+            reset_culling_statistics()
+
+        if self._static_include:
+            self.write_static_include('%s/%s_static.inc' % (self._directory, self._name_prefix))
+        else:
+            self._static_file = None
 
         print('Create an animation for %i frames with a time delta of %.2fs between images' % (frames, time_delta))
 
-        print_skip = frames // 100.
-        for fnr in range(frames):
-            if (frames < 100):
-                print('creating frame %i/%i ...' % ( fnr+1, frames ), end=' ')
-            else:
-                pass
+        if frame_range is None:
+            start, stop = 0, frames
+        else:
+            start, stop = max(frame_range[0], 0), min(frame_range[1], frames)
+            print('Writing frames %i-%i' % (start+1, stop))
+            if (start > 0) and self.needs_timeline():
+                print('Warning: the scene uses update methods, all frames before %i are calculated' % (start+1))
+
+        jobs = min(self._jobs, stop-start)
+        if jobs > 1:
+            print('Using %i processes' % jobs)
+            self._write_frames_parallel(frames, time_delta, jobs, start, stop)
+        else:
+            self._write_frames(frames, time_delta, start, stop)
 
-            fname = '%s/%s%05i.pov' % (self._directory, self._name_prefix, fnr)
+        if self._cache:
+            print_cache_statistics()
+        if self._camera_optimize:
+            print_culling_statistics()
 
-            self.write_povfile(fname)
-            self.update_timeline(time_abs, time_delta, fnr)
+        return True
 
-            self.update_time(time_abs)
-            self.update_timedelta(time_delta)
-            self.update_frame(fnr)
 
-            # prepare the next step
-            time_abs += time_delta
+    """
+    write_frame
 
-            if (frames  < 100):
-                print('Done.')
-            else:
-                if (( fnr % print_skip ) == 0):
-                    print('creating %i/%i frames done.' % ( fnr+1, frames))
+    writes a single frame of the animation, e.g. to replace a broken
+    frame file
 
-        return True
+    :param framenr : number of the frame, starting with 0
+    """
+    def write_frame(self, framenr, frames = None, duration = None, fps = None):
+        return self.animate(frames=frames, duration=duration, fps=fps,
+                            frame_range=(framenr, framenr+1))
+
+
+# parallel frame generation
+
+def _statistics():
+    return (pypovcachestatistics, pypovcullingstatistics, pypovwriterstatistics)
+
+
+def _add_statistics(stats):
+    for total, part in zip(_statistics(), stats):
+        for key, value in part.items():
+            total[key] += value
+
+
+def _write_frames_worker(args):
+    frames, time_delta, start, stop = args
+
+    # count only the work of this worker
+    for stats in _statistics():
+        for key in stats:
+            stats[key] = 0
+
+    _worker_animation._write_frames(frames, time_delta, start, stop,
+                                    worker=True)
+
+    return start, stop, [dict(stats) for stats in _statistics()], \
+        _worker_animation.frame_extra_files
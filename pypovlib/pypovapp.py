@@ -3,12 +3,13 @@
 pypovlib/pypovapp.py
 
 written by: Oliver Cordes 2019-04-14
-changed by: Oliver Cordes 2020-04-04
+changed by: Oliver Cordes 2020-05-16
 
 """
 
 
-from pypovlib.pypovobjects import PovFile, print_statistics
+from pypovlib.pypovobjects import PovFile, print_statistics, \
+                                  print_writer_statistics
 from pypovlib.pypovrayqueue import RQPovFile, RQPovAnimation
 
 
@@ -27,6 +28,8 @@ class PovApp(object):
         self._has_rq          = False
         self._rq_config       = None
         self._rq_project_name = None
+        self._compact         = False
+        self._jobs            = 1
 
         self._build_list = []
 
@@ -45,6 +48,10 @@ class PovApp(object):
                 self._directory = value
             elif key == 'rq_project_name':
                 self._rq_project_name = value
+            elif key == 'compact':
+                self._compact = value
+            elif key == 'jobs':
+                self._jobs = value
 
 
         if self._type == PovApp_Image:
@@ -61,6 +68,7 @@ class PovApp(object):
                                                 rq_project_name=self._rq_project_name)
             else:
                 self._povfile = PovAnimation(directory=self._directory)
+            self._povfile.set_jobs(self._jobs)
 
 
         else:
@@ -70,6 +78,7 @@ class PovApp(object):
         # create link to settings
         if self._povfile is not None:
             self.settings = self._povfile.settings
+            self._povfile.set_compact(self._compact)
 
 
     def build(self, **kwargs):
@@ -87,6 +96,7 @@ class PovApp(object):
                 self._povfile.write_povfile(submit=False)
             elif self._type == PovApp_Animation:
                 self._povfile.animate(submit=False)
+        print_writer_statistics()
 
 
     def run(self, **kwargs):
@@ -95,6 +105,7 @@ class PovApp(object):
                 self._povfile.write_povfile()
             elif self._type == PovApp_Animation:
                 self._povfile.animate()
+        print_writer_statistics()
 
 
 
@@ -110,6 +121,11 @@ class PovApp(object):
             self._povfile.set_prefix_file(filename)
 
 
+    def set_compact(self, compact):
+        if self._povfile is not None:
+            self._povfile.set_compact(compact)
+
+
     def set_camera(self, camera):
         if self._povfile is not None:
             self._povfile.set_camera(camera)
@@ -1,7 +1,7 @@
 # pypovobjects.py
 
 # written by: Oliver Cordes 2015-02-27
-# changed by: Oliver Cordes 2020-05-03
+# changed by: Oliver Cordes 2020-05-16
 
 import sys, os
 
@@ -18,9 +18,23 @@ except:
 _indent_char = ' '
 _indent_nr   = 4
 
-_fmt_key_float  = '{:s} {:6f}\n'
-_fmt_key_int    = '{:s} {:d}\n'
-_fmt_key_vector = '{:s} <{:6f},{:6f},{:6f}>\n'
+_fmt_key_float  = '%s %f\n'
+_fmt_key_int    = '%s %i\n'
+_fmt_key_vector = '%s <%f,%f,%f>\n'
+_fmt_full_matrix = 'matrix <' + ','.join( [ '%f' ] * 12 ) + '>\n'
+
+# default size of the output chunks of the PovEmitter in characters
+_emitter_chunk_size = 1 << 20
+
+# cache for the indent prefixes
+_indent_cache = {}
+
+# the compact output mode rounds all numbers to the six decimals of %f
+# and writes them with the shortest representation, see compact_value
+# and compact_rows
+_compact_float   = '%.15g'
+_compact_formats = {}
+_compact_lines   = {}
 
 
 # helper funtions
@@ -29,27 +43,23 @@ rot_axis_X = np.array([1.,0.,0.])
 rot_axis_Y = np.array([0.,1.,0.])
 rot_axis_Z = np.array([0.,0.,1.])
 
-def create_rotation_matrix(vector, angle):
-    angle = angle * np.pi / 180.
-    matrix = np.zeros(9).reshape((3,3))
+def rotation_matrices(vector, angles):
+    # (N,3,3) rotation matrices around the axis vector for all angles,
+    # in the convention of POV-Ray, see pov_rotate_matrix
+    angles = np.asarray(angles, dtype=float).reshape(-1) * np.pi / 180.
+    u = np.asarray(vector, dtype=float)
+    cos_a = np.cos(angles)[:,None,None]
+    sin_a = np.sin(angles)[:,None,None]
 
-    u_x = vector[0]
-    u_y = vector[1]
-    u_z = vector[2]
-    cos_a = np.cos(angle)
-    sin_a = np.sin(angle)
+    cross = np.array([[0., u[2], -u[1]],
+                      [-u[2], 0., u[0]],
+                      [u[1], -u[0], 0.]])
+    return (u[:,None] * u[None,:]) * (1.-cos_a) + cross * sin_a \
+        + np.identity(3) * cos_a
 
-    matrix[0,0] = cos_a + u_x**2 * (1.-cos_a)
-    matrix[0,1] = u_x * u_y * (1.-cos_a) - u_z * sin_a
-    matrix[0,2] = u_x * u_z * (1.-cos_a) + u_y * sin_a
-    matrix[1,0] = u_y * u_x * (1.-cos_a) + u_z * sin_a
-    matrix[1,1] = cos_a + u_y**2 * (1.-cos_a)
-    matrix[1,2] = u_y * u_z * (1.-cos_a) - u_x * sin_a
-    matrix[2,0] = u_z * u_x * (1.-cos_a) - u_y * sin_a
-    matrix[2,1] = u_z * u_y * (1.-cos_a) + u_x * sin_a
-    matrix[2,2] = cos_a + u_z**2 * (1.-cos_a)
 
-    return Matrix3D(rotation=matrix)
+def create_rotation_matrix(vector, angle):
+    return Matrix3D(rotation=rotation_matrices(vector, angle)[0])
 
 
 def get_rot_axes(x1, x2, y1, y2):
@@ -70,27 +80,15 @@ def get_rot_axes(x1, x2, y1, y2):
 
 
 def angle_Z(angle):
-    angle = angle * np.pi / 180.
-    return Matrix3D(np.array([np.cos(angle), -np.sin(angle), 0.,
-                              np.sin(angle), np.cos(angle), 0.,
-                              0., 0., 1.,
-                              0., 0., 0. ]))
+    return Matrix3D.from_matrix(pov_rotate_matrix([0., 0., angle]))
 
 
 def angle_Y(angle):
-    angle = angle * np.pi / 180.
-    return Matrix3D(np.array([np.cos(angle), 0., np.sin(angle),
-                              0., 1., 0.,
-                              -np.sin(angle), 0., np.cos(angle),
-                              0., 0., 0.]))
+    return Matrix3D.from_matrix(pov_rotate_matrix([0., angle, 0.]))
 
 
 def angle_X(angle):
-    angle = angle * np.pi / 180.
-    return Matrix3D(np.array([1., 0., 0.,
-                              0., np.cos(angle), -np.sin(angle),
-                              0., np.sin(angle), np.cos(angle),
-                              0., 0., 0.]))
+    return Matrix3D.from_matrix(pov_rotate_matrix([angle, 0., 0.]))
 
 
 def convert2vector( val ):
@@ -134,112 +132,523 @@ def convertarray2full_matrix( val ):
     raise TypeError( 'val is not any value with 12 elements' )
 
 
+def appended( items, item ):
+    # attribute lists are empty tuples until the first item is added,
+    # this saves the allocation of the lists for most of the objects
+    if isinstance( items, tuple ):
+        items = list( items )
+    items.append( item )
+    return items
+
+
+# transformations and bounding boxes
+#
+# transformations are 4x4 matrices in the convention of POV-Ray, points
+# are row vectors which are multiplied from the left. Bounding boxes are
+# (2,3) arrays with the minimum and the maximum corner.
+
+def pov_rotate_matrix( xyz ):
+    # rotate <x,y,z> turns around x first, then y and z
+    m = np.identity( 4 )
+    for axis, angle in enumerate( convertarray2vector( xyz ) ):
+        if angle == 0.: continue
+        a = angle * np.pi / 180.
+        c, s = np.cos( a ), np.sin( a )
+        i, j = [ ( 1, 2 ), ( 2, 0 ), ( 0, 1 ) ][axis]
+        r = np.identity( 4 )
+        r[i,i] = c
+        r[i,j] = s
+        r[j,i] = -s
+        r[j,j] = c
+        m = m.dot( r )
+    return m
+
+
+def pov_translate_matrix( xyz ):
+    m = np.identity( 4 )
+    m[3,:3] = convertarray2vector( xyz )
+    return m
+
+
+def pov_scale_matrix( xyz ):
+    m = np.identity( 4 )
+    m[:3,:3] = np.diag( convertarray2vector( xyz ) )
+    return m
+
+
+def pov_full_matrix( val ):
+    # the 12 values of matrix < ... >
+    if not isinstance( val, Matrix3D ):
+        val = Matrix3D( val )
+    return val.matrix
+
+
+# batched versions of the transformations, the arguments are (N,3)
+# arrays and the results (N,4,4) arrays
+
+def pov_rotate_matrices( xyz ):
+    angles = np.asarray( xyz, dtype=float ).reshape( ( -1, 3 ) ) * np.pi / 180.
+    nr = angles.shape[0]
+    m = np.tile( np.identity( 4 ), ( nr, 1, 1 ) )
+    for axis in range( 3 ):
+        c, s = np.cos( angles[:,axis] ), np.sin( angles[:,axis] )
+        i, j = [ ( 1, 2 ), ( 2, 0 ), ( 0, 1 ) ][axis]
+        r = np.tile( np.identity( 4 ), ( nr, 1, 1 ) )
+        r[:,i,i] = c
+        r[:,i,j] = s
+        r[:,j,i] = -s
+        r[:,j,j] = c
+        m = np.matmul( m, r )
+    return m
+
+
+def pov_translate_matrices( xyz ):
+    xyz = np.asarray( xyz, dtype=float ).reshape( ( -1, 3 ) )
+    m = np.tile( np.identity( 4 ), ( xyz.shape[0], 1, 1 ) )
+    m[:,3,:3] = xyz
+    return m
+
+
+def pov_scale_matrices( xyz ):
+    xyz = np.asarray( xyz, dtype=float ).reshape( ( -1, 3 ) )
+    m = np.zeros( ( xyz.shape[0], 4, 4 ) )
+    m[:,[0,1,2],[0,1,2]] = xyz
+    m[:,3,3] = 1.
+    return m
+
+
+def transform_points( points, matrix ):
+    # applies a (4,4) matrix or one (N,4,4) matrix per point to (N,3) points
+    points = np.asarray( points, dtype=float ).reshape( ( -1, 3 ) )
+    matrix = np.asarray( matrix, dtype=float )
+    if matrix.ndim == 2:
+        return points.dot( matrix[:3,:3] ) + matrix[3,:3]
+    return np.einsum( 'ni,nij->nj', points, matrix[:,:3,:3] ) + matrix[:,3,:3]
+
+
+def bounds_from_points( points ):
+    points = np.asarray( points, dtype=float ).reshape( ( -1, 3 ) )
+    if points.shape[0] == 0:
+        return None
+    return np.array( [ points.min( axis=0 ), points.max( axis=0 ) ] )
+
+
+def transform_bounds( bounds, matrix ):
+    # the box of the eight transformed corners
+    corners = np.array( [ [ bounds[i][0], bounds[j][1], bounds[k][2] ]
+                          for i in ( 0, 1 ) for j in ( 0, 1 ) for k in ( 0, 1 ) ] )
+    return bounds_from_points( transform_points( corners, matrix ) )
+
+
+def combine_bounds( bounds_list ):
+    # None stands for unknown or infinite bounds
+    bmin, bmax = None, None
+    for b in bounds_list:
+        if b is None:
+            return None
+        if bmin is None:
+            bmin, bmax = b[0].copy(), b[1].copy()
+        else:
+            bmin = np.minimum( bmin, b[0] )
+            bmax = np.maximum( bmax, b[1] )
+    if bmin is None:
+        return None
+    return np.array( [ bmin, bmax ] )
+
+
 # objects
 
+def _vector_values( val ):
+    # the three components of a vector as floats
+    if isinstance( val, Point3D ):
+        return val._x, val._y, val._z
+    if isinstance( val, ( list, tuple ) ) and ( len( val ) == 3 ):
+        x, y, z = val
+        return float( x ), float( y ), float( z )
+    if isinstance( val, np.ndarray ) and ( val.size == 3 ):
+        x, y, z = val.ravel().tolist()
+        return float( x ), float( y ), float( z )
+    raise TypeError( 'val is not list, tuple or numpy.ndarray with 3 elemets' )
+
+
+def _operand_values( val ):
+    # numbers are used for all three components
+    if isinstance( val, ( float, int, np.number ) ):
+        val = float( val )
+        return val, val, val
+    return _vector_values( val )
+
+
+def _divide( a, b ):
+    # division by zero gives inf or nan like numpy does
+    if b == 0.:
+        return float( np.float64( a ) / np.float64( b ) )
+    return a / b
+
+
+_new_object = object.__new__
+
+
+def _point( x, y, z ):
+    # creates a Point3D from three floats without any checks
+    p = _new_object( Point3D )
+    p._x = x
+    p._y = y
+    p._z = z
+    return p
+
+
 class Point3D( object ):
-    def __init__( self, xyz, atol=1e-6,rtol=1e-10 ):
-        self.__xyz = convertarray2vector( xyz )
-        self.__atol = atol
-        self.__rtol = rtol
+    """
+    Point3D
+
+    a single vector, the components are stored as floats. xyz returns a
+    new numpy array, xyz_tuple the components without an allocation,
+    changes go through the xyz setter or item assignment.
+    Numpy operations convert a Point3D into an array and return arrays.
+    Point3DArray is the counterpart for many vectors.
+    """
+    __slots__ = ( '_x', '_y', '_z', '_tol' )
+
+    def __init__( self, xyz, atol=None, rtol=None ):
+        t = type( xyz )
+        if ( ( t is list ) or ( t is tuple ) ) and ( len( xyz ) == 3 ):
+            x, y, z = xyz
+            self._x = float( x )
+            self._y = float( y )
+            self._z = float( z )
+        elif ( t is np.ndarray ) and ( xyz.shape == ( 3, ) ):
+            x, y, z = xyz.tolist()
+            self._x = float( x )
+            self._y = float( y )
+            self._z = float( z )
+        elif t is Point3D:
+            self._x = xyz._x
+            self._y = xyz._y
+            self._z = xyz._z
+        else:
+            self._x, self._y, self._z = _vector_values( xyz )
+        # the tolerances of __eq__ are only stored if given
+        if ( atol is not None ) or ( rtol is not None ):
+            self._tol = ( 1e-6 if atol is None else atol,
+                          1e-10 if rtol is None else rtol )
 
 
     def copy(self):
-        return Point3D(self.__xyz, atol=self.__atol, rtol=self.__rtol)
+        p = _point(self._x, self._y, self._z)
+        try:
+            p._tol = self._tol
+        except AttributeError:
+            pass
+        return p
+
+
+    @staticmethod
+    def sum( points ):
+        x, y, z = 0., 0., 0.
+        for p in points:
+            x += p._x
+            y += p._y
+            z += p._z
+        return _point( x, y, z )
 
 
     @property
     def xyz( self ):
-        return self.__xyz
+        return np.array( ( self._x, self._y, self._z ) )
+
+
+    @property
+    def xyz_tuple( self ):
+        # the components without allocating an array
+        return ( self._x, self._y, self._z )
+
+
+    @xyz.setter
+    def xyz( self, val ):
+        self._x, self._y, self._z = _vector_values( val )
+
+
+    def __array__( self, dtype=None, copy=None ):
+        return np.array( ( self._x, self._y, self._z ), dtype=dtype )
 
 
     @property
     def width( self ):
-        return self.__xyz[0]
+        return self._x
 
 
     @property
     def height( self ):
-        return self.__xyz[1]
+        return self._y
 
 
     @property
     def length( self ):
-        return self.__xyz[2]
+        return self._z
 
 
     @width.setter
     def width( self, val ):
-        self.__xyz[0] = val
+        self._x = float( val )
 
 
     @height.setter
     def height( self, val ):
-        self.__xyz[1] = val
+        self._y = float( val )
 
 
     @length.setter
     def length( self, val ):
-        self.__xyz[2] = val
+        self._z = float( val )
 
 
     def __getitem__( self, key ):
-        return self.__xyz[key]
+        if type( key ) is int:
+            return ( self._x, self._y, self._z )[key]
+        return self.xyz[key]
+
+
+    def __setitem__( self, key, val ):
+        if key in ( 0, -3 ):
+            self._x = float( val )
+        elif key in ( 1, -2 ):
+            self._y = float( val )
+        elif key in ( 2, -1 ):
+            self._z = float( val )
+        else:
+            raise IndexError( 'Point3D index out of range' )
+
+
+    def __iter__( self ):
+        return iter( ( self._x, self._y, self._z ) )
 
 
     def __str__( self ):
-        return '<{:6f},{:6f},{:6f}>'.format( self.__xyz[0], self.__xyz[1], self.__xyz[2] )
+        return '<{:6f},{:6f},{:6f}>'.format( self._x, self._y, self._z )
 
 
     def __repr__(self):
-        return 'Point3D([{},{},{}])'.format(self.__xyz[0], self.__xyz[1], self.__xyz[2])
+        return 'Point3D([{},{},{}])'.format(self._x, self._y, self._z)
 
 
     def __add__( self, val ):
-        if isinstance( val, Point3D):
-            return Point3D( self.__xyz + val.xyz )
+        p = _new_object( Point3D )
+        t = type( val )
+        if t is Point3D:
+            p._x = self._x + val._x
+            p._y = self._y + val._y
+            p._z = self._z + val._z
+        elif ( t is float ) or ( t is int ):
+            p._x = self._x + val
+            p._y = self._y + val
+            p._z = self._z + val
         else:
-            return Point3D( self.__xyz + val )
+            x, y, z = _operand_values( val )
+            p._x = self._x + x
+            p._y = self._y + y
+            p._z = self._z + z
+        return p
 
     __radd__ = __add__
 
 
     def __sub__( self, val ):
-        if isinstance( val, Point3D):
-            return Point3D( self.__xyz - val.xyz )
+        p = _new_object( Point3D )
+        t = type( val )
+        if t is Point3D:
+            p._x = self._x - val._x
+            p._y = self._y - val._y
+            p._z = self._z - val._z
+        elif ( t is float ) or ( t is int ):
+            p._x = self._x - val
+            p._y = self._y - val
+            p._z = self._z - val
         else:
-            return Point3D( self.__xyz - val )
+            x, y, z = _operand_values( val )
+            p._x = self._x - x
+            p._y = self._y - y
+            p._z = self._z - z
+        return p
 
     def __rsub__( self, val ):
-        if isinstance( val, Point3D):
-            return Point3D( val.xyz - self.__xyz  )
-        else:
-            return Point3D( - self.__xyz + val )
+        x, y, z = _operand_values( val )
+        return _point( x - self._x, y - self._y, z - self._z )
+
+    def __neg__( self ):
+        return _point( -self._x, -self._y, -self._z )
 
     def __mul__( self, val ):
-        if isinstance( val, Point3D):
-            return Point3D( self.__xyz * val.xyz )
+        p = _new_object( Point3D )
+        t = type( val )
+        if t is Point3D:
+            p._x = self._x * val._x
+            p._y = self._y * val._y
+            p._z = self._z * val._z
+        elif ( t is float ) or ( t is int ):
+            p._x = self._x * val
+            p._y = self._y * val
+            p._z = self._z * val
         else:
-            return Point3D( self.__xyz * val )
+            x, y, z = _operand_values( val )
+            p._x = self._x * x
+            p._y = self._y * y
+            p._z = self._z * z
+        return p
 
     __rmul__ = __mul__
 
     def __truediv__( self, val ):
-        if isinstance( val, Point3D):
-            return Point3D( self.__xyz / val.xyz )
+        t = type( val )
+        if t is Point3D:
+            x, y, z = val._x, val._y, val._z
+        elif ( ( t is float ) or ( t is int ) ) and val:
+            p = _new_object( Point3D )
+            p._x = self._x / val
+            p._y = self._y / val
+            p._z = self._z / val
+            return p
+        elif ( t is float ) or ( t is int ):
+            x = y = z = val
         else:
-            return Point3D( self.__xyz / val )
+            x, y, z = _operand_values( val )
+        if x and y and z:
+            return _point( self._x / x, self._y / y, self._z / z )
+        return _point( _divide( self._x, x ), _divide( self._y, y ), _divide( self._z, z ) )
 
     def __rtruediv__( self, val ):
-        if isinstance( val, Point3D):
-            return Point3D( val.xyz / self.__xyz)
-        else:
-            return Point3D( val / self.__xyz )
+        x, y, z = _operand_values( val )
+        return _point( _divide( x, self._x ), _divide( y, self._y ), _divide( z, self._z ) )
 
     def __eq__( self, val ):
-        return np.allclose( self.__xyz, val.xyz, atol=self.__atol, rtol=self.__rtol )
+        try:
+            atol, rtol = self._tol
+        except AttributeError:
+            atol, rtol = 1e-6, 1e-10
+        for a, b in zip( ( self._x, self._y, self._z ), _vector_values( val ) ):
+            if not ( abs( a - b ) <= atol + rtol * abs( b ) ):
+                return False
+        return True
+
+    __hash__ = None
+
+
+class Point3DArray( object ):
+    """
+    Point3DArray
+
+    many vectors in a (N,3) array with the arithmetic of Point3D, the
+    operands can be numbers, Point3D objects, Point3DArrays and arrays
+    which can be broadcast to (N,3)
+    """
+    __slots__ = ( '_xyz', )
+
+    def __init__( self, xyz ):
+        if isinstance( xyz, Point3DArray ):
+            xyz = xyz._xyz
+        elif isinstance( xyz, ( list, tuple ) ) and ( len( xyz ) > 0 ) \
+            and isinstance( xyz[0], Point3D ):
+            xyz = [ ( p._x, p._y, p._z ) for p in xyz ]
+        self._xyz = np.array( xyz, dtype=float ).reshape( ( -1, 3 ) )
+
+
+    @classmethod
+    def _wrap( cls, xyz ):
+        a = _new_object( cls )
+        a._xyz = xyz
+        return a
+
+
+    def copy( self ):
+        return Point3DArray._wrap( self._xyz.copy() )
+
+
+    @property
+    def xyz( self ):
+        return self._xyz
+
+
+    def __array__( self, dtype=None, copy=None ):
+        return np.asarray( self._xyz, dtype=dtype )
+
+
+    def __len__( self ):
+        return self._xyz.shape[0]
+
+
+    def __getitem__( self, key ):
+        if isinstance( key, ( int, np.integer ) ):
+            x, y, z = self._xyz[key].tolist()
+            return _point( x, y, z )
+        return Point3DArray._wrap( self._xyz[key].reshape( ( -1, 3 ) ) )
+
+
+    def __iter__( self ):
+        for x, y, z in self._xyz.tolist():
+            yield _point( x, y, z )
+
+
+    def sum( self ):
+        x, y, z = self._xyz.sum( axis=0 ).tolist()
+        return _point( x, y, z )
+
+
+    def strings( self ):
+        # the POV-Ray notation of all vectors
+        if len( self ) == 0:
+            return []
+        return ( ( '<%f,%f,%f>\0' * len( self ) ) % tuple( self._xyz.ravel().tolist() ) ).split( '\0' )[:-1]
+
+
+    def __repr__( self ):
+        return 'Point3DArray(%s)' % self._xyz.tolist()
+
+
+    @staticmethod
+    def _operand( val ):
+        if isinstance( val, Point3D ):
+            return np.array( ( val._x, val._y, val._z ) )
+        if isinstance( val, Point3DArray ):
+            return val._xyz
+        return np.asarray( val, dtype=float )
+
+
+    def __add__( self, val ):
+        return Point3DArray._wrap( self._xyz + self._operand( val ) )
+
+    __radd__ = __add__
+
+    def __sub__( self, val ):
+        return Point3DArray._wrap( self._xyz - self._operand( val ) )
+
+    def __rsub__( self, val ):
+        return Point3DArray._wrap( self._operand( val ) - self._xyz )
+
+    def __neg__( self ):
+        return Point3DArray._wrap( -self._xyz )
+
+    def __mul__( self, val ):
+        return Point3DArray._wrap( self._xyz * self._operand( val ) )
+
+    __rmul__ = __mul__
+
+    def __truediv__( self, val ):
+        return Point3DArray._wrap( self._xyz / self._operand( val ) )
+
+    def __rtruediv__( self, val ):
+        return Point3DArray._wrap( self._operand( val ) / self._xyz )
 
 
 class Matrix3D(object):
+    """
+    Matrix3D
+
+    affine transformation with the 12 values of matrix < ... >, the
+    rotation part and the translation. All methods follow POV-Ray,
+    points are row vectors which are multiplied from the left, so
+    a @ b applies a first and then b and a * point is a.apply(point).
+    angle_X/Y/Z and create_rotation_matrix use the same convention.
+    """
     def __init__(self, value=None, rotation=None, translation=None):
         self.reset()
 
@@ -284,6 +693,9 @@ class Matrix3D(object):
 
 
     def rotate(self, angle):
+        # the rotation angle is applied after the current one
+        if isinstance(angle, Matrix3D):
+            angle = angle.rotation
         self._rotation = np.dot(self._rotation, angle)
 
 
@@ -297,35 +709,317 @@ class Matrix3D(object):
 
 
     def __mul__(self, val):
-        if isinstance(val, Point3D):
-            return Point3D(np.dot(self.rotation, val.xyz) + self.translation)
+        if isinstance(val, (Point3D, Point3DArray)):
+            return self.apply(val)
         else:
             return val.copy()
 
 
+    @classmethod
+    def from_matrix(cls, matrix):
+        # from a 4x4 matrix in the convention of POV-Ray
+        matrix = np.asarray(matrix, dtype=float)
+        return cls(rotation=matrix[:3,:3].copy(), translation=matrix[3,:3])
+
+
+    @classmethod
+    def from_object(cls, obj):
+        # all transformations of a PovCSGObject as single matrix
+        return cls.from_matrix(obj.transform_matrix())
+
+
+    @property
+    def matrix(self):
+        m = np.identity(4)
+        m[:3,:3] = self._rotation
+        m[3,:3]  = self._translation
+        return m
+
+
+    def __matmul__(self, val):
+        if isinstance(val, Matrix3D):
+            val = val.matrix
+        return Matrix3D.from_matrix(self.matrix.dot(val))
+
+
+    def __rmatmul__(self, val):
+        return Matrix3D.from_matrix(np.asarray(val, dtype=float).dot(self.matrix))
+
+
+    def inverse(self):
+        rotation = np.linalg.inv(self._rotation)
+        return Matrix3D(rotation=rotation, translation=-self._translation.dot(rotation))
+
+
+    """
+    apply
+
+    transforms points like POV-Ray does, a Point3D gives a Point3D,
+    a Point3DArray a Point3DArray and all other values a (N,3) array
+    """
+    def apply(self, points):
+        if isinstance(points, Point3D):
+            return Point3D(points.xyz.dot(self._rotation) + self._translation)
+        if isinstance(points, Point3DArray):
+            return Point3DArray(transform_points(points.xyz, self.matrix))
+        return transform_points(points, self.matrix)
+
+
+
+def indent_str( nr ):
+    try:
+        return _indent_cache[nr]
+    except KeyError:
+        s = _indent_char * _indent_nr * nr
+        _indent_cache[nr] = s
+        return s
+
+
+def compact_number( val ):
+    # the %f representation without the trailing zeros, -0 is written as 0
+    s = ( '%f' % val ).rstrip( '0' ).rstrip( '.' )
+    if s == '-0':
+        return '0'
+    return s
+
+
+def compact_value( val ):
+    # numbers and vectors are returned as their compact string
+    if type( val ) is float or isinstance( val, np.floating ):
+        return compact_number( val )
+    if isinstance( val, Point3D ):
+        return '<%s,%s,%s>' % ( compact_number( val._x ),
+                                compact_number( val._y ),
+                                compact_number( val._z ) )
+    return val
+
+
+def compact_line( fmt ):
+    # the format for compact_value, %f is replaced by %s
+    try:
+        return _compact_lines[fmt]
+    except KeyError:
+        cfmt = fmt.replace( '%f', '%s' )
+        _compact_lines[fmt] = cfmt
+        return cfmt
+
+
+def compact_format( fmt ):
+    # the format for compact_rows, %f is replaced by the shortest
+    # representation of the rounded numbers
+    try:
+        return _compact_formats[fmt]
+    except KeyError:
+        cfmt = fmt.replace( '%f', _compact_float )
+        _compact_formats[fmt] = cfmt
+        return cfmt
+
+
+def compact_rows( rows ):
+    # the numbers for compact_format, rounded like %f for whole arrays
+    return np.round( np.asarray( rows, dtype=np.float64 ), 6 ) + 0.
+
+
+# output emitter
+
+class PovEmitter( object ):
+    """
+    PovEmitter
+
+    collects the output of all write_pov calls in a list of strings
+    and writes them in large chunks into the file object, the indent
+    prefixes are cached per indent level
+
+    :param ffile      : file object with a write method
+    :param chunk_size : number of characters which triggers a flush
+    """
+    compact   = False
+    cache     = False
+    instances = None
+    declared  = None
+    frustum   = None
+    # objects written as placeholders and their size, only used to
+    # hash the objects for instancing
+    stubs     = None
+    stubbed   = 0
+
+    def __init__( self, ffile, chunk_size=_emitter_chunk_size ):
+        self._ffile      = ffile
+        self._chunk_size = chunk_size
+
+        self._buffer     = []
+        self._size       = 0
+        self._written    = 0
+
+
+    @property
+    def chunk_size( self ):
+        return self._chunk_size
+
+
+    @property
+    def written( self ):
+        # number of characters emitted so far, flushed or not
+        return self._written + self._size
+
+
+    def write( self, s ):
+        self._buffer.append( s )
+        self._size += len( s )
+        if self._size >= self._chunk_size:
+            self.flush()
+
+
+    def write_indent( self, s, indent ):
+        # same as write, the line is joined with its indent prefix
+        if indent > 0:
+            try:
+                s = _indent_cache[indent] + s
+            except KeyError:
+                s = indent_str( indent ) + s
+        self._buffer.append( s )
+        self._size += len( s )
+        if self._size >= self._chunk_size:
+            self.flush()
+
+
+    def format( self, fmt, values ):
+        # all numbers of the output are formatted by the emitter, the
+        # compact emitter changes the %f of the formats
+        return fmt % values
+
+
+    def float_format( self, fmt ):
+        # format and values for large blocks of rows, see PovMesh2
+        return fmt
+
+
+    def float_rows( self, rows ):
+        return rows
+
+
+    def write_fragments( self, fragments, size ):
+        # fragments are already processed by an emitter of the same kind
+        self._buffer.extend( fragments )
+        self._size += size
+        if self._size >= self._chunk_size:
+            self.flush()
+
+
+    def record( self ):
+        # returns an emitter of the same kind which only collects
+        # the fragments, used for the serialization cache
+        emitter = type( self )( None, chunk_size=sys.maxsize )
+        emitter.cache     = self.cache
+        emitter.instances = self.instances
+        emitter.declared  = self.declared
+        emitter.frustum   = self.frustum
+        return emitter
+
+
+    @property
+    def fragments( self ):
+        return self._buffer
+
+
+    def flush( self ):
+        if len( self._buffer ) == 0: return
+        self._ffile.write( ''.join( self._buffer ) )
+        self._written += self._size
+        self._buffer = []
+        self._size   = 0
+
+
+    def close( self ):
+        self.flush()
+        self._ffile.close()
+
+
+
+class PovCompactEmitter( PovEmitter ):
+    """
+    PovCompactEmitter
+
+    emitter for the compact output mode, the indentation is dropped and
+    the numbers of the formats are written with the minimal width, e.g.
+    1.500000 -> 1.5, -0.000000 -> 0, the result is deterministic. Objects
+    can query the compact attribute to skip their comments
+    """
+    compact = True
+
+    def format( self, fmt, values ):
+        return compact_line( fmt ) % tuple( [ compact_value( v ) for v in values ] )
+
+
+    def float_format( self, fmt ):
+        return compact_format( fmt )
+
+
+    def float_rows( self, rows ):
+        return compact_rows( rows )
+
+
+    def write_indent( self, s, indent ):
+        self.write( s )
+
+
 
 # Povray basic object
 
 class PovWriterObject( object ):
+    __slots__ = ()
+
     # helper functios
     def _indent_str( self, nr ):
-        return ''.join( _indent_char * _indent_nr * nr )
+        return indent_str( nr )
 
 
     def _write_indent( self, ffile, s, indent):
-        ffile.write( self._indent_str( indent ) + s )
-        #ffile.write( '%s%s' % ( self._indent_str( indent ), s ) )
+        if isinstance( ffile, PovEmitter ):
+            ffile.write_indent( s, indent )
+        else:
+            ffile.write( indent_str( indent ) + s )
+
+
+    def _write_format( self, ffile, fmt, values, indent ):
+        # writes fmt % values, the numbers are formatted by the emitter
+        if isinstance( ffile, PovEmitter ):
+            ffile.write_indent( ffile.format( fmt, values ), indent )
+        else:
+            ffile.write( indent_str( indent ) + fmt % values )
+
+
+    def _float_format( self, ffile, fmt ):
+        if isinstance( ffile, PovEmitter ):
+            return ffile.float_format( fmt )
+        return fmt
+
+
+    def _float_rows( self, ffile, rows ):
+        if isinstance( ffile, PovEmitter ):
+            return ffile.float_rows( rows )
+        return rows
+
+
+    def _is_compact( self, ffile ):
+        return isinstance( ffile, PovEmitter ) and ffile.compact
 
 
 
 class PovBasicObject( PovWriterObject ):
+    __slots__ = ( '_comment', '_includes', '_declares', '_macro_defs', '_extra_files',
+                  '_time_functions' )
+
     def __init__( self, comment=None ):
         self._comment = comment
 
-        self._includes    = []
-        self._declares    = {}
-        self._macro_defs  = []
-        self._extra_files = []
+        # allocated with the first entry
+        self._includes    = ()
+        self._declares    = None
+        self._macro_defs  = ()
+        self._extra_files = ()
+
+        self._time_functions = None
 
 
     # handle includes/declares/macros
@@ -338,11 +1032,13 @@ class PovBasicObject( PovWriterObject ):
             if incfile in self._includes:
                 pass
             else:
-                self._includes.append(incfile)
+                self._includes = appended(self._includes, incfile)
 
 
     def add_declare( self, key, value ):
-        if self._declares.has_key( key ):
+        if self._declares is None:
+            self._declares = {}
+        if key in self._declares:
             raise KeyError( 'key %s already in declares!' % key )
         else:
             self._declares[key] = value
@@ -353,7 +1049,7 @@ class PovBasicObject( PovWriterObject ):
             for i in macrodef:
                 self.add_macro( i )
         else:
-            self._macro_def.append( macrodef )
+            self._macro_defs = appended( self._macro_defs, macrodef )
 
 
     def add_extra_file(self, efile):
@@ -363,30 +1059,89 @@ class PovBasicObject( PovWriterObject ):
         else:
             if os.access(efile, os.R_OK):
                 if efile not in self._extra_files:
-                    self._extra_files.append(efile)
+                    self._extra_files = appended(self._extra_files, efile)
             else:
                 print('WARNING: File \'%s\' not found!' % efile)
 
 
+    """
+    set_time_function
+
+    declares a property as function of the time, func( time_abs, framenr )
+    is evaluated before each frame is written and the result is set as
+    new value of the property. Unlike the update_* methods the functions
+    don't depend on the previous frames, so each frame can be created
+    directly, see PovAnimation.write_frame
+
+    :param name : name of the property, e.g. 'translate' or 'location',
+                  the value is set with set_<name> if the object has
+                  such a method, otherwise as attribute
+    :param func : function( time_abs, framenr ), None removes the function
+    """
+    def set_time_function( self, name, func ):
+        if func is None:
+            if self._time_functions is not None:
+                self._time_functions.pop( name, None )
+            return
+        if self._time_functions is None:
+            self._time_functions = {}
+        self._time_functions[name] = func
+
+
+    def has_time_functions( self ):
+        return bool( self._time_functions )
+
+
+    def _set_time_property( self, name, value ):
+        setter = getattr( self, 'set_%s' % name, None )
+        if setter is not None:
+            setter( value )
+        else:
+            setattr( self, name, value )
+
+
+    def update_properties( self, time_abs, framenr ):
+        if self._time_functions is None: return
+        for name, func in self._time_functions.items():
+            self._set_time_property( name, func( time_abs, framenr ) )
+
+
+    def needs_timeline( self ):
+        # True if the object is changed by the update_* methods, then
+        # all frames must be calculated in order
+        return False
+
+
     # helper functios
     def _write_comment( self, ffile, indent=0 ):
         if self._comment is None: return
+        if self._is_compact( ffile ): return
         self._write_indent( ffile, '// %s\n' % self._comment, indent )
 
 
+    def _write_declared( self, ffile, keyword, indent=0 ):
+        # writes only a reference if the object is declared in the file
+        if isinstance( ffile, PovEmitter ) and ( ffile.declared is not None ):
+            name = ffile.declared.get( id( self ) )
+            if name is not None:
+                self._write_indent( ffile, '%s{ %s }\n' % ( keyword, name ), indent )
+                return True
+        return False
+
+
     def _write_vector( self, ffile, key, v, indent=0 ):
         self._is_vector( v )
-        self._write_indent( ffile, _fmt_key_vector.format( key, v[0], v[1], v[2] ), indent=indent )
+        self._write_format( ffile, _fmt_key_vector, ( key, v[0], v[1], v[2] ), indent )
 
 
     def _write_float( self, ffile, key, v , indent=0 ):
         self._is_float( v )
-        self._write_indent( ffile, _fmt_key_float.format( key, v ), indent=indent )
+        self._write_format( ffile, _fmt_key_float, ( key, v ), indent )
 
 
     def _write_int( self, ffile, key, v , indent=0 ):
         self._is_int( v )
-        self._write_indent( ffile, _fmt_key_int.format( key, v ), indent=indent )
+        self._write_format( ffile, _fmt_key_int, ( key, v ), indent )
 
 
     def write_pov( self, ffile, indent=0 ):
@@ -562,39 +1317,36 @@ class PovGeometry(object):
 
     def _write_full_matrix(self, ffile, indent=0):
         for m in self.__full_matrix:
-            self._write_indent(ffile, 'matrix <{}>\n'.format(m), indent)
+            if self._is_compact(ffile):
+                self._write_format(ffile, _fmt_full_matrix, tuple(m.matrix[:,:3].ravel().tolist()), indent)
+            else:
+                self._write_indent(ffile, 'matrix <{}>\n'.format(m), indent)
 
 
     def _write_scale(self, ffile, indent=0):
         if len(self.__scale) == 0: return
         for sc in self.__scale:
-            self._write_indent(ffile, 'scale %s\n' % sc, indent)
+            if isinstance(sc, Point3D):
+                self._write_format(ffile, 'scale <%f,%f,%f>\n', sc.xyz_tuple, indent)
+            else:
+                self._write_indent(ffile, 'scale %s\n' % sc, indent)
 
 
     def _write_translate(self, ffile, indent=0):
         if self.__translate is None: return
         for t in self.__translate:
-           self._write_indent(ffile, 'translate %s\n' % t, indent)
+           self._write_format(ffile, 'translate <%f,%f,%f>\n', t.xyz_tuple, indent)
 
 
     def _write_rotate(self, ffile, indent=0):
         for r in self.__rotate:
-           self._write_indent(ffile, 'rotate %s\n' % r, indent)
+           self._write_format(ffile, 'rotate <%f,%f,%f>\n', r.xyz_tuple, indent)
 
 
     def _write_rotation_matrix(self, ffile, indent=0):
         if self.__rotation_matrix is None: return
-        self._write_indent( ffile,
-             'matrix <%f,%f,%f,%f,%f,%f,%f,%f,%f,0,0,0>\n' % (self.__rotation_matrix[0][0],
-                       self.__rotation_matrix[0][1],
-                       self.__rotation_matrix[0][2],
-                       self.__rotation_matrix[1][0],
-                       self.__rotation_matrix[1][1],
-                       self.__rotation_matrix[1][2],
-                       self.__rotation_matrix[2][0],
-                       self.__rotation_matrix[2][1],
-                       self.__rotation_matrix[2][2]),
-                       indent)
+        self._write_format(ffile, 'matrix <%f,%f,%f,%f,%f,%f,%f,%f,%f,0,0,0>\n',
+                           tuple(np.ravel(self.__rotation_matrix).tolist()), indent)
 
 
     def _write_geometrics(self, ffile, indent=0):
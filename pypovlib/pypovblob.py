@@ -40,8 +40,7 @@ class PovBlob(PovCSGObjectList):
         PovCSGObjectList.write_pov(self, ffile, indent=indent)
         self._write_indent(ffile, 'blob{\n', indent)
 
-        self._write_indent(ffile, 'threshold %f' % self._threshold,
-            indent=indent+1)
+        self._write_format(ffile, 'threshold %f', (self._threshold,), indent+1)
 
         self._write_items(ffile, indent+1)
         self._write_attributes(ffile, indent+1 )
@@ -54,6 +53,8 @@ class PovBlob(PovCSGObjectList):
 
 
 class PovBlobSphere(PovCSGSphere):
+    __slots__ = ('_strength',)
+
     _blob = True
     _name = 'BlobSphere'
     def __init__(self, xyz, radius, strength=1., comment=None ):
@@ -64,9 +65,8 @@ class PovBlobSphere(PovCSGSphere):
     def write_pov(self, ffile, indent = 0):
         PovCSGObject.write_pov(self, ffile, indent=indent)
         self._write_indent(ffile, 'sphere{\n', indent)
-        self._write_indent(ffile,
-                           '%s, %f, %f\n' % (self._xyz,
-                                             self._radius,
-                                             self._strength), indent+1)
+        self._write_format(ffile, '<%f,%f,%f>, %f, %f\n',
+                           self._xyz.xyz_tuple + (self._radius,
+                                                  self._strength), indent+1)
         self._write_attributes(ffile, indent+1)
         self._write_indent(ffile, '}\n', indent)
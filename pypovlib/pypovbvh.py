@@ -0,0 +1,530 @@
+# pypovbvh.py
+#
+# bounding volume hierarchy over the bounding boxes of scene objects,
+# all queries can be given as single values or as numpy arrays of
+# many queries
+#
+# written by: Oliver Cordes 2020-05-16
+# changed by: Oliver Cordes 2020-05-16
+
+import sys
+import weakref
+
+try:
+    import numpy as np
+except:
+    print( 'Please install numpy to use with pypovlib!!' )
+    sys.exit( 1 )
+
+
+from pypovlib.pypovobjects import PovBaseList, _morton_codes
+
+
+# constants
+
+# box of objects without bounds, it never matches a query
+_empty_box = np.array( [ [ np.inf, np.inf, np.inf ],
+                         [ -np.inf, -np.inf, -np.inf ] ] )
+
+# number of queries which are processed at once
+_query_chunk = 4096
+
+
+# helper functions
+
+def _box_distance2( p, bmin, bmax ):
+    # squared distance between points and boxes, 0 inside of the box
+    d = np.maximum( np.maximum( bmin - p, p - bmax ), 0. )
+    return ( d**2 ).sum( axis=1 )
+
+
+def _box_within( p, bmin, bmax, r2 ):
+    # boxes closer than the squared radius, the empty boxes of objects
+    # without bounds never match, not even for an infinite radius
+    return ( bmin <= bmax ).all( axis=1 ) & ( _box_distance2( p, bmin, bmax ) <= r2 )
+
+
+class _PovBVHLink( object ):
+    # registered as parent of an object, so every change of the object
+    # marks it for the next refit. The index is only referenced weakly,
+    # the objects don't keep old indices alive
+    def __init__( self, bvh, index ):
+        self._bvh   = weakref.ref( bvh )
+        self._index = index
+
+
+    def invalidate( self ):
+        bvh = self._bvh()
+        if bvh is not None:
+            bvh._dirty.add( self._index )
+
+
+class PovBVH( object ):
+    """
+    PovBVH
+
+    spatial index over the bounding boxes of objects. The objects are
+    sorted along a z-order curve, groups of leaf_size objects are the
+    leaves of a balanced binary tree. Changed objects are refitted
+    before the next query, added objects are tested linearly until the
+    next rebuild.
+
+    The boxes are the bounding_box() values of the objects, so they are
+    in the coordinates of the list which contains the objects.
+
+    :param objects   : list of objects or a PovBaseList, new items of
+                       the list are added automatically
+    :param leaf_size : number of objects per leaf
+    :param track     : refit objects automatically if they are changed,
+                       close() removes the links from the objects
+    """
+    _leaf_size = 8
+
+    def __init__( self, objects=None, leaf_size=None, track=True ):
+        if leaf_size is not None:
+            self._leaf_size = leaf_size
+        self._track   = track
+
+        self._objects = []
+        self._bounds  = np.zeros( ( 0, 2, 3 ) )
+        self._dirty   = set()
+        self._source  = None
+        self._synced  = None
+        self._links   = []
+
+        # the tree: object index per tree slot, tree slot per object
+        # (-1 for pending objects) and the node boxes per level, level 0
+        # are the leaves
+        self._order   = np.zeros( 0, dtype=np.int64 )
+        self._slot    = np.zeros( 0, dtype=np.int64 )
+        self._levels  = []
+        self._pending = []
+
+        if isinstance( objects, PovBaseList ):
+            self._source = objects
+        elif objects is not None:
+            self.insert( objects, rebuild=False )
+        self.rebuild()
+
+
+    def __len__( self ):
+        self._sync()
+        return len( self._objects )
+
+
+    @property
+    def objects( self ):
+        self._sync()
+        return self._objects
+
+
+    def _box( self, obj ):
+        b = obj.bounding_box()
+        if b is None:
+            return _empty_box
+        return b
+
+
+    def _sync( self, rebuild=True ):
+        if self._source is None: return
+        items = self._source._items
+        if ( self._synced is None ) or ( self._synced[0] is not items ) \
+            or ( len( items ) < self._synced[1] ):
+            # a new or shortened item list, all objects are indexed again
+            if self._synced is not None:
+                self._clear()
+            self._synced = ( items, 0 )
+        if len( items ) > self._synced[1]:
+            new = items[self._synced[1]:]
+            self._synced = ( items, len( items ) )
+            self.insert( new, rebuild=rebuild )
+
+
+    def _clear( self ):
+        self.close()
+        self._objects = []
+        self._bounds  = np.zeros( ( 0, 2, 3 ) )
+        self._dirty   = set()
+        self._order   = np.zeros( 0, dtype=np.int64 )
+        self._slot    = np.zeros( 0, dtype=np.int64 )
+        self._levels  = []
+        self._pending = []
+
+
+    """
+    close
+
+    removes the links of the index from all objects, afterwards the
+    index doesn't follow the changes of the objects anymore
+    """
+    def close( self ):
+        for obj, link in self._links:
+            parents = obj._parents
+            if parents is not None and link in parents:
+                parents.remove( link )
+                if len( parents ) == 0:
+                    obj._parents = None
+        self._links = []
+
+
+    """
+    insert
+
+    adds objects to the index, they are tested linearly until the tree
+    is rebuild, which happens automatically if too many objects are
+    pending
+    """
+    def insert( self, objects, rebuild=True ):
+        if not isinstance( objects, ( list, tuple ) ):
+            objects = [ objects ]
+        if len( objects ) == 0: return
+        start = len( self._objects )
+        bounds = np.array( [ self._box( obj ) for obj in objects ] )
+        for nr, obj in enumerate( objects ):
+            self._objects.append( obj )
+            if self._track:
+                if obj._parents is not None:
+                    # drop the links of indices which don't exist anymore
+                    obj._parents = [ p for p in obj._parents
+                                     if not ( isinstance( p, _PovBVHLink )
+                                              and ( p._bvh() is None ) ) ]
+                link = _PovBVHLink( self, start + nr )
+                obj.add_parent( link )
+                self._links.append( ( obj, link ) )
+        self._bounds  = np.concatenate( ( self._bounds, bounds ) )
+        self._slot    = np.concatenate( ( self._slot,
+                                          np.full( len( objects ), -1, dtype=np.int64 ) ) )
+        self._pending.extend( range( start, len( self._objects ) ) )
+
+        if rebuild and ( len( self._pending ) > max( 1024, len( self._objects ) // 4 ) ):
+            self.rebuild()
+
+
+    """
+    update
+
+    recalculates the boxes of the given objects or of all objects
+    """
+    def update( self, objects=None ):
+        if objects is None:
+            self._dirty.update( range( len( self._objects ) ) )
+        else:
+            if not isinstance( objects, ( list, tuple ) ):
+                objects = [ objects ]
+            index = { id( obj ): nr for nr, obj in enumerate( self._objects ) }
+            for obj in objects:
+                if id( obj ) in index:
+                    self._dirty.add( index[id( obj )] )
+        self._refit()
+
+
+    """
+    rebuild
+
+    sorts all objects into a new tree
+    """
+    def rebuild( self ):
+        self._sync( rebuild=False )
+        self._refit_bounds()
+        n = len( self._objects )
+
+        with np.errstate( invalid='ignore' ):
+            centers = ( self._bounds[:,0] + self._bounds[:,1] ) * 0.5
+        finite  = np.isfinite( centers ).all( axis=1 )
+        codes   = np.zeros( n, dtype=np.int64 )
+        if finite.any():
+            codes[finite]  = _morton_codes( centers[finite] )
+            codes[~finite] = codes[finite].max() + 1
+
+        self._order = np.argsort( codes, kind='stable' )
+        self._slot  = np.empty( n, dtype=np.int64 )
+        self._slot[self._order] = np.arange( n )
+        self._pending = []
+
+        # leaves
+        ls = self._leaf_size
+        nleaves = max( 1, -( -n // ls ) )
+        b = np.empty( ( nleaves * ls, 2, 3 ) )
+        b[:] = _empty_box
+        b[:n] = self._bounds[self._order]
+        b = b.reshape( ( nleaves, ls, 2, 3 ) )
+        level = [ b[:,:,0].min( axis=1 ), b[:,:,1].max( axis=1 ) ]
+        self._levels = [ level ]
+
+        # inner nodes
+        while level[0].shape[0] > 1:
+            lmin, lmax = level
+            if lmin.shape[0] % 2:
+                lmin = np.concatenate( ( lmin, _empty_box[:1] ) )
+                lmax = np.concatenate( ( lmax, _empty_box[1:] ) )
+            level = [ np.minimum( lmin[0::2], lmin[1::2] ),
+                      np.maximum( lmax[0::2], lmax[1::2] ) ]
+            self._levels.append( level )
+
+
+    def _refit_bounds( self ):
+        # new boxes of the changed objects, returns their indices
+        if len( self._dirty ) == 0:
+            return np.zeros( 0, dtype=np.int64 )
+        dirty = np.array( sorted( self._dirty ), dtype=np.int64 )
+        self._dirty = set()
+        for i in dirty:
+            self._bounds[i] = self._box( self._objects[i] )
+        return dirty
+
+
+    def _refit( self ):
+        self._sync()
+        dirty = self._refit_bounds()
+        if dirty.size == 0: return
+        slots = self._slot[dirty]
+        slots = slots[slots >= 0]
+        if slots.size == 0: return
+
+        # recalculate the leaves and all their parents
+        ls = self._leaf_size
+        nodes = np.unique( slots // ls )
+        idx = ( nodes[:,np.newaxis] * ls + np.arange( ls ) ).ravel()
+        b = np.empty( ( idx.size, 2, 3 ) )
+        b[:] = _empty_box
+        valid = idx < self._order.size
+        b[valid] = self._bounds[self._order[idx[valid]]]
+        b = b.reshape( ( nodes.size, ls, 2, 3 ) )
+        self._levels[0][0][nodes] = b[:,:,0].min( axis=1 )
+        self._levels[0][1][nodes] = b[:,:,1].max( axis=1 )
+
+        for k in range( 1, len( self._levels ) ):
+            nodes = np.unique( nodes // 2 )
+            cmin, cmax = self._levels[k-1]
+            c0 = nodes * 2
+            c1 = np.minimum( c0 + 1, cmin.shape[0] - 1 )
+            self._levels[k][0][nodes] = np.minimum( cmin[c0], cmin[c1] )
+            self._levels[k][1][nodes] = np.maximum( cmax[c0], cmax[c1] )
+
+
+    def _search( self, nq, overlap ):
+        # returns all pairs of query and object index whose boxes pass
+        # the overlap test, overlap( q, bmin, bmax ) works on arrays
+        q     = np.arange( nq )
+        nodes = np.zeros( nq, dtype=np.int64 )
+        for k in range( len( self._levels ) - 1, -1, -1 ):
+            lmin, lmax = self._levels[k]
+            keep = overlap( q, lmin[nodes], lmax[nodes] )
+            q, nodes = q[keep], nodes[keep]
+            if k > 0:
+                q     = np.repeat( q, 2 )
+                nodes = ( nodes[:,np.newaxis] * 2 + np.arange( 2 ) ).ravel()
+                valid = nodes < self._levels[k-1][0].shape[0]
+                q, nodes = q[valid], nodes[valid]
+
+        ls = self._leaf_size
+        q     = np.repeat( q, ls )
+        slots = ( nodes[:,np.newaxis] * ls + np.arange( ls ) ).ravel()
+        valid = slots < self._order.size
+        q, objs = q[valid], self._order[slots[valid]]
+
+        if len( self._pending ) > 0:
+            pending = np.array( self._pending, dtype=np.int64 )
+            q    = np.concatenate( ( q, np.repeat( np.arange( nq ), pending.size ) ) )
+            objs = np.concatenate( ( objs, np.tile( pending, nq ) ) )
+
+        b = self._bounds[objs]
+        keep = overlap( q, b[:,0], b[:,1] )
+        return q[keep], objs[keep]
+
+
+    def _query( self, queries, overlap, key=None, limit=None ):
+        # runs the search in chunks, overlap and key get the query
+        # arrays of the chunk
+        self._refit()
+        nq = queries[0].shape[0]
+        qparts, oparts = [], []
+        for start in range( 0, nq, _query_chunk ):
+            chunk = [ a[start:start+_query_chunk] for a in queries ]
+            q, objs = self._search( chunk[0].shape[0], overlap( *chunk ) )
+            qparts.append( q + start )
+            oparts.append( objs )
+        if nq == 0:
+            return []
+        q, objs = np.concatenate( qparts ), np.concatenate( oparts )
+        if key is None:
+            order = np.lexsort( ( objs, q ) )
+        else:
+            order = np.lexsort( ( key( q, objs ), q ) )
+        q, objs = q[order], objs[order]
+        if limit is not None:
+            # only the first limit results of every query
+            first = np.searchsorted( q, q )
+            keep  = ( np.arange( q.size ) - first ) < limit
+            q, objs = q[keep], objs[keep]
+        return self._group( nq, q, objs )
+
+
+    def _group( self, nq, q, objs ):
+        splits = np.searchsorted( q, np.arange( 1, nq ) )
+        return [ [ self._objects[i] for i in part ]
+                 for part in np.split( objs, splits ) ]
+
+
+    def _single( self, value, ndim ):
+        value = np.asarray( value, dtype=float )
+        single = ( value.ndim == ndim )
+        if single:
+            value = value[np.newaxis]
+        return value, single
+
+
+    """
+    query_box
+
+    returns the objects whose boxes overlap the given boxes
+
+    :param boxes : (2,3) array with minimum and maximum corner or
+                   (N,2,3) array of boxes
+    :return      : list of objects or a list of lists for many boxes
+    """
+    def query_box( self, boxes ):
+        boxes, single = self._single( boxes, 2 )
+        def overlap( qmin, qmax ):
+            def test( q, bmin, bmax ):
+                return ( ( bmin <= qmax[q] ) & ( bmax >= qmin[q] ) ).all( axis=1 )
+            return test
+        result = self._query( [ boxes[:,0], boxes[:,1] ], overlap )
+        if single:
+            return result[0]
+        return result
+
+
+    """
+    query_point
+
+    returns the objects whose boxes are closer than radius to the
+    points, with radius 0 the objects whose boxes contain the points
+
+    :param points : point or (N,3) array of points
+    :param radius : search radius, a single value or one per point
+    :return       : list of objects or a list of lists for many points
+    """
+    def query_point( self, points, radius=0. ):
+        points, single = self._single( points, 1 )
+        radius = np.broadcast_to( np.asarray( radius, dtype=float ),
+                                  ( points.shape[0], ) )
+        def overlap( p, r ):
+            r2 = r**2
+            def test( q, bmin, bmax ):
+                return _box_within( p[q], bmin, bmax, r2[q] )
+            return test
+        result = self._query( [ points, radius ], overlap )
+        if single:
+            return result[0]
+        return result
+
+
+    """
+    query_ray
+
+    returns the objects whose boxes are hit by the rays, sorted by the
+    distance of the entry point
+
+    :param origins    : origin or (N,3) array of origins
+    :param directions : direction or (N,3) array of directions
+    :param tmax       : maximal ray parameter
+    :return           : list of objects or a list of lists for many rays
+    """
+    def query_ray( self, origins, directions, tmax=np.inf ):
+        origins, single = self._single( origins, 1 )
+        directions, _   = self._single( directions, 1 )
+        directions = np.broadcast_to( directions, origins.shape )
+        tmax = np.broadcast_to( np.asarray( tmax, dtype=float ),
+                                ( origins.shape[0], ) )
+
+        def entry( o, inv, bmin, bmax ):
+            with np.errstate( invalid='ignore' ):
+                t1 = ( bmin - o ) * inv
+                t2 = ( bmax - o ) * inv
+            # fmin/fmax ignore the nan of rays in the plane of a side
+            tnear = np.fmin( t1, t2 ).max( axis=1 )
+            tfar  = np.fmax( t1, t2 ).min( axis=1 )
+            return tnear, tfar
+
+        def overlap( o, d, tm ):
+            with np.errstate( divide='ignore' ):
+                inv = 1. / d
+            def test( q, bmin, bmax ):
+                tnear, tfar = entry( o[q], inv[q], bmin, bmax )
+                return ( bmin <= bmax ).all( axis=1 ) & ( tnear <= tfar ) \
+                     & ( tfar >= 0. ) & ( tnear <= tm[q] )
+            return test
+
+        with np.errstate( divide='ignore' ):
+            inv = 1. / directions
+        def key( q, objs ):
+            b = self._bounds[objs]
+            return entry( origins[q], inv[q], b[:,0], b[:,1] )[0]
+
+        result = self._query( [ origins, directions, tmax ], overlap, key=key )
+        if single:
+            return result[0]
+        return result
+
+
+    """
+    nearest
+
+    returns the k objects with the closest boxes for every point,
+    sorted by the distance
+
+    :param points : point or (N,3) array of points
+    :param k      : number of objects
+    :return       : list of objects or a list of lists for many points
+    """
+    def nearest( self, points, k=1 ):
+        points, single = self._single( points, 1 )
+        self._refit()
+        nq = points.shape[0]
+        result = [ [] for i in range( nq ) ]
+
+        # extents of all objects with bounds
+        finite = np.isfinite( self._bounds ).all( axis=( 1, 2 ) )
+        if finite.any() and ( nq > 0 ):
+            bmin = self._bounds[finite,0].min( axis=0 )
+            bmax = self._bounds[finite,1].max( axis=0 )
+            extent = bmax - bmin
+            diag2  = ( extent**2 ).sum()
+
+            # first search radius from the mean density of the objects,
+            # the radius is doubled for points with less than k objects
+            ext  = extent[extent > 0.]
+            if ext.size == 0:
+                r2 = 1.
+            else:
+                r2 = ( ext.prod() * k / finite.sum() ) ** ( 2. / ext.size )
+            radius2 = np.full( nq, r2 )
+
+            def overlap( p, r2 ):
+                def test( q, bmin, bmax ):
+                    return _box_within( p[q], bmin, bmax, r2[q] )
+                return test
+
+            todo = np.arange( nq )
+            while todo.size > 0:
+                pts = points[todo]
+                def key( q, objs ):
+                    b = self._bounds[objs]
+                    return _box_distance2( pts[q], b[:,0], b[:,1] )
+                found = self._query( [ pts, radius2[todo] ], overlap,
+                                     key=key, limit=k )
+                left = []
+                for i, r in zip( todo, found ):
+                    if ( len( r ) >= k ) or ( radius2[i] == np.inf ):
+                        result[i] = r
+                    else:
+                        left.append( i )
+                todo = np.array( left, dtype=np.int64 )
+                radius2[todo] *= 4.
+                # the complete scene is reached
+                radius2[todo[radius2[todo] > 4. * diag2 + 1.]] = np.inf
+
+        if single:
+            return result[0]
+        return result
@@ -1,10 +1,13 @@
 # pypovcamera.py
 
 # written by: Oliver Cordes 2015-06-14
-# changed by: Oliver Cordes 2018-03-12
+# changed by: Oliver Cordes 2020-05-16
 
 
-from pypovlib.pypovbase import PovBasicObject, convertarray2vector
+from pypovlib.pypovbase import PovBasicObject, Point3D, convertarray2vector, \
+                               transform_bounds
+
+import numpy as np
 
 from math import *
 
@@ -12,6 +15,116 @@ from math import *
 # camera types
 camera_perspective = 1
 
+# results of the frustum tests
+frustum_outside = 0
+frustum_partial = 1
+frustum_inside  = 2
+
+
+class PovFrustum( object ):
+    """
+    PovFrustum
+
+    the view volume of a perspective camera, objects are tested with
+    their bounding boxes. The margin widens the volume in all directions,
+    so objects near the border which are visible in reflections or by
+    their shadows are kept.
+
+    The lists push their transformations while their items are tested,
+    so the bounding boxes of the items are tested in world coordinates.
+    """
+    _counter = 0
+
+    def __init__( self, location, look_at, sky, angle, aspect_ratio, margin=0. ):
+        d = look_at - location
+        d = d / np.sqrt( ( d**2 ).sum() )
+        right = np.cross( sky, d )
+        if np.allclose( right, 0. ):
+            # sky parallel to the view direction
+            right = np.cross( [ 1., 0., 0. ] if abs( d[0] ) < 0.9 else [ 0., 1., 0. ], d )
+        right = right / np.sqrt( ( right**2 ).sum() )
+        up = np.cross( d, right )
+
+        # the near plane and the four side planes, the normals point inside
+        normals = [ d ]
+        if angle < 180.:
+            th = tan( radians( angle ) / 2. )
+            tv = th / aspect_ratio
+            normals += [ d * th - right, d * th + right, d * tv - up, d * tv + up ]
+        normals = np.array( normals )
+        normals /= np.sqrt( ( normals**2 ).sum( axis=1 ) )[:,np.newaxis]
+
+        self._normals    = normals
+        self._abs        = np.abs( normals )
+        self._offsets    = normals.dot( location ) - margin
+        self._matrices   = [ None ]
+
+        self.tested      = 0
+        self.culled      = 0
+
+        # identifies the frustum in the serialization cache
+        PovFrustum._counter += 1
+        self.key         = PovFrustum._counter
+
+
+    def push( self, matrix ):
+        top = self._matrices[-1]
+        if top is not None:
+            matrix = matrix.dot( top )
+        self._matrices.append( matrix )
+
+
+    def pop( self ):
+        self._matrices.pop()
+
+
+    def classify( self, bounds ):
+        top = self._matrices[-1]
+        if top is not None:
+            bounds = transform_bounds( bounds, top )
+        center = ( bounds[0] + bounds[1] ) * 0.5
+        half   = ( bounds[1] - bounds[0] ) * 0.5
+        c = self._normals.dot( center )
+        r = self._abs.dot( half )
+        if ( c + r < self._offsets ).any():
+            return frustum_outside
+        if ( c - r >= self._offsets ).all():
+            return frustum_inside
+        return frustum_partial
+
+
+    def _bounds( self, val ):
+        if hasattr( val, 'bounding_box' ):
+            return val.bounding_box()
+        if isinstance( val, Point3D ):
+            val = val.xyz
+        if isinstance( val, np.ndarray ):
+            if val.shape == ( 2, 3 ):
+                return val
+            if val.shape == ( 3, ):
+                return np.array( [ val, val ] )
+        return None
+
+
+    def is_visible( self, val ):
+        bounds = self._bounds( val )
+        if bounds is None:
+            return True
+        self.tested += 1
+        if self.classify( bounds ) == frustum_outside:
+            self.culled += 1
+            return False
+        return True
+
+
+    def cache_key( self, val ):
+        # the output of lists which are completely inside doesn't depend
+        # on the frustum
+        bounds = self._bounds( val )
+        if ( bounds is not None ) and ( self.classify( bounds ) == frustum_inside ):
+            return None
+        return self.key
+
 
 
 class PovCamera( PovBasicObject ):
@@ -64,6 +177,30 @@ class PovCamera( PovBasicObject ):
     def _update_camera( self ):
         self._normal = self._look_at - self._location
 
+    """
+    frustum
+
+    returns the view volume of the camera as PovFrustum or None if the
+    camera has no simple perspective view
+
+    :param image_aspect : width/height of the image if known
+    :param margin       : widens the view volume in all directions
+    """
+    def frustum( self, image_aspect=None, margin=0. ):
+        if self._vp:
+            return None
+        if self._aspect_ratio is not None:
+            # no right vector is written, POV-Ray uses the default
+            aspect_ratio = 4. / 3.
+        elif image_aspect is not None:
+            aspect_ratio = image_aspect
+        else:
+            # unknown image size, assume a square image
+            aspect_ratio = 1.
+        return PovFrustum( self._location, self._look_at, self._sky,
+                           self._angle, aspect_ratio, margin=margin )
+
+
     def check_visible( self, val ):
         if ( isinstance( val, list ) == True ) or ( isinstance( val, tuple ) == True ):
             for i in val:
@@ -72,7 +209,10 @@ class PovCamera( PovBasicObject ):
                     return ret
             return False
         else:
-            return True
+            frustum = self.frustum()
+            if frustum is None:
+                return True
+            return frustum.is_visible( val )
 
     def zoom( self, factor ):
         pass
@@ -86,7 +226,7 @@ class PovCamera( PovBasicObject ):
         self._update_camera()
 
     def set_sky( self, sky ):
-        self._look_at = convertarray2vector( sky )
+        self._sky = convertarray2vector( sky )
         self._update_camera()
 
     #     focal_point <0.20,1.5,-5.25>
@@ -134,15 +274,15 @@ class PovCamera( PovBasicObject ):
             #                                                    self._location[1],
             #                                                    self._location[2] ),
             #                                                    indent=indent+1 )
-            self._write_indent( ffile, 'look_at <%f,%f,%f>\n' % ( self._look_at[0],
+            self._write_format( ffile, 'look_at <%f,%f,%f>\n', ( self._look_at[0],
                                                                 self._look_at[1],
                                                                 self._look_at[2] ),
                                                                 indent=indent+1 )
-            self._write_indent( ffile, 'sky <%f,%f,%f>\n' % ( self._sky[0],
+            self._write_format( ffile, 'sky <%f,%f,%f>\n', ( self._sky[0],
                                                                 self._sky[1],
                                                                 self._sky[2] ),
                                                                 indent=indent+1 )
-            self._write_indent( ffile, 'angle %f\n' % ( self._angle ),
+            self._write_format( ffile, 'angle %f\n', ( self._angle, ),
                                                                indent=indent+1 )
         else:
             # taken from: http://www.f-lohmueller.de/pov_tut/camera_light/arc_persp_d1.htm
@@ -164,11 +304,11 @@ class PovCamera( PovBasicObject ):
             Cam_Ho = sqrt(pow(Cam_V[0],2)+pow(Cam_V[2] ,2))
             Cam_Y  = self._look_at[1] - self._location[1]
 
-            self._write_indent( ffile, 'location <%f,%f,%f>\n' % ( 0,
+            self._write_format( ffile, 'location <%f,%f,%f>\n', ( 0,
                                                                self._look_at[1],
                                                                -Cam_Ho ),
                                                                indent=indent+1 )
-            self._write_indent( ffile, 'look_at <%f,%f,%f>\n' % ( self._look_at[0],
+            self._write_format( ffile, 'look_at <%f,%f,%f>\n', ( self._look_at[0],
                                                                self._look_at[1],
                                                                self._look_at[2] ),
                                                                indent=indent+1 )
@@ -176,11 +316,11 @@ class PovCamera( PovBasicObject ):
             #                                                       self._sky[1],
             #                                                       self._sky[2] ),
             #                                                       indent=indent+1 )
-            self._write_indent( ffile, 'angle %f\n' % ( self._angle ),
+            self._write_format( ffile, 'angle %f\n', ( self._angle, ),
                                                                indent=indent+1 )
-            self._write_indent( ffile, 'matrix<1,0,0, 0,1,0, 0,%f,1, 0,0,0>\n' % ( Cam_Y/Cam_Ho ), indent=indent+1 )
-            self._write_indent( ffile, 'Reorient_Trans(z,<%f,0,%f>)\n' % ( Cam_V[0], Cam_V[2] ), indent=indent+1 )
-            self._write_indent( ffile, 'translate<%f,0,%f>\n' % ( self._look_at[0],
+            self._write_format( ffile, 'matrix<1,0,0, 0,1,0, 0,%f,1, 0,0,0>\n', ( Cam_Y/Cam_Ho, ), indent=indent+1 )
+            self._write_format( ffile, 'Reorient_Trans(z,<%f,0,%f>)\n', ( Cam_V[0], Cam_V[2] ), indent=indent+1 )
+            self._write_format( ffile, 'translate<%f,0,%f>\n', ( self._look_at[0],
                                                               self._look_at[2] ), indent=indent+1 )
         # end of self._vp
 
@@ -218,6 +358,10 @@ class PovCamera( PovBasicObject ):
             i.update_frame( framenr )
 
 
+    def needs_timeline( self ):
+        return len( self._sequences ) > 0
+
+
 # taken from: http://www.f-lohmueller.de/pov_tut/camera_light/arc_persp_d1.htm
 ##include "transforms.inc"
 ##declare Cam_V = Camera_Look_At - Camera_Location;
@@ -243,6 +387,11 @@ class PovCamera2Fluchtpunkt( PovCamera ):
                             comment=comment )
         self.add_include( 'transforms.inc' )
 
+
+    def frustum( self, image_aspect=None, margin=0. ):
+        # the shifted view is not a simple frustum
+        return None
+
     def write_pov( self, ffile, indent=0 ):
         self._write_indent( ffile, 'camera{\n', indent=indent )
         if self._camera_type == camera_perspective:
@@ -255,11 +404,11 @@ class PovCamera2Fluchtpunkt( PovCamera ):
         Cam_Ho = sqrt(pow(Cam_V[0],2)+pow(Cam_V[2] ,2))
         Cam_Y  = self._look_at[1] - self._location[1]
 
-        self._write_indent( ffile, 'location <%f,%f,%f>\n' % ( 0,
+        self._write_format( ffile, 'location <%f,%f,%f>\n', ( 0,
                                                                self._look_at[1],
                                                                -Cam_Ho ),
                                                                indent=indent+1 )
-        self._write_indent( ffile, 'look_at <%f,%f,%f>\n' % ( self._look_at[0],
+        self._write_format( ffile, 'look_at <%f,%f,%f>\n', ( self._look_at[0],
                                                                self._look_at[1],
                                                                self._look_at[2] ),
                                                                indent=indent+1 )
@@ -267,11 +416,11 @@ class PovCamera2Fluchtpunkt( PovCamera ):
         #                                                       self._sky[1],
         #                                                       self._sky[2] ),
         #                                                       indent=indent+1 )
-        self._write_indent( ffile, 'angle %f\n' % ( self._angle ),
+        self._write_format( ffile, 'angle %f\n', ( self._angle, ),
                                                                indent=indent+1 )
-        self._write_indent( ffile, 'matrix<1,0,0, 0,1,0, 0,%f,1, 0,0,0>\n' % ( Cam_Y/Cam_Ho ), indent=indent+1 )
-        self._write_indent( ffile, 'Reorient_Trans(z,<%f,0,%f>)\n' % ( Cam_V[0], Cam_V[2] ), indent=indent+1 )
-        self._write_indent( ffile, 'translate<%f,0,%f>\n' % ( self._look_at[0],
+        self._write_format( ffile, 'matrix<1,0,0, 0,1,0, 0,%f,1, 0,0,0>\n', ( Cam_Y/Cam_Ho, ), indent=indent+1 )
+        self._write_format( ffile, 'Reorient_Trans(z,<%f,0,%f>)\n', ( Cam_V[0], Cam_V[2] ), indent=indent+1 )
+        self._write_format( ffile, 'translate<%f,0,%f>\n', ( self._look_at[0],
                                                               self._look_at[2] ), indent=indent+1 )
 
         if self._aspect_ratio is None:
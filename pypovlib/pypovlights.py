@@ -1,7 +1,7 @@
 # pypovlights.py
 
 # wirtten by: Oliver Cordes 2015-05-02
-# changed by: Oliver Cordes 2020-05-03
+# changed by: Oliver Cordes 2020-05-16
 
 import sys
 
@@ -20,8 +20,13 @@ from pypovlib.pypovobjects import *
 # basic definitions of the light_source object
 #
 class PovBasicLights(PovObject):
+    __slots__ = ( '_translate', '_rotate', '_scale', '_rotate_anchor',
+                  'bound_object', 'fade_distance', 'fade_power', 'looks_like',
+                  # set by the bound objects, see PovCSGObject.rotate
+                  'rotate', 'translate' )
+
     def __init__( self, comment=None ):
-        PovBasicObject.__init__( self, comment=comment )
+        PovObject.__init__( self, comment=comment )
 
         self._translate     = None
         self._rotate        = None
@@ -70,13 +75,13 @@ class PovBasicLights(PovObject):
             self._write_indent( ffile, '%s\n' % self.looks_like, indent+2 )
             self._write_indent( ffile, '}\n', indent+1 )
         if self._scale is not None:
-            self._write_indent(ffile, 'scale %s\n' % self._scale, indent+1)
+            self._write_format( ffile, 'scale %s\n', ( self._scale, ), indent+1 )
         if self._translate is not None:
-            self._write_indent( ffile, 'translate %s\n' % self._translate, indent+1 )
+            self._write_format( ffile, 'translate %s\n', ( self._translate, ), indent+1 )
         if self.fade_distance is not None:
-            self._write_indent( ffile, 'fade_distance %f\n' % self.fade_distance, indent+1 )
+            self._write_format( ffile, 'fade_distance %f\n', ( self.fade_distance, ), indent+1 )
         if self.fade_power is not None:
-            self._write_indent( ffile, 'fade_power %f\n' % self.fade_power, indent+1 )
+            self._write_format( ffile, 'fade_power %f\n', ( self.fade_power, ), indent+1 )
         self._write_indent( ffile, '}\n', indent )
 
 
@@ -87,6 +92,8 @@ class PovBasicLights(PovObject):
 # simple light_source object from raw povray code
 #
 class PovTextLights( PovBasicLights ):
+    __slots__ = ( '_macrocmd', )
+
     def __init__( self, macrocmd, comment=None ):
         PovBasicLights.__init__( self )
 
@@ -99,12 +106,17 @@ class PovTextLights( PovBasicLights ):
 
 # basic definition of light types
 class PovBasicLightObject( PovBasicLights ):
+    __slots__ = ( '__xyz', '__color', '_time_origin' )
+
     def __init__( self, xyz, color, comment=None ):
         PovBasicLights.__init__( self, comment )
 
         self.__xyz   = Point3D( xyz )
         self.__color = color
 
+        # positions before the first rotation by a time function
+        self._time_origin = None
+
 
     @property
     def xyz(self):
@@ -113,7 +125,7 @@ class PovBasicLightObject( PovBasicLights ):
 
     @xyz.setter
     def xyz(self, val):
-        self.__xyz = val
+        self.__xyz = Point3D(val)
 
 
     def verify( self ):
@@ -124,31 +136,32 @@ class PovBasicLightObject( PovBasicLights ):
         if self._rotate is None:
             return x
 
-        # correct for rotation
-        zero_delta = (x - self._rotate_anchor).copy()
-        x = self._rotate_anchor.copy()  # start with the anchor point
+        # rotate around the anchor point like POV-Ray does, x first,
+        # then y and z
+        m = pov_rotate_matrix( self._rotate )
+        x = transform_points( Point3D( x ).xyz - self._rotate_anchor, m )[0]
 
-        # correct for rotation
-        r = self._rotate * np.pi / 180.0
+        return Point3D( x + self._rotate_anchor )
 
-        # x-axis
-        newxyz = zero_delta.copy()
-        newxyz[1] =   zero_delta[1] * np.cos( r[0] ) - zero_delta[2] * np.sin( r[0] )
-        newxyz[2] =   zero_delta[1] * np.sin( r[0] ) + zero_delta[2] * np.cos( r[0] )
 
-        # y-axis
-        zero_delta = newxyz.copy()
-        newxyz[0] =   zero_delta[0] * np.cos( r[1] ) + zero_delta[2] * np.sin( r[1] )
-        newxyz[2] = - zero_delta[0] * np.sin( r[1] ) + zero_delta[2] * np.cos( r[1] )
+    def _light_points( self ):
+        # all positions which follow the rotation of the light
+        return [ self.__xyz ]
 
-        # z-axis
-        zero_delta = newxyz.copy()
-        newxyz[0] =   zero_delta[0] * np.cos( r[2] ) - zero_delta[1] * np.sin( r[2] )
-        newxyz[1] =   zero_delta[0] * np.sin( r[2] ) + zero_delta[1] * np.cos( r[2] )
 
-        x += newxyz
+    def _set_light_points( self, points ):
+        self.__xyz = points[0]
 
-        return Point3D( x )
+
+    def _set_time_property( self, name, value ):
+        # the rotation is applied to the positions when the light is
+        # written, a time function always rotates the original positions
+        if name == 'rotate':
+            if self._time_origin is None:
+                self._time_origin = self._light_points()
+            else:
+                self._set_light_points( [ p.copy() for p in self._time_origin ] )
+        PovBasicLights._set_time_property( self, name, value )
 
 
     def correct_params( self ):
@@ -158,13 +171,15 @@ class PovBasicLightObject( PovBasicLights ):
 
 
     def write_lights( self, ffile, indent=0 ):
-        self._write_indent( ffile, '%s\n' % self.__xyz, indent+1 )
+        self._write_format( ffile, '%s\n', ( self.__xyz, ), indent+1 )
         self._write_indent( ffile, 'color %s\n' % self.__color, indent+1 )
 
 
 # Spotlight
 #
 class PovSpotLightBase( PovBasicLightObject ):
+    __slots__ = ( '__point_at', 'light_type', 'radius', 'tightness', 'falloff' )
+
     def __init__(self,
                  light_type,
                  xyz,
@@ -188,8 +203,18 @@ class PovSpotLightBase( PovBasicLightObject ):
 
 
     def correct_params( self ):
-        PovBasicLightObject.correct_params( self )
+        # the rotation has to be applied to point_at before it is cleared
         self.__point_at = self._correct_position( self.__point_at )
+        PovBasicLightObject.correct_params( self )
+
+
+    def _light_points( self ):
+        return PovBasicLightObject._light_points( self ) + [ self.__point_at ]
+
+
+    def _set_light_points( self, points ):
+        PovBasicLightObject._set_light_points( self, points )
+        self.__point_at = points[1]
 
 
     def write_lights( self, ffile, indent=0 ):
@@ -199,17 +224,19 @@ class PovSpotLightBase( PovBasicLightObject ):
 
         self._write_indent( ffile, '%s\n' % self.light_type, indent+1 )
 
-        self._write_indent( ffile, 'point_at %s\n' % self.__point_at, indent+1 )
+        self._write_format( ffile, 'point_at %s\n', ( self.__point_at, ), indent+1 )
 
         if self.radius is not None:
-            self._write_indent( ffile, 'radius %f\n' % self.radius, indent+1 )
+            self._write_format( ffile, 'radius %f\n', ( self.radius, ), indent+1 )
         if self.tightness is not None:
-            self._write_indent( ffile, 'tightness %f\n' % self.tightness, indent+1 )
+            self._write_format( ffile, 'tightness %f\n', ( self.tightness, ), indent+1 )
         if self.falloff is not None:
-            self._write_indent( ffile, 'falloff %f\n' % self.falloff, indent+1 )
+            self._write_format( ffile, 'falloff %f\n', ( self.falloff, ), indent+1 )
 
 
 class PovSpotLight(PovSpotLightBase):
+    __slots__ = ()
+
     def __init__(self,
                  xyz,
                  color,
@@ -220,6 +247,8 @@ class PovSpotLight(PovSpotLightBase):
 
 
 class PovCylinderLight( PovSpotLightBase ):
+    __slots__ = ()
+
     def __init__( self,
                   xyz,
                   color,
@@ -231,6 +260,8 @@ class PovCylinderLight( PovSpotLightBase ):
 
 
 class PovAreaLight(PovBasicLightObject):
+    __slots__ = ('_axis1', '_axis2', '_dim1', '_dim2', 'adaptive', 'jitter')
+
     def __init__(self,
                  xyz,
                  color,
@@ -260,7 +291,7 @@ class PovAreaLight(PovBasicLightObject):
 
         PovBasicLightObject.write_lights( self, ffile, indent )
 
-        self._write_indent(ffile, 'area_light %s, %s, %s, %s\n' % (self._axis1,
+        self._write_format(ffile, 'area_light %s, %s, %s, %s\n', (self._axis1,
                                                                  self._axis2,
                                                                  self._dim1,
                                                                  self._dim2 ), indent+1)
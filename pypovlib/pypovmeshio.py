@@ -0,0 +1,491 @@
+# pypovmeshio.py
+#
+# streaming loaders for OBJ, STL and PLY files which create PovMesh2
+# objects directly, all data is parsed in chunks into numpy arrays
+#
+# written by: Oliver Cordes 2020-05-16
+# changed by: Oliver Cordes 2020-05-16
+
+import sys, os
+
+try:
+    import numpy as np
+except:
+    print( 'Please install numpy to use with pypovlib!!' )
+    sys.exit( 1 )
+
+
+from pypovlib.pypovobjects import PovMesh2, weld_vertices, _index_array
+
+
+# constants
+
+# number of bytes read per chunk from text files
+_chunk_bytes = 1 << 26
+
+# number of records read per chunk from binary files
+_chunk_records = 1 << 20
+
+
+_ply_types = { 'char':   'i1', 'int8':    'i1',
+               'uchar':  'u1', 'uint8':   'u1',
+               'short':  'i2', 'int16':   'i2',
+               'ushort': 'u2', 'uint16':  'u2',
+               'int':    'i4', 'int32':   'i4',
+               'uint':   'u4', 'uint32':  'u4',
+               'float':  'f4', 'float32': 'f4',
+               'double': 'f8', 'float64': 'f8' }
+
+
+# helper functions
+
+def _concatenate( chunks, cols, dtype ):
+    if len( chunks ) == 0:
+        return np.zeros( ( 0, cols ), dtype=dtype )
+    return np.concatenate( chunks ).astype( dtype, copy=False )
+
+
+def _parse_numbers( lines, keyword, dtype=float ):
+    # all lines start with keyword, parse all numbers of the lines at once
+    text = ''.join( lines ).replace( keyword, ' ' )
+    return np.fromstring( text, dtype=dtype, sep=' ' )
+
+
+def _parse_rows( lines, keyword, cols ):
+    values = _parse_numbers( lines, keyword )
+    if values.size == len( lines ) * cols:
+        return values.reshape( ( -1, cols ) )
+
+    # mixed number of components, e.g. vertex colors in a few lines
+    rows = np.zeros( ( len( lines ), cols ) )
+    for nr, l in enumerate( lines ):
+        rows[nr] = [ float( i ) for i in l.split()[1:cols+1] ]
+    return rows
+
+
+def _triangulate( sizes, corners ):
+    # fan triangulation of polygons, corners holds the corner data of
+    # all polygons one after another
+    starts = np.cumsum( sizes ) - sizes
+    ntri   = sizes - 2
+    first  = np.repeat( starts, ntri )
+    k      = np.arange( ntri.sum() ) - np.repeat( np.cumsum( ntri ) - ntri, ntri )
+    return np.stack( ( corners[first],
+                       corners[first + k + 1],
+                       corners[first + k + 2] ), axis=1 )
+
+
+def _create_mesh( vertices, faces, normals=None, uvs=None,
+                  normal_indices=None, uv_indices=None,
+                  weld=False, weld_tolerance=0., dtype=np.float64,
+                  comment=None ):
+    faces = _index_array( faces )
+    if weld:
+        vertices, faces, kept = weld_vertices( vertices, faces, tolerance=weld_tolerance )
+        # per vertex data follows the kept vertices
+        if ( normals is not None ) and ( normal_indices is None ):
+            normals = normals[kept]
+        if ( uvs is not None ) and ( uv_indices is None ):
+            uvs = uvs[kept]
+
+    if normals is not None:
+        normals = normals.astype( dtype, copy=False )
+    if uvs is not None:
+        uvs = uvs.astype( dtype, copy=False )
+    if normal_indices is not None:
+        normal_indices = _index_array( normal_indices )
+    if uv_indices is not None:
+        uv_indices = _index_array( uv_indices )
+
+    return PovMesh2( vertex_vectors=vertices.astype( dtype, copy=False ),
+                     normal_vectors=normals,
+                     uv_vectors=uvs,
+                     face_indices=faces,
+                     normal_indices=normal_indices,
+                     uv_indices=uv_indices,
+                     comment=comment )
+
+
+# OBJ files
+
+def _obj_faces( lines, counts ):
+    # returns polygon sizes and the corner indices (position, uv, normal)
+    body = ''.join( lines ).replace( 'f', ' ' )
+    token = lines[0].split()[1]
+    if '//' in token:
+        cols = 3
+        body = body.replace( '//', '/0/' )
+    else:
+        cols = token.count( '/' ) + 1
+    values = np.fromstring( body.replace( '/', ' ' ), dtype=np.int64, sep=' ' )
+
+    sizes = np.array( [ len( l.split() ) - 1 for l in lines ], dtype=np.int64 )
+    if values.size != sizes.sum() * cols:
+        raise ValueError( 'OBJ faces with mixed index formats are not supported!' )
+    corners = values.reshape( ( -1, cols ) )
+
+    # relative indices count back from the last defined element
+    if ( corners < 0 ).any():
+        for c in range( cols ):
+            before = np.repeat( counts[:, min( c, 2 )], sizes )
+            neg = corners[:, c] < 0
+            corners[neg, c] += before[neg] + 1
+
+    return sizes, corners
+
+
+def load_obj( filename, weld=False, weld_tolerance=0., dtype=np.float64,
+              comment=None ):
+    """
+    load_obj
+
+    reads a Wavefront OBJ file into a PovMesh2 object, polygons are
+    triangulated, the uv and normal indices are kept if given
+
+    :param filename       : name of the OBJ file
+    :param weld           : merge identical vertices
+    :param weld_tolerance : welding distance
+    :param dtype          : float type of the stored vectors, e.g. np.float32
+    :param comment        : comment of the mesh
+    """
+    vchunks, tchunks, nchunks = [], [], []
+    fchunks, ftchunks, fnchunks = [], [], []
+    nv, nt, nn = 0, 0, 0
+
+    with open( filename, 'r' ) as f:
+        while True:
+            lines = f.readlines( _chunk_bytes )
+            if len( lines ) == 0:
+                break
+
+            vl = [ l for l in lines if l.startswith( 'v ' ) ]
+            tl = [ l for l in lines if l.startswith( 'vt' ) ]
+            nl = [ l for l in lines if l.startswith( 'vn' ) ]
+            fl = [ l for l in lines if l.startswith( 'f ' ) ]
+
+            counts = None
+            if ( len( fl ) > 0 ) and ( '-' in ''.join( fl ) ):
+                # number of elements defined before each face
+                counts = []
+                cv, ct, cn = nv, nt, nn
+                for l in lines:
+                    if l.startswith( 'v ' ):
+                        cv += 1
+                    elif l.startswith( 'vt' ):
+                        ct += 1
+                    elif l.startswith( 'vn' ):
+                        cn += 1
+                    elif l.startswith( 'f ' ):
+                        counts.append( ( cv, ct, cn ) )
+                counts = np.array( counts, dtype=np.int64 )
+
+            if len( vl ) > 0:
+                vchunks.append( _parse_rows( vl, 'v', 3 ) )
+            if len( tl ) > 0:
+                tchunks.append( _parse_rows( tl, 'vt', 2 ) )
+            if len( nl ) > 0:
+                nchunks.append( _parse_rows( nl, 'vn', 3 ) )
+            nv += len( vl )
+            nt += len( tl )
+            nn += len( nl )
+
+            if len( fl ) > 0:
+                sizes, corners = _obj_faces( fl, counts )
+                fchunks.append( _triangulate( sizes, corners[:, 0] ) - 1 )
+                if corners.shape[1] > 1 and ( corners[:, 1] > 0 ).all():
+                    ftchunks.append( _triangulate( sizes, corners[:, 1] ) - 1 )
+                if corners.shape[1] > 2 and ( corners[:, 2] > 0 ).all():
+                    fnchunks.append( _triangulate( sizes, corners[:, 2] ) - 1 )
+
+    vertices = _concatenate( vchunks, 3, dtype )
+    faces    = _concatenate( fchunks, 3, np.int64 )
+
+    uvs, uv_indices = None, None
+    if ( len( tchunks ) > 0 ) and ( len( ftchunks ) == len( fchunks ) ):
+        uvs        = _concatenate( tchunks, 2, dtype )
+        uv_indices = _concatenate( ftchunks, 3, np.int64 )
+
+    normals, normal_indices = None, None
+    if ( len( nchunks ) > 0 ) and ( len( fnchunks ) == len( fchunks ) ):
+        normals        = _concatenate( nchunks, 3, dtype )
+        normal_indices = _concatenate( fnchunks, 3, np.int64 )
+
+    return _create_mesh( vertices, faces, normals=normals, uvs=uvs,
+                         normal_indices=normal_indices, uv_indices=uv_indices,
+                         weld=weld, weld_tolerance=weld_tolerance,
+                         dtype=dtype, comment=comment )
+
+
+# STL files
+
+def _is_binary_stl( filename ):
+    size = os.path.getsize( filename )
+    with open( filename, 'rb' ) as f:
+        header = f.read( 84 )
+    if len( header ) < 84:
+        return False
+    nr = np.frombuffer( header[80:84], dtype='<u4' )[0]
+    if size == 84 + 50 * int( nr ):
+        return True
+    return not header.lstrip().startswith( b'solid' )
+
+
+def load_stl( filename, weld=True, weld_tolerance=0., dtype=np.float64,
+              comment=None ):
+    """
+    load_stl
+
+    reads a binary or ASCII STL file into a PovMesh2 object, STL files
+    store every triangle with its own vertices, so identical vertices
+    are welded by default
+
+    :param filename       : name of the STL file
+    :param weld           : merge identical vertices
+    :param weld_tolerance : welding distance
+    :param dtype          : float type of the stored vectors, e.g. np.float32
+    :param comment        : comment of the mesh
+    """
+    chunks = []
+    if _is_binary_stl( filename ):
+        record = np.dtype( [ ( 'normal', '<f4', 3 ),
+                             ( 'v',      '<f4', ( 3, 3 ) ),
+                             ( 'attr',   '<u2' ) ] )
+        with open( filename, 'rb' ) as f:
+            f.seek( 80 )
+            nr = int( np.fromfile( f, dtype='<u4', count=1 )[0] )
+            while nr > 0:
+                data = np.fromfile( f, dtype=record, count=min( nr, _chunk_records ) )
+                if data.size == 0:
+                    break
+                chunks.append( data['v'].reshape( ( -1, 3 ) ).astype( dtype ) )
+                nr -= data.size
+    else:
+        with open( filename, 'r' ) as f:
+            while True:
+                lines = f.readlines( _chunk_bytes )
+                if len( lines ) == 0:
+                    break
+                vl = [ l for l in lines if l.lstrip().startswith( 'vertex' ) ]
+                if len( vl ) > 0:
+                    chunks.append( _parse_numbers( vl, 'vertex' ).reshape( ( -1, 3 ) ).astype( dtype ) )
+
+    vertices = _concatenate( chunks, 3, dtype )
+    faces    = np.arange( vertices.shape[0], dtype=np.int64 ).reshape( ( -1, 3 ) )
+
+    return _create_mesh( vertices, faces, weld=weld,
+                         weld_tolerance=weld_tolerance,
+                         dtype=dtype, comment=comment )
+
+
+# PLY files
+
+def _read_ply_header( f ):
+    if f.readline().strip() != b'ply':
+        raise ValueError( 'File is not a PLY file!' )
+    fmt = None
+    elements = []
+    while True:
+        line = f.readline()
+        if len( line ) == 0:
+            raise ValueError( 'PLY header without end_header!' )
+        words = line.decode( 'ascii' ).split()
+        if len( words ) == 0:
+            continue
+        if words[0] == 'format':
+            fmt = words[1]
+        elif words[0] == 'element':
+            elements.append( ( words[1], int( words[2] ), [] ) )
+        elif words[0] == 'property':
+            if words[1] == 'list':
+                elements[-1][2].append( ( words[4], _ply_types[words[2]], _ply_types[words[3]] ) )
+            else:
+                elements[-1][2].append( ( words[2], _ply_types[words[1]], None ) )
+        elif words[0] == 'end_header':
+            break
+    return fmt, elements
+
+
+def _ply_vertex_columns( props ):
+    names = [ p[0] for p in props ]
+    def columns( *keys ):
+        for k in keys:
+            if all( [ i in names for i in k ] ):
+                return [ names.index( i ) for i in k ]
+        return None
+    return ( columns( ( 'x', 'y', 'z' ) ),
+             columns( ( 'nx', 'ny', 'nz' ) ),
+             columns( ( 'u', 'v' ), ( 's', 't' ), ( 'texture_u', 'texture_v' ) ) )
+
+
+def _ply_list_dtype( props, endian, n ):
+    # a record with a fixed list size n
+    fields = []
+    for name, ptype, itype in props:
+        if itype is None:
+            fields.append( ( name, endian + ptype ) )
+        else:
+            fields.append( ( name + '_count', endian + ptype ) )
+            fields.append( ( name, endian + itype, n ) )
+    return np.dtype( fields )
+
+
+def _ply_binary_faces( f, count, props, endian ):
+    lprops = [ p for p in props if p[2] is not None ]
+    name = lprops[0][0]
+
+    # assume all faces have the size of the first one
+    pos = f.tell()
+    probe = np.fromfile( f, dtype=_ply_list_dtype( props, endian, 0 ), count=1 )
+    f.seek( pos )
+    n = int( probe[name + '_count'][0] )
+
+    sizes, corners = [], []
+    dtype = _ply_list_dtype( props, endian, n )
+    while count > 0:
+        pos = f.tell()
+        nr = min( count, _chunk_records )
+        data = np.fromfile( f, dtype=dtype, count=nr )
+        if ( data.size == nr ) and ( data[name + '_count'] == n ).all():
+            sizes.append( np.full( data.size, n, dtype=np.int64 ) )
+            corners.append( data[name].reshape( -1 ).astype( np.int64 ) )
+            count -= data.size
+            continue
+
+        # mixed polygon sizes, read the rest face by face
+        f.seek( pos )
+        if len( props ) != 1:
+            raise ValueError( 'PLY faces with mixed sizes and extra properties are not supported!' )
+        ctype  = np.dtype( endian + lprops[0][1] )
+        itype  = np.dtype( endian + lprops[0][2] )
+        for i in range( count ):
+            k = int( np.fromfile( f, dtype=ctype, count=1 )[0] )
+            sizes.append( np.array( [ k ], dtype=np.int64 ) )
+            corners.append( np.fromfile( f, dtype=itype, count=k ).astype( np.int64 ) )
+        count = 0
+
+    return np.concatenate( sizes ), np.concatenate( corners )
+
+
+def _ply_ascii_lines( f, count ):
+    while count > 0:
+        lines = f.readlines( _chunk_bytes )
+        if len( lines ) == 0:
+            break
+        if len( lines ) > count:
+            # keep the file position at the end of this element
+            f.seek( f.tell() - sum( [ len( l ) for l in lines[count:] ] ) )
+            lines = lines[:count]
+        count -= len( lines )
+        yield lines
+
+
+def load_ply( filename, weld=False, weld_tolerance=0., dtype=np.float64,
+              comment=None ):
+    """
+    load_ply
+
+    reads an ASCII or binary PLY file into a PovMesh2 object, vertex
+    normals and uv coordinates are used if present, polygons are
+    triangulated
+
+    :param filename       : name of the PLY file
+    :param weld           : merge identical vertices
+    :param weld_tolerance : welding distance
+    :param dtype          : float type of the stored vectors, e.g. np.float32
+    :param comment        : comment of the mesh
+    """
+    vertices, normals, uvs = None, None, None
+    faces = np.zeros( ( 0, 3 ), dtype=np.int64 )
+
+    with open( filename, 'rb' ) as f:
+        fmt, elements = _read_ply_header( f )
+        if fmt == 'ascii':
+            endian = None
+        elif fmt == 'binary_little_endian':
+            endian = '<'
+        elif fmt == 'binary_big_endian':
+            endian = '>'
+        else:
+            raise ValueError( 'Unknown PLY format \'%s\'!' % fmt )
+
+        for name, count, props in elements:
+            has_list = any( [ p[2] is not None for p in props ] )
+
+            if name == 'vertex':
+                cxyz, cnormal, cuv = _ply_vertex_columns( props )
+                vchunks, nchunks, tchunks = [], [], []
+                if endian is None:
+                    for lines in _ply_ascii_lines( f, count ):
+                        data = np.fromstring( b''.join( lines ).decode( 'ascii' ), sep=' ' )
+                        data = data.reshape( ( len( lines ), -1 ) )
+                        vchunks.append( data[:, cxyz].astype( dtype ) )
+                        if cnormal is not None:
+                            nchunks.append( data[:, cnormal].astype( dtype ) )
+                        if cuv is not None:
+                            tchunks.append( data[:, cuv].astype( dtype ) )
+                else:
+                    record = np.dtype( [ ( p[0], endian + p[1] ) for p in props ] )
+                    names  = record.names
+                    left   = count
+                    while left > 0:
+                        data = np.fromfile( f, dtype=record, count=min( left, _chunk_records ) )
+                        left -= data.size
+                        vchunks.append( np.stack( [ data[names[i]] for i in cxyz ], axis=1 ).astype( dtype ) )
+                        if cnormal is not None:
+                            nchunks.append( np.stack( [ data[names[i]] for i in cnormal ], axis=1 ).astype( dtype ) )
+                        if cuv is not None:
+                            tchunks.append( np.stack( [ data[names[i]] for i in cuv ], axis=1 ).astype( dtype ) )
+                vertices = _concatenate( vchunks, 3, dtype )
+                if cnormal is not None:
+                    normals = _concatenate( nchunks, 3, dtype )
+                if cuv is not None:
+                    uvs = _concatenate( tchunks, 2, dtype )
+
+            elif ( name == 'face' ) and has_list:
+                if endian is None:
+                    sizes, corners = [], []
+                    for lines in _ply_ascii_lines( f, count ):
+                        for l in lines:
+                            values = l.split()
+                            k = int( values[0] )
+                            sizes.append( k )
+                            corners.append( np.array( values[1:k+1], dtype=np.int64 ) )
+                    sizes   = np.array( sizes, dtype=np.int64 )
+                    corners = np.concatenate( corners )
+                else:
+                    sizes, corners = _ply_binary_faces( f, count, props, endian )
+                faces = _triangulate( sizes, corners )
+
+            else:
+                # skip unused elements
+                if endian is None:
+                    for lines in _ply_ascii_lines( f, count ):
+                        pass
+                elif has_list:
+                    raise ValueError( 'PLY element \'%s\' with lists cannot be skipped!' % name )
+                else:
+                    record = np.dtype( [ ( p[0], endian + p[1] ) for p in props ] )
+                    f.seek( record.itemsize * count, os.SEEK_CUR )
+
+    if vertices is None:
+        raise ValueError( 'PLY file without vertices!' )
+
+    return _create_mesh( vertices, faces, normals=normals, uvs=uvs,
+                         weld=weld, weld_tolerance=weld_tolerance,
+                         dtype=dtype, comment=comment )
+
+
+def load_mesh( filename, **kwargs ):
+    """
+    load_mesh
+
+    selects the loader by the file extension (.obj, .stl, .ply)
+    """
+    ext = os.path.splitext( filename )[1].lower()
+    if ext == '.obj':
+        return load_obj( filename, **kwargs )
+    elif ext == '.stl':
+        return load_stl( filename, **kwargs )
+    elif ext == '.ply':
+        return load_ply( filename, **kwargs )
+    raise ValueError( 'Unknown mesh format \'%s\'!' % ext )
@@ -1,9 +1,12 @@
 # pypovobjects.py
 
 # wirtten by: Oliver Cordes 2015-02-27
-# changed by: Oliver Cordes 2020-02-12
+# changed by: Oliver Cordes 2020-05-16
 
-import sys, os
+import sys, os, io
+import hashlib
+import itertools
+import time
 
 try:
     import numpy as np
@@ -25,6 +28,13 @@ __author__ =  'Oliver Cordes (C) 2015-2020'
 
 # variables
 pypovstatistics = {}
+pypovcachestatistics = { 'hits': 0, 'misses': 0 }
+pypovwriterstatistics = { 'rows': 0, 'chars': 0, 'seconds': 0. }
+
+pypovcullingstatistics = { 'tested': 0, 'culled': 0 }
+
+
+_fmt_full_matrix = 'matrix <' + ','.join( [ '%f' ] * 12 ) + '>\n'
 
 
 # open variables
@@ -51,12 +61,61 @@ def print_statistics():
     print( '-------------------------------------' )
     print( 'Total        : %i POVRay objects' % total )
     print( '' )
+    print_writer_statistics()
+    print_culling_statistics()
 
 
 def reset_statistics():
     pypovstatistics = {}
 
 
+def print_writer_statistics():
+    rows    = pypovwriterstatistics['rows']
+    if rows == 0: return
+    chars   = pypovwriterstatistics['chars']
+    seconds = pypovwriterstatistics['seconds']
+    print( 'Writer statistics (mesh data):' )
+    print( ' rows        : %i' % rows )
+    print( ' written     : %.1f MB' % ( chars / 1e6 ) )
+    print( ' time        : %.2f s' % seconds )
+    if seconds > 0.:
+        print( ' throughput  : %.1f MB/s, %.0f rows/s' % ( chars / 1e6 / seconds,
+                                                      rows / seconds ) )
+    print( '' )
+
+
+def print_culling_statistics():
+    tested = pypovcullingstatistics['tested']
+    if tested == 0: return
+    culled = pypovcullingstatistics['culled']
+    print( 'Camera culling statistics:' )
+    print( ' tested      : %i' % tested )
+    print( ' culled      : %i (%.1f%%)' % ( culled, 100. * culled / tested ) )
+    print( '' )
+
+
+def reset_culling_statistics():
+    pypovcullingstatistics['tested'] = 0
+    pypovcullingstatistics['culled'] = 0
+
+
+def print_cache_statistics():
+    hits   = pypovcachestatistics['hits']
+    misses = pypovcachestatistics['misses']
+    total  = hits + misses
+    if total == 0: return
+    print( 'Cache statistics:' )
+    print( ' hits        : %i' % hits )
+    print( ' misses      : %i' % misses )
+    print( ' hit rate    : %.1f%%' % ( 100. * hits / total ) )
+    print( '' )
+
+
+def reset_cache_statistics():
+    pypovcachestatistics['hits']   = 0
+    pypovcachestatistics['misses'] = 0
+
+
 def _write_prefix_file( ffile ):
     ffile.write( '// this file is generated\n// from %s V%s written by %s\n\n' % ( __libname__,
                                                                                     __version__,
@@ -79,9 +138,24 @@ def _copy_file( ffile, filename, comment ):
 
 
 class PovObject(PovBasicObject):
+    __slots__ = ('_hidden', '_dynamic', '_instance_name',
+                 '_parents', '_pov_cache', '_pov_cache_key',
+                 '_texture', '_photons', '_lights',
+                 '_global_data', '_image_data',
+                 'time_abs', 'time_delta', 'frame_number')
+
     _name = 'PovObject'
+
     def __init__(self, comment=None):
         PovBasicObject.__init__(self, comment=comment)
+
+        # serialization cache, see write_pov_cached
+        self._dynamic       = False
+        self._instance_name = None
+        self._parents       = None
+        self._pov_cache     = None
+        self._pov_cache_key = None
+
         # all objects are active by default
         self.hidden  = False
 
@@ -101,12 +175,105 @@ class PovObject(PovBasicObject):
         self.frame_number = 0
 
 
+    @property
+    def hidden(self):
+        return self._hidden
+
+
+    @hidden.setter
+    def hidden(self, val):
+        self._hidden = val
+        self.invalidate()
+
+
+    """
+    invalidate
+
+    drops the cached serialization of this object and of all lists
+    which contain this object. Must be called if the output of an object
+    is changed without using the attribute setters.
+    """
+    def invalidate(self):
+        self._pov_cache = None
+        if self._parents is not None:
+            for p in self._parents:
+                p.invalidate()
+
+
+    def add_parent(self, parent):
+        if self._parents is None:
+            self._parents = [parent]
+        elif parent not in self._parents:
+            self._parents.append(parent)
+
+
+    """
+    write_pov_cached
+
+    writes the object like write_pov, if the emitter has the cache
+    enabled the serialized text is stored and reused until the object
+    is invalidated. Lists keep the fragments of their items, so the
+    text is shared and not copied.
+    """
+    def write_pov_cached(self, ffile, indent=0):
+        if not isinstance(ffile, PovEmitter):
+            self.write_pov(ffile, indent=indent)
+            return
+
+        if ffile.stubs is not None:
+            # hashing of the instances, see PovFile._collect_instances
+            stub = ffile.stubs.get(id(self))
+            if stub is not None:
+                written = ffile.written
+                ffile.write_indent(stub, indent)
+                ffile.stubbed += ffile.written - written
+                return
+
+        if ffile.instances is not None:
+            name = ffile.instances.get(id(self))
+            if name is not None:
+                self.write_pov_instance(ffile, name, indent=indent)
+                return
+
+        if not ffile.cache:
+            self.write_pov(ffile, indent=indent)
+            return
+
+        key = (indent, ffile.compact)
+        if (ffile.frustum is not None) and isinstance(self, PovBaseList):
+            # culled items change the output of lists
+            key += (ffile.frustum.cache_key(self),)
+        if (self._pov_cache is not None) and (self._pov_cache_key == key):
+            pypovcachestatistics['hits'] += 1
+        else:
+            pypovcachestatistics['misses'] += 1
+            if self.is_streaming():
+                self.write_pov(ffile, indent=indent)
+                return
+            rec = ffile.record()
+            self.write_pov(rec, indent=indent)
+            fragments = rec.fragments
+            if not isinstance(self, PovBaseList):
+                fragments = [''.join(fragments)]
+            self._pov_cache     = (fragments, rec.written)
+            self._pov_cache_key = key
+
+        ffile.write_fragments(*self._pov_cache)
+
+
     def _write_texture(self, ffile, indent=0):
         if self._texture is None: return
 
+        if isinstance(ffile, PovEmitter):
+            declared = ffile.declared
+        else:
+            declared = None
+
         for texture in self._texture:
             if ( isinstance(texture, (PovTexture, PovPigment, PovTextureRaw))):
                 texture.write_pov(ffile, indent)
+            elif (declared is not None) and (texture in declared):
+                self._write_indent(ffile, 'texture{ %s }\n' % declared[texture], indent)
             else:
                 self._write_indent(ffile, 'texture{\n', indent)
                 self._write_indent(ffile, '%s\n' % texture, indent+1)
@@ -117,6 +284,9 @@ class PovObject(PovBasicObject):
         if self._texture is None:
             self._texture = []
         self._texture.append(texture)
+        if isinstance(texture, PovTextureObject):
+            texture.add_parent(self)
+        self.invalidate()
 
 
     def set_texture_color(self, color):
@@ -133,6 +303,7 @@ class PovObject(PovBasicObject):
 
     def set_photons(self, photons):
         self._photons = photons
+        self.invalidate()
 
 
     def set_lights(self, lights):
@@ -147,11 +318,15 @@ class PovObject(PovBasicObject):
             for l in self._lights:
                 l.write_pov(ffile, indent=indent)
 
-    def add_stat_count(self, cat):
+
+    def collect_lights(self):
+        return list(self._lights or ())
+
+    def add_stat_count(self, cat, count=1):
         if cat in pypovstatistics.keys():
-            pypovstatistics[cat] += 1
+            pypovstatistics[cat] += count
         else:
-            pypovstatistics[cat] = 1
+            pypovstatistics[cat] = count
 
 
     def do_statistics(self):
@@ -176,6 +351,70 @@ class PovObject(PovBasicObject):
         pass
 
 
+    def set_dynamic(self, dynamic=True):
+        # marks objects which are changed from the outside during an
+        # animation, e.g. by the animation hook of another object
+        self._dynamic = dynamic
+
+
+    def update_properties(self, time_abs, framenr):
+        if self._time_functions:
+            PovBasicObject.update_properties(self, time_abs, framenr)
+            self.invalidate()
+        if self._lights is not None:
+            for l in self._lights:
+                l.update_properties(time_abs, framenr)
+
+
+    def is_animated(self):
+        # objects which implement one of the animation hooks or have
+        # time functions can change their output with every frame
+        if self._time_functions:
+            return True
+        return self.needs_timeline()
+
+
+    def needs_timeline(self):
+        if self._dynamic:
+            return True
+        cls = type(self)
+        try:
+            return _animated_classes[cls]
+        except KeyError:
+            animated = False
+            for hook in _animation_hooks:
+                if getattr(cls, hook) not in _static_hooks[hook]:
+                    animated = True
+            _animated_classes[cls] = animated
+            return animated
+
+
+    def has_animation(self):
+        return self.is_animated()
+
+
+    def is_streaming(self):
+        # streaming objects write more data than should be kept in memory,
+        # they are never cached or hashed for instancing
+        return False
+
+
+    def _local_bounds(self):
+        # bounds without the own transformations, None if unknown
+        return None
+
+
+    """
+    bounding_box
+
+    returns the world-space extents of the object as (2,3) array with
+    the minimum and the maximum corner, or None if the extents are
+    unknown or infinite
+    """
+    def bounding_box(self):
+        return self._local_bounds()
+
+
     def add_global_data( self, filename ):
         if ( isinstance( filename, list ) == True ) or  ( isinstance( filename, tuple ) == True ):
             for i in filename:
@@ -204,25 +443,38 @@ class PovObject(PovBasicObject):
 
 
 class PovCSGObject( PovObject ):
+    __slots__ = ( '__rotation_matrix', '__rotate_before_translate', '__pre_commands',
+                  '__macros', '__full_matrix', '__rotate', '__translate', '__scale',
+                  '_instance_body' )
+
     _name = 'PovCSGObject'
+    # False for objects which don't write their transformations
+    _transformed   = True
+    # SDL statement for primitives which can be written as arrays,
+    # see PovCSGUnion.set_array_emission
+    _array_sdl     = None
+
     def __init__( self, comment=None ):
         PovObject.__init__( self, comment=comment )
+        self._instance_body            = False
         self.__rotation_matrix         = None
         self.__rotate_before_translate = True
-        self.__pre_commands            = []
+        self.__pre_commands            = ()
         self.reset_attributes()
 
     """
     reset_attributes
 
-    resets all povray attributes
+    resets all povray attributes, the lists are allocated with the
+    first entry
     """
     def reset_attributes(self):
-        self.__macros                  = []
-        self.__full_matrix             = []
-        self.__rotate                  = []
-        self.__translate               = []
-        self.__scale                   = []
+        self.__macros                  = ()
+        self.__full_matrix             = ()
+        self.__rotate                  = ()
+        self.__translate               = ()
+        self.__scale                   = ()
+        self.invalidate()
 
     """
     move_attributes
@@ -237,6 +489,7 @@ class PovCSGObject( PovObject ):
         self.__translate   = obj.__translate
         self.__scale       = obj.__scale
         obj.reset_attributes()
+        self.invalidate()
 
 
     @property
@@ -247,9 +500,10 @@ class PovCSGObject( PovObject ):
     @macros.setter
     def macros( self, new_macro ):
         if new_macro is None:
-            self.__macros = []
+            self.__macros = ()
         else:
-            self.__macros.append( new_macro )
+            self.__macros = appended( self.__macros, new_macro )
+        self.invalidate()
 
 
     @property
@@ -260,7 +514,7 @@ class PovCSGObject( PovObject ):
     @full_matrix.setter
     def full_matrix( self, val ):
         if val is None:
-            self.__full_matrix = []
+            self.__full_matrix = ()
         elif isinstance( val, ( list, tuple ) ):
             l = True
             if len( val ) == 12:   # check if matrices list or
@@ -272,18 +526,20 @@ class PovCSGObject( PovObject ):
 
             if l:
                 for m in val:
-                    self.__full_matrix.append(Matrix3D(m))
+                    self.__full_matrix = appended(self.__full_matrix, Matrix3D(m))
             else:
-                self.__full_matrix.append(Matrix3D(val))
+                self.__full_matrix = appended(self.__full_matrix, Matrix3D(val))
 
         else:
-            self.__full_matrix.append(Matrix3D(val))
+            self.__full_matrix = appended(self.__full_matrix, Matrix3D(val))
+        self.invalidate()
 
 
     def full_matrix_list( self, val ):
         if isinstance( val, ( list, tuple ) ):
             for m in val:
-                self.__full_matrix.append( convertarray2full_matrix( m ) )
+                self.__full_matrix = appended( self.__full_matrix, convertarray2full_matrix( m ) )
+        self.invalidate()
 
 
     @property
@@ -293,11 +549,12 @@ class PovCSGObject( PovObject ):
 
     @rotate.setter
     def rotate( self, new_rotate ):
+        self.invalidate()
         if new_rotate is None:
-            self.__rotate = []
+            self.__rotate = ()
         else:
             rotate = Point3D( new_rotate )
-            self.__rotate.append( rotate )
+            self.__rotate = appended( self.__rotate, rotate )
 
             if ( self._lights is not None):
                 # do the rotation also for bounded light objects
@@ -309,7 +566,8 @@ class PovCSGObject( PovObject ):
     def set_rotate( self, new_rotate ):
         deprecated( 'set_rotate' )
         rotate = Point3D( new_rotate )
-        self.__rotate.append( rotate )
+        self.__rotate = appended( self.__rotate, rotate )
+        self.invalidate()
 
         if ( self._lights is not None):
             # do the rotation also for bounded light objects
@@ -320,6 +578,7 @@ class PovCSGObject( PovObject ):
 
     def set_rotation_matrix( self, new_matrix ):
         self.__rotation_matrix = convertarray2matrix( new_matrix )
+        self.invalidate()
         if ( self._lights is not None):
             # do the rotation also for bounded light objects
             for l in self._lights:
@@ -331,6 +590,7 @@ class PovCSGObject( PovObject ):
         deprecated( 'set_translate' )
         translate = Point3D( new_translate )
         self.__translate = [ translate ]
+        self.invalidate()
 
         if ( self._lights is not None):
             # do the translation also for bounded light objects
@@ -341,17 +601,14 @@ class PovCSGObject( PovObject ):
 
     @property
     def translate( self ):
-        t = Point3D( [ 0., 0., 0.] )
-        for i in self.__translate:
-            t += i
-
-        return t
+        return Point3D.sum( self.__translate )
 
 
     @translate.setter
     def translate( self, val ):
         translate = Point3D( val )
-        self.__translate.append(translate)
+        self.__translate = appended(self.__translate, translate)
+        self.invalidate()
         if ( self._lights is not None ):
             # do the translation also for bounded light objects
             for l in self._lights:
@@ -361,19 +618,13 @@ class PovCSGObject( PovObject ):
 
     def get_translate( self ):
         deprecated( 'get_translate')
-        t = Point3D( [ 0., 0., 0.] )
-        for i in self.__translate:
-            t += i
-
-        return t
+        return Point3D.sum( self.__translate )
 
 
     def delta_translate( self, xyz ):
         dxyz = Point3D( xyz )
-        if ( self.__translate is None ):
-            self.__translate = [ dxyz ]
-        else:
-            self.__translate.append( dxyz )
+        self.__translate = appended( self.__translate, dxyz )
+        self.invalidate()
 
         if ( self._lights is not None):
             # do the translation also for bounded light objects
@@ -384,6 +635,22 @@ class PovCSGObject( PovObject ):
 
     def set_rotate_before_translate( self, val ):
         self.__rotate_before_translate = val
+        self.invalidate()
+
+
+    def _set_time_property( self, name, value ):
+        # time functions give the complete transformation of the frame
+        if name == 'rotate':
+            self.__rotate = ()
+        elif name == 'translate':
+            self.__translate = ()
+        elif name == 'scale':
+            self.__scale = ()
+        # the properties replace the deprecated set_<name> methods
+        if isinstance( getattr( type( self ), name, None ), property ):
+            setattr( self, name, value )
+        else:
+            PovObject._set_time_property( self, name, value )
 
 
     @property
@@ -404,16 +671,102 @@ class PovCSGObject( PovObject ):
 
     @scale.setter
     def scale( self, new_scale ):
-        self.__scale.append(Point3D(new_scale))
+        self.__scale = appended(self.__scale, Point3D(new_scale))
+        self.invalidate()
 
 
     def set_scale( self, new_scale ):
         deprecated( 'set_scale')
-        self.__scale.append(Point3D(new_scale))
+        self.__scale = appended(self.__scale, Point3D(new_scale))
+        self.invalidate()
 
 
     def add_pre_commands( self, new_command ):
-        self.__pre_commands.append( new_command )
+        self.__pre_commands = appended( self.__pre_commands, new_command )
+        self.invalidate()
+
+
+    """
+    has_transforms
+
+    returns True if the object has any transformations, macros or
+    pre commands
+    """
+    def has_transforms( self ):
+        return ( len( self.__macros ) > 0 ) or ( len( self.__full_matrix ) > 0 ) \
+            or ( len( self.__rotate ) > 0 ) or ( len( self.__translate ) > 0 ) \
+            or ( len( self.__scale ) > 0 ) or ( len( self.__pre_commands ) > 0 ) \
+            or ( self.__rotation_matrix is not None )
+
+
+    """
+    transform_matrix
+
+    returns the 4x4 matrix of all transformations in the order in
+    which they are written, macros and pre commands are not included
+    """
+    def transform_matrix( self ):
+        m = np.identity( 4 )
+        for fm in self.__full_matrix:
+            m = m.dot( pov_full_matrix( fm ) )
+        for sc in self.__scale:
+            m = m.dot( pov_scale_matrix( sc ) )
+
+        rot = np.identity( 4 )
+        for r in self.__rotate:
+            rot = rot.dot( pov_rotate_matrix( r ) )
+        if self.__rotation_matrix is not None:
+            rot[:3,:3] = rot[:3,:3].dot( self.__rotation_matrix )
+        trans = np.identity( 4 )
+        for t in self.__translate:
+            trans = trans.dot( pov_translate_matrix( t ) )
+
+        if self.__rotate_before_translate:
+            return m.dot( rot ).dot( trans )
+        else:
+            return m.dot( trans ).dot( rot )
+
+
+    """
+    fold_transforms
+
+    replaces the full matrices, scalings, rotations and translations by
+    a single matrix if it is written shorter than the original
+    transformations, macros and pre commands are not changed. Returns
+    the number of folded objects.
+    """
+    def fold_transforms( self ):
+        if self._transformed == False: return 0
+        if len( self.__full_matrix ) + len( self.__scale ) + len( self.__rotate ) \
+            + len( self.__translate ) + ( self.__rotation_matrix is not None ) < 2:
+            return 0
+
+        m = self.transform_matrix()
+        values = np.append( m[:3,:3].ravel(), m[3,:3] )
+        # removes the rounding noise of the rotations
+        values[np.abs( values ) < 1e-12] = 0.
+        matrix = Matrix3D( values + 0. )
+
+        original = io.StringIO()
+        self._write_geometrics( original )
+        if len( 'matrix <{}>\n'.format( matrix ) ) >= len( original.getvalue() ):
+            return 0
+
+        self.__full_matrix             = [ matrix ]
+        self.__scale                   = ()
+        self.__rotate                  = ()
+        self.__translate               = ()
+        self.__rotation_matrix         = None
+        self.__rotate_before_translate = True
+        self.invalidate()
+        return 1
+
+
+    def bounding_box( self ):
+        bounds = self._local_bounds()
+        if ( bounds is None ) or ( self._transformed == False ):
+            return bounds
+        return transform_bounds( bounds, self.transform_matrix() )
 
 
     def _write_macros( self, ffile, indent=0 ):
@@ -423,7 +776,10 @@ class PovCSGObject( PovObject ):
 
     def _write_full_matrix( self, ffile, indent=0 ):
         for m in self.__full_matrix:
-            self._write_indent(ffile, 'matrix <{}>\n'.format(m), indent)
+            if self._is_compact( ffile ):
+                self._write_format( ffile, _fmt_full_matrix, tuple( m.matrix[:,:3].ravel().tolist() ), indent )
+            else:
+                self._write_indent(ffile, 'matrix <{}>\n'.format(m), indent)
             #self._write_indent( ffile,
             #                    'matrix <{},{},{},{},{},{},{},{},{},{},{},{}>\n'.format( *m ),
             #                    indent )
@@ -432,36 +788,28 @@ class PovCSGObject( PovObject ):
     def _write_scale( self, ffile, indent=0 ):
         if len(self.__scale) == 0: return
         for sc in self.__scale:
-            self._write_indent( ffile, 'scale %s\n' % sc, indent )
+            self._write_format( ffile, 'scale <%f,%f,%f>\n', sc.xyz_tuple, indent )
 
 
     def _write_translate( self, ffile, indent=0 ):
         if self.__translate is None: return
         for t in self.__translate:
-           self._write_indent( ffile, 'translate %s\n' % t, indent )
+           self._write_format( ffile, 'translate <%f,%f,%f>\n', t.xyz_tuple, indent )
 
 
     def _write_rotate( self, ffile, indent=0 ):
         for r in self.__rotate:
-           self._write_indent( ffile, 'rotate %s\n' % r, indent )
+           self._write_format( ffile, 'rotate <%f,%f,%f>\n', r.xyz_tuple, indent )
 
 
     def _write_rotation_matrix( self, ffile, indent=0 ):
         if self.__rotation_matrix is None: return
-        self._write_indent( ffile,
-             'matrix <%f,%f,%f,%f,%f,%f,%f,%f,%f,0,0,0>\n' % ( self.__rotation_matrix[0][0],
-                                                               self.__rotation_matrix[0][1],
-                                                               self.__rotation_matrix[0][2],
-                                                               self.__rotation_matrix[1][0],
-                                                               self.__rotation_matrix[1][1],
-                                                               self.__rotation_matrix[1][2],
-                                                               self.__rotation_matrix[2][0],
-                                                               self.__rotation_matrix[2][1],
-                                                               self.__rotation_matrix[2][2] ),
-                                                               indent )
+        self._write_format( ffile, 'matrix <%f,%f,%f,%f,%f,%f,%f,%f,%f,0,0,0>\n',
+                            tuple( np.ravel( self.__rotation_matrix ).tolist() ), indent )
 
 
     def _write_geometrics( self, ffile, indent=0 ):
+        if self._instance_body: return
         self._write_full_matrix( ffile, indent=indent )
         self._write_scale( ffile, indent=indent )
         if self.__rotate_before_translate:
@@ -487,11 +835,44 @@ class PovCSGObject( PovObject ):
         self._write_geometrics(ffile, indent=indent)
 
 
+    """
+    write_pov_body
+
+    writes the object without its own transformations, this is the
+    part which is shared by all instances of a structure
+    """
+    def write_pov_body( self, ffile, indent=0 ):
+        self._instance_body = True
+        try:
+            self.write_pov( ffile, indent=indent )
+        finally:
+            self._instance_body = False
+
+
+    def write_pov_instance( self, ffile, name, indent=0 ):
+        self._write_indent( ffile, 'object{\n', indent )
+        self._write_indent( ffile, '%s\n' % name, indent+1 )
+        self._write_geometrics( ffile, indent=indent+1 )
+        self._write_indent( ffile, '}\n', indent )
+
+
     def write_pov( self, ffile, indent = 0 ):
         PovObject.write_pov( self, ffile, indent=indent )
 
 
+def _disc_extent( normal ):
+    # extent per axis of a disc with radius 1 and the given normal
+    n = np.asarray( normal, dtype=float )
+    length = np.sqrt( ( n**2 ).sum() )
+    if length == 0.:
+        return np.ones( 3 )
+    n = n / length
+    return np.sqrt( np.clip( 1. - n**2, 0., 1. ) )
+
+
 class PovCSGBox( PovCSGObject ):
+    __slots__ = ( '_xyz1', '_xyz2' )
+
     _name = 'Box'
     def __init__( self, xyz1, xyz2, comment=None):
         PovCSGObject.__init__( self,comment=comment )
@@ -503,15 +884,27 @@ class PovCSGBox( PovCSGObject ):
         self._xyz2 = xyz2
 
 
+    def _local_bounds( self ):
+        return bounds_from_points( [ self._xyz1.xyz_tuple, self._xyz2.xyz_tuple ] )
+
+
+    _array_sdl = 'box{ %s, %s }'
+    def _array_values( self ):
+        return ( self._xyz1.xyz_tuple, self._xyz2.xyz_tuple )
+
+
     def write_pov( self, ffile, indent = 0 ):
         PovCSGObject.write_pov( self, ffile, indent=indent )
         self._write_indent( ffile, 'box{\n', indent )
-        self._write_indent( ffile, '%s %s\n' % ( self._xyz1, self._xyz2 ), indent+1 )
+        self._write_format( ffile, '<%f,%f,%f> <%f,%f,%f>\n',
+                            self._xyz1.xyz_tuple + self._xyz2.xyz_tuple, indent+1 )
         self._write_attributes( ffile, indent+1 )
         self._write_indent( ffile, '}\n', indent )
 
 
 class PovCSGBoxCenter( PovCSGBox ):
+    __slots__ = ()
+
     _name = 'BoxCenter'
     def __init__( self, xyz, dimension, comment=None ):
         PovCSGObject.__init__( self, comment=comment )
@@ -522,6 +915,8 @@ class PovCSGBoxCenter( PovCSGBox ):
 
 
 class PovCSGSphere( PovCSGObject ):
+    __slots__ = ( '_xyz', '_radius' )
+
     _name = 'Sphere'
     def __init__( self, xyz, radius, comment=None ):
         PovCSGObject.__init__( self, comment=comment )
@@ -529,15 +924,28 @@ class PovCSGSphere( PovCSGObject ):
         self._radius = radius
 
 
+    def _local_bounds( self ):
+        x, y, z = self._xyz.xyz_tuple
+        r = self._radius
+        return np.array( ( ( x - r, y - r, z - r ), ( x + r, y + r, z + r ) ) )
+
+
+    _array_sdl = 'sphere{ %s, %s }'
+    def _array_values( self ):
+        return ( self._xyz.xyz_tuple, self._radius )
+
+
     def write_pov( self, ffile, indent = 0 ):
         PovCSGObject.write_pov( self, ffile, indent=indent )
         self._write_indent( ffile, 'sphere{\n', indent )
-        self._write_indent( ffile, '%s, %f\n' % ( self._xyz, self._radius ), indent+1 )
+        self._write_format( ffile, '<%f,%f,%f>, %f\n', self._xyz.xyz_tuple + ( self._radius, ), indent+1 )
         self._write_attributes( ffile, indent+1 )
         self._write_indent( ffile, '}\n', indent )
 
 
 class PovCSGCylinder( PovCSGObject ):
+    __slots__ = ( '_xyz1', '_xyz2', '_radius' )
+
     _name = 'Cylinder'
     def __init__( self, xyz1, xyz2, radius, comment=None ):
         PovCSGObject.__init__( self, comment=comment )
@@ -546,15 +954,30 @@ class PovCSGCylinder( PovCSGObject ):
         self._radius = radius
 
 
+    def _local_bounds( self ):
+        xyz1, xyz2 = self._xyz1.xyz, self._xyz2.xyz
+        e = _disc_extent( xyz2 - xyz1 ) * self._radius
+        return np.array( [ np.minimum( xyz1, xyz2 ) - e,
+                           np.maximum( xyz1, xyz2 ) + e ] )
+
+
+    _array_sdl = 'cylinder{ %s, %s, %s }'
+    def _array_values( self ):
+        return ( self._xyz1.xyz_tuple, self._xyz2.xyz_tuple, self._radius )
+
+
     def write_pov( self, ffile, indent = 0 ):
         PovCSGObject.write_pov( self, ffile, indent=indent )
         self._write_indent( ffile, 'cylinder{\n', indent )
-        self._write_indent( ffile, '%s %s, %f\n' % ( self._xyz1, self._xyz2, self._radius ), indent+1 )
+        self._write_format( ffile, '<%f,%f,%f> <%f,%f,%f>, %f\n',
+                            self._xyz1.xyz_tuple + self._xyz2.xyz_tuple + ( self._radius, ), indent+1 )
         self._write_attributes( ffile, indent+1 )
         self._write_indent( ffile, '}\n', indent )
 
 
 class PovCSGTorus( PovCSGObject ):
+    __slots__ = ( '_radius_major', '_radius_minor' )
+
     _name = 'Torus'
     def __init__( self, radius_major, radius_minor, comment=None ):
         PovCSGObject.__init__( self, comment=comment )
@@ -562,16 +985,25 @@ class PovCSGTorus( PovCSGObject ):
         self._radius_minor = radius_minor
 
 
+    def _local_bounds( self ):
+        # the torus lies in the x-z plane
+        r = self._radius_major + self._radius_minor
+        return np.array( [ [ -r, -self._radius_minor, -r ],
+                           [  r,  self._radius_minor,  r ] ] )
+
+
     def write_pov( self, ffile, indent = 0 ):
         PovCSGObject.write_pov( self, ffile, indent=indent )
         self._write_indent( ffile, 'torus{\n', indent )
-        self._write_indent( ffile, '%f,%f\n' % ( self._radius_major,
-                                                 self._radius_minor  ), indent+1 )
+        self._write_format( ffile, '%f,%f\n', ( self._radius_major,
+                                                self._radius_minor ), indent+1 )
         self._write_attributes( ffile, indent+1 )
         self._write_indent( ffile, '}\n', indent )
 
 
 class PovCSGCone( PovCSGObject ):
+    __slots__ = ( '_xyz1', '_xyz2', '_radius1', '_radius2' )
+
     _name = 'Cone'
     def __init__( self, xyz1, radius1, xyz2, radius2, comment=None ):
         PovCSGObject.__init__( self, comment=comment )
@@ -581,18 +1013,28 @@ class PovCSGCone( PovCSGObject ):
         self._radius2 = radius2
 
 
+    def _local_bounds( self ):
+        xyz1, xyz2 = self._xyz1.xyz, self._xyz2.xyz
+        e = _disc_extent( xyz2 - xyz1 )
+        return np.array( [ np.minimum( xyz1 - e * self._radius1,
+                                       xyz2 - e * self._radius2 ),
+                           np.maximum( xyz1 + e * self._radius1,
+                                       xyz2 + e * self._radius2 ) ] )
+
+
     def write_pov( self, ffile, indent = 0 ):
         PovCSGObject.write_pov( self, ffile, indent=indent )
         self._write_indent( ffile, 'cone{\n', indent )
-        self._write_indent( ffile, '%s,%f,%s,%f\n' % ( self._xyz1,
-                                                    self._radius1,
-                                                    self._xyz2,
-                                                    self._radius2 ), indent +1 )
+        self._write_format( ffile, '<%f,%f,%f>,%f,<%f,%f,%f>,%f\n',
+                            self._xyz1.xyz_tuple + ( self._radius1, ) +
+                            self._xyz2.xyz_tuple + ( self._radius2, ), indent+1 )
         self._write_attributes( ffile, indent+1 )
         self._write_indent( ffile, '}\n', indent )
 
 
 class PovCSGPrism( PovCSGObject ):
+    __slots__ = ( '_y1', '_y2', '_points', '_closing_point' )
+
     _name = 'Prism'
     def __init__( self, y1, y2, points, comment=None, closing_point = False ):
         PovCSGObject.__init__( self, comment=comment )
@@ -603,6 +1045,13 @@ class PovCSGPrism( PovCSGObject ):
         self._closing_point = closing_point
 
 
+    def _local_bounds( self ):
+        # the points are in the x-z plane, the prism is swept along y
+        p = np.array( self._points, dtype=float )
+        return np.array( [ [ p[:,0].min(), min( self._y1, self._y2 ), p[:,1].min() ],
+                           [ p[:,0].max(), max( self._y1, self._y2 ), p[:,1].max() ] ] )
+
+
     def _verify( self ):
         if ( isinstance( self._points, (list,tuple) ) == False ):
             raise TypeError( 'points must be given as list or tuple!' )
@@ -620,28 +1069,30 @@ class PovCSGPrism( PovCSGObject ):
         l = len( self._points )
         if self._closing_point == False:
             l += 1
-        self._write_indent( ffile, '%f, %f, %i\n' % ( self._y1,
-                                                      self._y2,
-                                                      l ),
-                                                      indent+1 )
+        self._write_format( ffile, '%f, %f, %i\n', ( self._y1,
+                                                     self._y2,
+                                                     l ),
+                                                     indent+1 )
         first = True
         for i in self._points:
             if ( first == False ):
                 ffile.write( ',\n' )
             else:
                 first = False
-            self._write_indent( ffile, '<%f,%f>' % ( i[0], i[1] ), indent+1 )
+            self._write_format( ffile, '<%f,%f>', ( i[0], i[1] ), indent+1 )
 
         if self._closing_point == False:
             i = self._points[0]
             ffile.write( ',\n' )
-            self._write_indent( ffile, '<%f,%f>' % ( i[0], i[1] ), indent+1 )
+            self._write_format( ffile, '<%f,%f>', ( i[0], i[1] ), indent+1 )
         ffile.write( '\n' )
         self._write_attributes( ffile, indent+1 )
         self._write_indent( ffile, '}\n', indent )
 
 
 class PovCSGMacro( PovCSGObject ):
+    __slots__ = ( '_macrocmd', )
+
     _name = 'Macro'
     def __init__( self, comment=None, macrocmd=None ):
         PovCSGObject.__init__( self, comment=comment )
@@ -657,7 +1108,10 @@ class PovCSGMacro( PovCSGObject ):
 
 
 class PovDisc( PovCSGObject ):
+    __slots__ = ( '_xyz', '_normal', '_radius', '_hole_radius' )
+
     _name = 'Dics'
+    _transformed = False
     def __init__( self, xyz, normal, radius, hole_radius=None, comment=None ):
         PovCSGObject.__init__( self, comment=comment )
         self._xyz         = Point3D( xyz )
@@ -666,24 +1120,29 @@ class PovDisc( PovCSGObject ):
         self._hole_radius = hole_radius
 
 
+    def _local_bounds( self ):
+        e = _disc_extent( self._normal.xyz_tuple ) * self._radius
+        xyz = self._xyz.xyz
+        return np.array( [ xyz - e, xyz + e ] )
+
+
     def write_pov( self, ffile, indent = 0 ):
         PovCSGObject.write_pov( self, ffile, indent=indent )
         self._write_indent( ffile, 'disc{\n', indent )
+        values = self._xyz.xyz_tuple + self._normal.xyz_tuple + ( self._radius, )
         if self._hole_radius is None:
-            hole_radius = ''
+            self._write_format( ffile, '<%f,%f,%f>, <%f,%f,%f>, %f ', values, indent+1 )
         else:
-            hole_radius = ', %f' % ( self._hole_radius )
-        self._write_indent( ffile, '%s, %s, %f %s' % ( self._xyz ,
-                                                       self._normal,
-                                                       self._radius,
-                                                       hole_radius ),
-                                                       indent+1 )
+            self._write_format( ffile, '<%f,%f,%f>, <%f,%f,%f>, %f , %f', values + ( self._hole_radius, ),
+                                indent+1 )
         self._write_macros( ffile, indent+1 )
         self._write_texture( ffile, indent+1 )
         self._write_indent( ffile, '}\n', indent )
 
 
 class PovSkySphere( PovCSGObject ):
+    __slots__ = ()
+
     _name = 'SkySphere'
     def __init__( self, comment=None ):
         PovCSGObject.__init__( self, comment=comment )
@@ -696,6 +1155,18 @@ class PovSkySphere( PovCSGObject ):
         self._write_indent( ffile, '}\n', indent )
 
 
+class PovDeclareText( PovBasicObject ):
+    __slots__ = ( '_text', )
+
+    def __init__( self, text, comment=None ):
+        PovBasicObject.__init__( self, comment=comment )
+        self._text = text
+
+
+    def write_pov( self, ffile, indent=0 ):
+        ffile.write( self._text )
+
+
 # list classes
 
 class PovBaseList( object ):
@@ -704,7 +1175,7 @@ class PovBaseList( object ):
 
         self._includes    = []
         self._declares    = {}
-        self._macro_def   = []
+        self._macro_defs  = []
         self._extra_files = []
 
 
@@ -719,10 +1190,12 @@ class PovBaseList( object ):
             if incfile in self._includes:
                 pass
             else:
-                self._includes.append(incfile)
+                self._includes = appended(self._includes, incfile)
 
 
     def add_declare( self, key, value ):
+        if self._declares is None:
+            self._declares = {}
         if key in self._declares.keys():
             raise KeyError( 'key %s already in declares!' % key )
         else:
@@ -734,7 +1207,7 @@ class PovBaseList( object ):
             for i in macrodef:
                 self.add_macro( i )
         else:
-            self._macro_def.append( macrodef )
+            self._macro_defs = appended( self._macro_defs, macrodef )
 
 
     def add_extra_file(self, efile):
@@ -744,14 +1217,14 @@ class PovBaseList( object ):
         else:
             if os.access(efile, os.R_OK):
                 if efile not in self._extra_files:
-                    self._extra_files.append(efile)
+                    self._extra_files = appended(self._extra_files, efile)
             else:
                 print('WARNING: File \'%s\' not found!' % efile)
 
 
 
     def collect_includes( self ):
-        includes = self._includes
+        includes = list( self._includes )
         for i in self._items:
             if hasattr( i, 'collect_includes' ):
                 incl = i.collect_includes()
@@ -768,7 +1241,7 @@ class PovBaseList( object ):
 
 
     def collect_extra_files(self):
-        extra_files = self._extra_files
+        extra_files = list(self._extra_files)
 
         for i in self._items:
             if hasattr(i, 'collect_extra_files'):
@@ -786,7 +1259,7 @@ class PovBaseList( object ):
 
 
     def collect_declares( self ):
-        declares = self._declares
+        declares = dict( self._declares or {} )
         for i in self._items:
             if hasattr( i, 'collect_declares' ):
                 decl = i.collect_declares()
@@ -795,7 +1268,7 @@ class PovBaseList( object ):
             else:
                 decl = {}
 
-            if len( decl ) > 0:
+            if decl:
                 for i,j in decl.items():
                     if i in declares.keys():
                         #raise KeyError( 'key %s already in declares!' % i )
@@ -807,12 +1280,12 @@ class PovBaseList( object ):
 
 
     def collect_macro_defs( self ):
-        macro_defs = self._macro_def
+        macro_defs = list( self._macro_defs )
         for i in self._items:
             if hasattr( i, 'collect_macro_defs' ):
                 mdefs = i.collect_macro_defs()
-            elif hasattr( i, '_macro_def' ):
-                mdefs = i._macro_def
+            elif hasattr( i, '_macro_defs' ):
+                mdefs = i._macro_defs
             else:
                 mdefs = []
 
@@ -838,6 +1311,11 @@ class PovBaseList( object ):
         else:
             if self._verify_object( new_obj ) == True:
                 self._items.append( new_obj )
+                self._item_added( new_obj )
+
+
+    def _item_added( self, new_obj ):
+        pass
 
 
     def do_statistics( self ):
@@ -850,6 +1328,8 @@ class PovBaseList( object ):
 class PovCSGObjectList( PovBaseList, PovCSGObject ):
     _name = 'PovCSGObjectList'
     _D = 0.001
+    # items before this position keep their place in batch_triangles
+    _batch_start = 0
     def __init__( self, comment=None ):
         PovBaseList.__init__( self )
         PovCSGObject.__init__( self, comment=comment )
@@ -859,19 +1339,40 @@ class PovCSGObjectList( PovBaseList, PovCSGObject ):
             raise TypeError( 'new_obj must be PovObject or a derivative of PovCSGObject' )
         return True
 
+    def _item_added( self, new_obj ):
+        new_obj.add_parent( self )
+        self.invalidate()
+
     def write_pov( self, ffile, indent = 0 ):
         PovCSGObject.write_pov( self, ffile, indent=indent )
 
 
+    def write_array_data(self, ffile, frame_name):
+        # see PovCSGUnion.set_array_emission, returns the number of files
+        nr = 0
+        for i in self._items:
+            if isinstance(i, PovCSGObjectList):
+                nr += i.write_array_data(ffile, frame_name)
+        return nr
+
+
     def _write_items(self, ffile, indent=0):
+        compact = self._is_compact(ffile)
+        # items outside of the camera view are skipped
+        frustum = getattr(ffile, 'frustum', None)
+        if frustum is not None:
+            frustum.push(self.transform_matrix())
         nr = 1
         for i in self._items:
-            if i.hidden == False:
-                self._write_indent(ffile,
-                                   '// %s Item #%i\n' % (self._name, nr),
-                                   indent=indent)
-                i.write_pov(ffile, indent=indent)
+            if (i.hidden == False) and ((frustum is None) or frustum.is_visible(i)):
+                if not compact:
+                    self._write_indent(ffile,
+                                       '// %s Item #%i\n' % (self._name, nr),
+                                       indent=indent)
+                i.write_pov_cached(ffile, indent=indent)
             nr += 1
+        if frustum is not None:
+            frustum.pop()
 
 
     def write_lights( self, ffile, indent=0 ):
@@ -881,6 +1382,14 @@ class PovCSGObjectList( PovBaseList, PovCSGObject ):
         for i in self._items:
             i.write_lights( ffile, indent=indent )
 
+
+    def collect_lights( self ):
+        lights = PovCSGObject.collect_lights( self )
+        for i in self._items:
+            if hasattr( i, 'collect_lights' ):
+                lights.extend( i.collect_lights() )
+        return lights
+
     # animation handling
     def update_time( self, time_abs ):
         for i in self._items:
@@ -895,6 +1404,118 @@ class PovCSGObjectList( PovBaseList, PovCSGObject ):
     def update_frame( self, framenr ):
         for i in self._items:
             i.update_frame( framenr )
+            if i.is_animated():
+                i.invalidate()
+
+
+    def has_animation( self ):
+        if self.is_animated():
+            return True
+        for i in self._items:
+            if i.has_animation():
+                return True
+        return False
+
+
+    def update_properties( self, time_abs, framenr ):
+        PovCSGObject.update_properties( self, time_abs, framenr )
+        for i in self._items:
+            i.update_properties( time_abs, framenr )
+
+
+    def needs_timeline( self ):
+        if PovCSGObject.needs_timeline( self ):
+            return True
+        for i in self._items:
+            if i.needs_timeline():
+                return True
+        return False
+
+
+    def is_streaming( self ):
+        for i in self._items:
+            if i.is_streaming():
+                return True
+        return False
+
+
+    def _local_bounds( self ):
+        return combine_bounds( [ i.bounding_box() for i in self._items
+                                 if i.hidden == False ] )
+
+
+    def _write_bounded_by( self, ffile, indent=0 ):
+        # a box around all items in the coordinates of the list
+        bounds = self._local_bounds()
+        if bounds is None: return
+        self._write_indent( ffile, 'bounded_by{\n', indent )
+        self._write_format( ffile, 'box{ <%f,%f,%f> <%f,%f,%f> }\n',
+                            tuple( ( bounds[0] - self._D ).tolist() + ( bounds[1] + self._D ).tolist() ),
+                            indent+1 )
+        self._write_indent( ffile, '}\n', indent )
+
+
+    def fold_transforms( self, recursive=True ):
+        nr = PovCSGObject.fold_transforms( self )
+        if recursive:
+            for i in self._items:
+                if isinstance( i, PovCSGObjectList ):
+                    nr += i.fold_transforms( recursive=recursive )
+                else:
+                    nr += i.fold_transforms()
+        return nr
+
+
+    """
+    batch_triangles
+
+    replaces all plain triangles (no transformations, same textures)
+    of this list by PovTriangleBatch objects, the batch is placed at
+    the position of the first triangle. Returns the number of batched
+    triangles.
+
+    :param min_count : minimal number of triangles for a batch
+    :param recursive : batch also the triangles of all sub lists
+    :param weld      : share identical vertices in the mesh
+    """
+    def batch_triangles( self, min_count=2, recursive=True, weld=True ):
+        nr = 0
+        groups = {}
+        for i in self._items[self._batch_start:]:
+            if isinstance( i, PovCSGObjectList ):
+                if recursive:
+                    nr += i.batch_triangles( min_count=min_count,
+                                             recursive=recursive, weld=weld )
+            elif ( type( i ) == PovTriangle ) and i.vertex_vectors \
+                and ( i.hidden == False ) and ( i.has_transforms() == False ) \
+                and ( i.has_animation() == False ) \
+                and ( i._lights is None ) and ( not i._photons ):
+                groups.setdefault( _texture_key( i ), [] ).append( i )
+
+        batches = {}
+        for key, triangles in groups.items():
+            if len( triangles ) < min_count: continue
+            batch = PovTriangleBatch( triangles, weld=weld )
+            if triangles[0]._texture is not None:
+                for t in triangles[0]._texture:
+                    batch.set_texture( t )
+            for t in triangles:
+                batches[id( t )] = None
+            batches[id( triangles[0] )] = batch
+            nr += len( triangles )
+
+        if len( batches ) > 0:
+            items = []
+            for i in self._items:
+                if id( i ) not in batches:
+                    items.append( i )
+                elif batches[id( i )] is not None:
+                    items.append( batches[id( i )] )
+                    batches[id( i )].add_parent( self )
+            self._items = items
+            self.invalidate()
+
+        return nr
 
 
     def do_statistics( self ):
@@ -902,25 +1523,79 @@ class PovCSGObjectList( PovBaseList, PovCSGObject ):
         PovCSGObject.do_statistics(self)
 
 
+def _texture_key( obj ):
+    # objects with the same key have the same textures
+    if obj._texture is None:
+        return ()
+    return tuple( [ t if isinstance( t, str ) else id( t )
+                    for t in obj._texture ] )
+
+
+# the animation hooks of PovObject and PovCSGObjectList don't change
+# the output of an object, all other implementations may do
+_animation_hooks = ( 'update_timeline', 'update_time',
+                     'update_timedelta', 'update_frame' )
+_static_hooks    = { hook: ( getattr( PovObject, hook ),
+                             getattr( PovCSGObjectList, hook ) )
+                     for hook in _animation_hooks }
+_animated_classes = {}
+
+
 class PovCSGContainer( PovCSGObjectList ):
     _name = 'Container'
+    _transformed = False
     def __init__( self, comment=None ):
         PovCSGObjectList.__init__( self, comment=comment )
 
+
+    def _local_bounds( self ):
+        # the container writes all items, even the hidden ones
+        return combine_bounds( [ i.bounding_box() for i in self._items ] )
+
+
+    """
+    regroup
+
+    see PovCSGUnion.regroup, the items of the container are replaced
+    by unions of neighbouring items, so the container writes these
+    unions instead of the single items. Items without bounds stay in
+    the container.
+    """
+    def regroup( self, max_items=8 ):
+        return _regroup( self, max_items )
+
+
     def write_pov( self, ffile, indent = 0 ):
         PovCSGObjectList.write_pov( self, ffile, indent=indent )
 
+        compact = self._is_compact( ffile )
+        frustum = getattr( ffile, 'frustum', None )
         nr = 1
         for i in self._items:
-            self._write_indent( ffile,
-                                '// Container Item #%i\n' % nr,
-                                indent=indent )
-            i.write_pov( ffile, indent=indent )
+            if ( frustum is None ) or frustum.is_visible( i ):
+                if not compact:
+                    self._write_indent( ffile,
+                                        '// Container Item #%i\n' % nr,
+                                        indent=indent )
+                i.write_pov_cached( ffile, indent=indent )
             nr += 1
 
 
+# numbers of the unions with array data files
+_array_union_ids = itertools.count(1)
+
+
 class PovCSGUnion(PovCSGObjectList):
     _name = 'Union'
+
+    # array emission, see set_array_emission
+    _array_emission  = False
+    _array_min_count = 64
+    _array_data_file = None
+    _array_rows      = 65536
+    _array_id        = None
+    _array_files     = ()
+
     def __init__(self, comment=None, split_union=False):
         PovCSGObjectList.__init__(self, comment=comment)
 
@@ -931,6 +1606,231 @@ class PovCSGUnion(PovCSGObjectList):
         self._split_union = split_union
 
 
+    """
+    set_array_emission
+
+    writes spheres, boxes and cylinders without transformations which
+    share their textures as #declare arrays and a #for loop instead of
+    single objects. The comments of these items are not written.
+
+    :param array_emission : enables the array emission
+    :param min_count      : minimal number of items for an array
+    :param data_file      : if given, the data is written into the side
+                            files <data_file>_<frame>_<union>_<nr>.dat which
+                            are read with #read instead of #declare arrays.
+                            PovFile.write_povfile writes these files and
+                            adds them to the extra files, <frame> is the
+                            name of the scene file without extension and
+                            <union> a number which is unique for each union
+    """
+    def set_array_emission(self, array_emission=True, min_count=None, data_file=None):
+        self._array_emission = array_emission
+        if min_count is not None:
+            self._array_min_count = min_count
+        self._array_data_file = data_file
+        if (data_file is not None) and (self._array_id is None):
+            self._array_id = next(_array_union_ids)
+        self.invalidate()
+
+
+    def _has_array_data(self):
+        return self._array_emission and (self._array_data_file is not None)
+
+
+    def _array_data_filename(self, frame_name, nr):
+        return '%s_%s_%i_%i.dat' % (self._array_data_file, frame_name,
+                                    self._array_id, nr)
+
+
+    def _array_items(self, ffile):
+        items = [(nr, i) for nr, i in enumerate(self._items, 1) if i.hidden == False]
+        if self._has_array_data():
+            # the data files are written without the camera view, so
+            # all items of the arrays are written
+            groups = self._array_groups(ffile, [i for nr, i in items])
+        else:
+            groups = None
+        return items, groups
+
+
+    """
+    write_array_data
+
+    writes the side files of set_array_emission for this union and all
+    sub unions and registers them as extra files, the files of the
+    previous frame are replaced. Returns the number of written files.
+
+    :param ffile      : emitter of the scene file, the arrays depend on
+                        the instanced objects
+    :param frame_name : name of the scene file without extension
+    """
+    def write_array_data(self, ffile, frame_name):
+        if self._has_array_data():
+            items, groups = self._array_items(ffile)
+            # drop the files of the previous frame
+            if len(self._array_files) > 0:
+                self._extra_files = [f for f in self._extra_files
+                                     if f not in self._array_files]
+            self._array_files = []
+            for nr, g in enumerate(groups, 1):
+                columns = [np.asarray(c, dtype=np.float64) for c in zip(*[i._array_values() for i in g])]
+                varying = [c for c in columns if not (c == c[0]).all()]
+                if len(varying) == 0: continue
+                n = len(g)
+                filename = self._array_data_filename(frame_name, nr)
+                with open(filename, 'w') as data:
+                    rows = self._float_rows(ffile, np.hstack([c.reshape((n, -1)) for c in varying]))
+                    fmt = ','.join(['<%f,%f,%f>' if c.ndim > 1 else '%f' for c in varying])
+                    fmt = self._float_format(ffile, fmt)
+                    data.write(((fmt + ',\n') * n)[:-2] % tuple(rows.ravel().tolist()) + '\n')
+                self.add_extra_file(filename)
+                self._array_files.append(filename)
+
+        return len(self._array_files) + \
+            PovCSGObjectList.write_array_data(self, ffile, frame_name)
+
+
+    def _array_groups(self, ffile, items):
+        # groups the items which can be written as arrays
+        instances = getattr(ffile, 'instances', None)
+        groups = {}
+        for i in items:
+            cls = type(i)
+            if cls._array_sdl is None: continue
+            for base in cls.__mro__:
+                if '_array_sdl' in vars(base): break
+            if (cls.write_pov is not base.write_pov) or i.has_transforms() \
+                or (i._lights is not None) or i._photons \
+                or ((instances is not None) and (id(i) in instances)):
+                continue
+            groups.setdefault((base, _texture_key(i)), []).append(i)
+
+        return [g for g in groups.values() if len(g) >= self._array_min_count]
+
+
+    def _write_array_rows(self, ffile, rows):
+        # rows as comma separated list, formatted in blocks
+        nr = rows.shape[0]
+        if rows.ndim == 1:
+            item = '%f'
+            rows = rows.reshape((-1, 1))
+        else:
+            item = '<' + ','.join(['%f'] * rows.shape[1]) + '>'
+        item = self._float_format(ffile, item)
+        rows = self._float_rows(ffile, rows)
+        for start in range(0, nr, self._array_rows):
+            stop = min(start + self._array_rows, nr)
+            block = ((item + ',\n') * (stop-start)) % tuple(rows[start:stop].ravel().tolist())
+            if stop == nr:
+                block = block[:-2] + '\n'
+            ffile.write(block)
+
+
+    def _write_array_group(self, ffile, items, nr, indent=0):
+        n = len(items)
+        columns = [np.asarray(c, dtype=np.float64) for c in zip(*[i._array_values() for i in items])]
+        names = ['PovArray%i' % k for k in range(len(columns))]
+
+        if not self._is_compact(ffile):
+            self._write_indent(ffile, '// %s Array #%i (%i %s)\n' % (self._name, nr, n, items[0]._name),
+                               indent)
+
+        textured = items[0]._texture is not None
+        if textured:
+            # the textures are shared by an inner union
+            self._write_indent(ffile, 'union{\n', indent)
+            indent += 1
+
+        # values which are the same for all items are declared once
+        args = []
+        varying = []
+        for name, column in zip(names, columns):
+            if (column == column[0]).all():
+                value = column[0]
+                if column.ndim > 1:
+                    self._write_format(ffile, '#declare %s = <%f,%f,%f>;\n',
+                                       (name,) + tuple(value.tolist()), indent)
+                else:
+                    self._write_format(ffile, '#declare %s = %f;\n', (name, value), indent)
+                args.append(name)
+            else:
+                varying.append((name, column))
+                args.append(name if self._array_data_file else '%s[PovArrayI]' % name)
+
+        if (self._array_data_file is None) or (len(varying) == 0):
+            for name, column in varying:
+                self._write_indent(ffile, '#declare %s = array[%i] {\n' % (name, n), indent)
+                self._write_array_rows(ffile, column)
+                self._write_indent(ffile, '}\n', indent)
+            self._write_indent(ffile, '#for (PovArrayI, 0, %i)\n' % (n-1), indent)
+            self._write_indent(ffile, items[0]._array_sdl % tuple(args) + '\n', indent+1)
+            self._write_indent(ffile, '#end\n', indent)
+        else:
+            # the file name depends on the frame, see write_array_data
+            filename = 'concat("%s_", PovArrayFrame, "_%i_%i.dat")' % (self._array_data_file,
+                                                                       self._array_id, nr)
+            self._write_indent(ffile, '#fopen PovArrayFile %s read\n' % filename, indent)
+            self._write_indent(ffile, '#for (PovArrayI, 0, %i)\n' % (n-1), indent)
+            self._write_indent(ffile, '#read (PovArrayFile, %s)\n' % ', '.join([name for name, c in varying]),
+                               indent+1)
+            self._write_indent(ffile, items[0]._array_sdl % tuple(args) + '\n', indent+1)
+            self._write_indent(ffile, '#end\n', indent)
+            self._write_indent(ffile, '#fclose PovArrayFile\n', indent)
+
+        if textured:
+            items[0]._write_texture(ffile, indent)
+            self._write_indent(ffile, 'split_union off\n', indent)
+            indent -= 1
+            self._write_indent(ffile, '}\n', indent)
+
+
+    def _write_items(self, ffile, indent=0):
+        if not self._array_emission:
+            PovCSGObjectList._write_items(self, ffile, indent=indent)
+            return
+
+        compact = self._is_compact(ffile)
+        frustum = getattr(ffile, 'frustum', None)
+        if frustum is not None:
+            frustum.push(self.transform_matrix())
+        items, groups = self._array_items(ffile)
+        items = [(nr, i) for nr, i in items
+                 if (frustum is None) or frustum.is_visible(i)]
+        if groups is None:
+            groups = self._array_groups(ffile, [i for nr, i in items])
+        grouped = set()
+        for g in groups:
+            grouped.update([id(i) for i in g])
+
+        # all other items are written as usual
+        for nr, i in items:
+            if id(i) in grouped: continue
+            if not compact:
+                self._write_indent(ffile,
+                                   '// %s Item #%i\n' % (self._name, nr),
+                                   indent=indent)
+            i.write_pov_cached(ffile, indent=indent)
+
+        for nr, g in enumerate(groups, 1):
+            self._write_array_group(ffile, g, nr, indent=indent)
+
+        if frustum is not None:
+            frustum.pop()
+
+
+    """
+    regroup
+
+    sorts the items spatially into a balanced hierarchy of nested
+    unions with at most max_items items each, which POV-Ray can bound
+    much better than a flat union. Items without bounds and the items
+    of the array emission stay in this union in their order. Returns
+    the number of created groups.
+    """
+    def regroup(self, max_items=8):
+        return _regroup(self, max_items)
+
+
     def write_pov(self, ffile, indent = 0):
         if len(self._items) == 0:
             print('Union structure needs at least one item to proceed!')
@@ -949,26 +1849,118 @@ class PovCSGUnion(PovCSGObjectList):
         self._write_indent(ffile, '}\n', indent)
 
 
+class PovCSGGroup(PovCSGUnion):
+    """
+    PovCSGGroup
+
+    union which is created by regroup, the group itself is not counted
+    in the statistics
+    """
+    _name = 'Group'
+    def do_statistics(self):
+        PovBaseList.do_statistics(self)
+
+
+def _regroup(objlist, max_items):
+    items = objlist._items
+    # the items of the array emission stay in the union, they are
+    # written as arrays instead
+    if getattr(objlist, '_array_emission', False):
+        arrays = set()
+        for g in objlist._array_groups(None, [i for i in items if i.hidden == False]):
+            arrays.update([id(i) for i in g])
+    else:
+        arrays = ()
+    bounds  = [None if id(i) in arrays else i.bounding_box() for i in items]
+    bounded = [i for i, b in zip(items, bounds) if b is not None]
+    if len(bounded) <= max_items:
+        return 0
+
+    centers = np.array([(b[0] + b[1]) * 0.5 for b in bounds if b is not None])
+    order = np.argsort(_morton_codes(centers), kind='stable')
+    level = [bounded[i] for i in order]
+
+    # neighbours along the z-order curve are grouped level by level
+    groups = 0
+    while len(level) > max_items:
+        parts = np.array_split(np.arange(len(level)), -(-len(level) // max_items))
+        new_level = []
+        for part in parts:
+            group = PovCSGGroup()
+            group.add([level[i] for i in part])
+            new_level.append(group)
+        groups += len(new_level)
+        level = new_level
+
+    for i in bounded:
+        if (i._parents is not None) and (objlist in i._parents):
+            i._parents.remove(objlist)
+    for i in level:
+        i.add_parent(objlist)
+
+    # the other items keep their order, the groups replace the
+    # first grouped item
+    new_items = []
+    for i, b in zip(items, bounds):
+        if b is None:
+            new_items.append(i)
+        elif i is bounded[0]:
+            new_items.extend(level)
+    objlist._items = new_items
+    objlist.invalidate()
+    return groups
+
+
 class PovCSGMerge( PovCSGObjectList ):
     _name = 'Merge'
-    def __init__(self, comment=None):
+    # write a bounded_by box around all items
+    _auto_bounds = False
+    def __init__(self, comment=None, auto_bounds=None):
         PovCSGObjectList.__init__(self, comment=comment)
+        if auto_bounds is not None:
+            self._auto_bounds = auto_bounds
 
-    def write_pov(self, ffile, indent = 0):
-        if len(self._items) == 0:
+
+    def set_auto_bounds(self, auto_bounds):
+        self._auto_bounds = auto_bounds
+        self.invalidate()
+
+
+    def write_pov(self, ffile, indent = 0):
+        if len(self._items) == 0:
             raise TypeError('Merge structure needs at least one item to proceed!')
         PovCSGObjectList.write_pov(self, ffile, indent=indent)
         self._write_indent(ffile, 'merge{\n', indent)
 
         self._write_items(ffile, indent=indent+1)
+        if self._auto_bounds:
+            self._write_bounded_by(ffile, indent+1)
         self._write_attributes(ffile, indent+1)
         self._write_indent(ffile, '}\n', indent)
 
 
 class PovCSGDifference( PovCSGObjectList ):
     _name = 'Difference'
-    def __init__( self, comment=None ):
+    _batch_start = 1
+    # write a bounded_by box around the first item
+    _auto_bounds = False
+    def __init__( self, comment=None, auto_bounds=None ):
         PovCSGObjectList.__init__( self, comment=comment )
+        if auto_bounds is not None:
+            self._auto_bounds = auto_bounds
+
+
+    def set_auto_bounds( self, auto_bounds ):
+        self._auto_bounds = auto_bounds
+        self.invalidate()
+
+
+    def _local_bounds( self ):
+        # the result is always inside of the first item
+        for i in self._items:
+            if i.hidden == False:
+                return i.bounding_box()
+        return None
 
 
     def write_pov( self, ffile, indent = 0 ):
@@ -978,12 +1970,16 @@ class PovCSGDifference( PovCSGObjectList ):
         self._write_indent( ffile, 'difference{\n', indent )
 
         self._write_items(ffile, indent=indent+1)
+        if self._auto_bounds:
+            self._write_bounded_by( ffile, indent+1 )
         self._write_attributes( ffile, indent+1 )
         self._write_indent( ffile, '}\n', indent )
 
 
 # height fields
 class PovHeightField( PovCSGObject ):
+    __slots__ = ( '_image_name', '_smooth' )
+
     _name = 'HeightField'
     def __init__( self, image_name, smooth=False, comment=None):
         PovCSGObject.__init__( self,comment=comment )
@@ -992,6 +1988,11 @@ class PovHeightField( PovCSGObject ):
         self.add_extra_file(self._image_name)
 
 
+    def _local_bounds( self ):
+        # height fields fill the unit cube
+        return np.array( [ [ 0., 0., 0. ], [ 1., 1., 1. ] ] )
+
+
     def write_pov( self, ffile, indent = 0 ):
         PovCSGObject.write_pov( self, ffile, indent=indent )
         self._write_indent( ffile, 'height_field{\n', indent )
@@ -1004,17 +2005,91 @@ class PovHeightField( PovCSGObject ):
 
 
 # mesh2 objects
+#
+# all arrays can be given as numpy arrays, as np.memmap arrays or as
+# filenames of .npy files, which are opened memory-mapped at write
+# time. The data is written in blocks of _block_rows rows, so the
+# memory needed for writing is bounded by the block size.
+
+# mesh helpers
+
+def _index_array(a):
+    # the smallest integer type which can hold all indices
+    if (a.size == 0) or (a.max() < 2**31):
+        return a.astype(np.int32)
+    return a.astype(np.int64)
+
+
+def weld_vertices(vertices, faces, tolerance=0.):
+    """
+    weld_vertices
+
+    merges vertices which are identical or closer than the tolerance
+    (on a grid of the tolerance size), the vertices keep the order of
+    their first occurrence
+
+    :param vertices  : (N,3) array of vertices
+    :param faces     : (M,3) array of vertex indices
+    :param tolerance : welding distance
+    :return          : new vertices, new faces, index of the kept vertices
+    """
+    vertices = np.asarray(vertices)
+    if tolerance > 0.:
+        keys = np.round(vertices / tolerance).astype(np.int64)
+    else:
+        keys = vertices + 0.     # removes -0.
+    keys = np.ascontiguousarray(keys)
+    keys = keys.view(np.dtype((np.void, keys.dtype.itemsize * keys.shape[1]))).ravel()
+
+    _, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+
+    # restore the order of the first occurrence
+    order = np.argsort(first)
+    remap = np.empty_like(order)
+    remap[order] = np.arange(order.size)
+
+    kept = first[order]
+    return vertices[kept], _index_array(remap[inverse.ravel()][np.asarray(faces)]), kept
+
+
+def _spread_bits(a):
+    # inserts two zero bits after each of the lower 10 bits
+    a = a & 0x3ff
+    a = (a | (a << 16)) & 0x030000ff
+    a = (a | (a << 8)) & 0x0300f00f
+    a = (a | (a << 4)) & 0x030c30c3
+    a = (a | (a << 2)) & 0x09249249
+    return a
+
+
+def _morton_codes(points):
+    # z-order codes of points on a 1024^3 grid of their bounding box
+    pmin = points.min(axis=0)
+    size = points.max(axis=0) - pmin
+    size[size == 0.] = 1.
+    grid = ((points - pmin) / size * 1023.).astype(np.int64)
+    return _spread_bits(grid[:, 0]) | (_spread_bits(grid[:, 1]) << 1) \
+        | (_spread_bits(grid[:, 2]) << 2)
+
+
 class PovMesh2(PovCSGObject):
     _name = 'Mesh2'
+
+    # number of rows which are formatted in one block
+    _block_rows = 65536
+
     def __init__(self, vertex_vectors=None,
                        normal_vectors=None,
                        uv_vectors=None,
                        face_indices=None,
                        normal_indices=None,
                        uv_indices=None,
-                       comment=None
+                       comment=None,
+                       block_rows=None
                         ):
         PovCSGObject.__init__(self, comment=comment)
+        if block_rows is not None:
+            self._block_rows = block_rows
         self.vertex_vectors = vertex_vectors
         self.normal_vectors = normal_vectors
         self.uv_vectors = uv_vectors
@@ -1023,56 +2098,269 @@ class PovMesh2(PovCSGObject):
         self.uv_indices = uv_indices
 
 
-    def _write_vector_list_int(self, ffile, vlist, indent):
-        self._write_indent(ffile, '%i,\n' % vlist.shape[0], indent)
-        for i in vlist[:-1]:
-            self._write_indent(ffile, '<%i,%i,%i>,\n' % (i[0], i[1], i[2]), indent)
-        i = vlist[-1]
-        self._write_indent(ffile, '<%i,%i,%i>\n' % (i[0], i[1], i[2]), indent)
+    def set_block_rows(self, block_rows):
+        self._block_rows = block_rows
+        self.invalidate()
 
 
-    def _write_vector_list_float(self, ffile, vlist, indent):
-        self._write_indent(ffile, '%i,\n' % vlist.shape[0], indent)
-        for i in vlist[:-1]:
-            self._write_indent(ffile, '<%f,%f,%f>,\n' % (i[0], i[1], i[2]), indent)
-        i = vlist[-1]
-        self._write_indent(ffile, '<%f,%f,%f>\n' % (i[0], i[1], i[2]), indent)
+    def _arrays(self):
+        return (self.vertex_vectors, self.normal_vectors, self.uv_vectors,
+                self.face_indices, self.normal_indices, self.uv_indices)
 
 
-    def write_pov(self, ffile, indent=0):
-        PovCSGObject.write_pov(self, ffile, indent)
-        self._write_indent(ffile, 'mesh2{\n', indent)
-        if self.vertex_vectors is not None:
-            self._write_indent(ffile, 'vertex_vectors\n', indent+1)
-            self._write_indent(ffile, '{\n', indent+1)
-            self._write_vector_list_float(ffile, self.vertex_vectors, indent+2)
-            self._write_indent(ffile, '}\n', indent+1)
+    def is_streaming(self):
+        for a in self._arrays():
+            if isinstance(a, (str, np.memmap)):
+                return True
+        return False
+
+
+    def _load_array(self, vlist):
+        if isinstance(vlist, str):
+            return np.load(vlist, mmap_mode='r')
+        return np.asarray(vlist)
+
+
+    def _local_bounds(self):
+        if self.vertex_vectors is None:
+            return None
+        vertices = self._load_array(self.vertex_vectors)
+        if vertices.shape[0] == 0:
+            return None
+        return np.array([vertices.min(axis=0), vertices.max(axis=0)], dtype=float)
+
+
+    # mesh optimizations, all of them load the arrays into memory
+
+    def _loaded(self, vlist):
+        if vlist is None:
+            return None
+        return np.array(self._load_array(vlist))
 
-        if self.normal_vectors is not None:
-            self._write_indent(ffile, 'normal_vectors\n', indent+1)
-            self._write_indent(ffile, '{\n', indent+1)
-            self._write_vector_list_float(ffile, self.normal_vectors, indent+2)
-            self._write_indent(ffile, '}\n', indent+1)
 
+    def _shared_indices(self, vlist, indices):
+        # normals and uvs without own index lists follow the vertices
+        return (vlist is not None) and (indices is None)
+
+
+    """
+    compute_normals
+
+    calculates smooth vertex normals, the normals of all faces which
+    share a vertex are weighted with the face area
+    """
+    def compute_normals(self):
+        vertices = self._loaded(self.vertex_vectors).astype(float)
+        faces    = self._loaded(self.face_indices)
+
+        # the length of the cross product is twice the face area
+        fnormals = np.cross(vertices[faces[:, 1]] - vertices[faces[:, 0]],
+                            vertices[faces[:, 2]] - vertices[faces[:, 0]])
+        corners = faces.ravel()
+        normals = np.empty_like(vertices)
+        for c in range(3):
+            normals[:, c] = np.bincount(corners,
+                                        weights=np.repeat(fnormals[:, c], 3),
+                                        minlength=vertices.shape[0])
+        length = np.sqrt((normals**2).sum(axis=1))
+        length[length == 0.] = 1.
+
+        self.normal_vectors = normals / length[:, np.newaxis]
+        self.normal_indices = None
+        self.invalidate()
+
+
+    """
+    weld
+
+    merges vertices which are closer than the tolerance and removes
+    the faces which become degenerated
+    """
+    def weld(self, tolerance=0.):
+        vertices = self._loaded(self.vertex_vectors)
+        faces    = self._loaded(self.face_indices)
+        vertices, faces, kept = weld_vertices(vertices, faces,
+                                              tolerance=tolerance)
+        if self._shared_indices(self.normal_vectors, self.normal_indices):
+            self.normal_vectors = self._loaded(self.normal_vectors)[kept]
+        if self._shared_indices(self.uv_vectors, self.uv_indices):
+            self.uv_vectors = self._loaded(self.uv_vectors)[kept]
+        self.vertex_vectors = vertices
+        self.face_indices   = faces
+
+        # faces with less than three different vertices
+        good = (faces[:, 0] != faces[:, 1]) & (faces[:, 1] != faces[:, 2]) \
+             & (faces[:, 0] != faces[:, 2])
+        if not good.all():
+            self._select_faces(good)
+        self.invalidate()
+
+
+    def _select_faces(self, selection):
+        self.face_indices = self._loaded(self.face_indices)[selection]
+        if self.normal_indices is not None:
+            self.normal_indices = self._loaded(self.normal_indices)[selection]
+        if self.uv_indices is not None:
+            self.uv_indices = self._loaded(self.uv_indices)[selection]
+
+
+    def _compact(self, vlist, indices):
+        # removes all unused rows of vlist, returns the new arrays
+        vlist   = self._loaded(vlist)
+        indices = self._loaded(indices)
+        used = np.zeros(vlist.shape[0], dtype=bool)
+        used[indices.ravel()] = True
+        remap = np.cumsum(used) - 1
+        return vlist[used], _index_array(remap[indices]), used
+
+
+    """
+    remove_unused_vertices
+
+    drops all vertices, normals and uv vectors which are not used by
+    any face
+    """
+    def remove_unused_vertices(self):
+        self.vertex_vectors, self.face_indices, used = \
+            self._compact(self.vertex_vectors, self.face_indices)
+        if self.normal_vectors is not None:
+            if self.normal_indices is None:
+                self.normal_vectors = self._loaded(self.normal_vectors)[used]
+            else:
+                self.normal_vectors, self.normal_indices, _ = \
+                    self._compact(self.normal_vectors, self.normal_indices)
         if self.uv_vectors is not None:
-            self._write_indent(ffile, 'uv_vectors\n', indent+1)
-            self._write_indent(ffile, '{\n', indent+1)
-            self._write_vector_list_float(ffile, self.normal_vectors, indent+2)
-            self._write_indent(ffile, '}\n', indent+1)
+            if self.uv_indices is None:
+                self.uv_vectors = self._loaded(self.uv_vectors)[used]
+            else:
+                self.uv_vectors, self.uv_indices, _ = \
+                    self._compact(self.uv_vectors, self.uv_indices)
+        self.invalidate()
+
+
+    """
+    reorder_faces
+
+    sorts the faces along a z-order curve of their centers and
+    numbers the vertices in the order of their first use, so that
+    neighbouring faces use neighbouring vertices
+    """
+    def reorder_faces(self):
+        vertices = self._loaded(self.vertex_vectors)
+        faces    = self._loaded(self.face_indices)
+        if faces.shape[0] == 0: return
+
+        centers = vertices[faces].mean(axis=1)
+        order = np.argsort(_morton_codes(centers), kind='stable')
+        self._select_faces(order)
+        faces = self.face_indices
+
+        # vertices in the order of the first use
+        corners = faces.ravel()
+        first = np.full(vertices.shape[0], corners.size, dtype=np.int64)
+        used, pos = np.unique(corners, return_index=True)
+        first[used] = pos
+        vorder = np.argsort(first, kind='stable')
+        remap = np.empty_like(vorder)
+        remap[vorder] = np.arange(vorder.size)
+
+        self.vertex_vectors = vertices[vorder]
+        self.face_indices   = _index_array(remap[faces])
+        if self._shared_indices(self.normal_vectors, self.normal_indices):
+            self.normal_vectors = self._loaded(self.normal_vectors)[vorder]
+        if self._shared_indices(self.uv_vectors, self.uv_indices):
+            self.uv_vectors = self._loaded(self.uv_vectors)[vorder]
+        self.invalidate()
+
+
+    """
+    optimize
+
+    welds the vertices, removes unused vertices and reorders the
+    faces, optionally smooth normals are calculated
+    """
+    def optimize(self, tolerance=0., normals=False):
+        self.weld(tolerance=tolerance)
+        self.remove_unused_vertices()
+        self.reorder_faces()
+        if normals:
+            self.compute_normals()
+
+
+    def _write_vector_list(self, ffile, vlist, fmt, indent):
+        t0 = time.time()
+        vlist = self._load_array(vlist)
+        if vlist.ndim == 1:
+            vlist = vlist.reshape((-1, 1))
+        nr, cols = vlist.shape
+        self._write_indent(ffile, '%i,\n' % nr, indent)
+        if nr == 0: return
+
+        # format complete blocks of rows with a single % operation
+        if self._is_compact(ffile):
+            prefix = ''
+        else:
+            prefix = self._indent_str(indent)
+        item = '<' + ','.join([fmt] * cols) + '>'
+        floats = (fmt == '%f')
+        if floats:
+            item = self._float_format(ffile, item)
+        line = prefix + item + ',\n'
+        chars = 0
+        for start in range(0, nr-1, self._block_rows):
+            stop = min(start + self._block_rows, nr-1)
+            rows = vlist[start:stop]
+            if floats:
+                rows = self._float_rows(ffile, rows)
+            block = (line * (stop-start)) % tuple(rows.ravel().tolist())
+            ffile.write(block)
+            chars += len(block)
+        rows = vlist[-1]
+        if floats:
+            rows = self._float_rows(ffile, rows)
+        block = (prefix + item + '\n') % tuple(rows.tolist())
+        ffile.write(block)
+        chars += len(block)
+
+        pypovwriterstatistics['rows']    += nr
+        pypovwriterstatistics['chars']   += chars
+        pypovwriterstatistics['seconds'] += time.time() - t0
+
+
+    def _write_vector_list_int(self, ffile, vlist, indent):
+        self._write_vector_list(ffile, vlist, '%i', indent)
+
+
+    def _write_vector_list_float(self, ffile, vlist, indent):
+        self._write_vector_list(ffile, vlist, '%f', indent)
+
 
-        if self.face_indices is not None:
-            self._write_indent(ffile, 'face_indices\n', indent+1)
-            self._write_indent(ffile, '{\n', indent+1)
-            self._write_vector_list_int(ffile, self.face_indices, indent+2)
-            self._write_indent(ffile, '}\n', indent+1)
+    def _write_block(self, ffile, key, vlist, fmt, indent):
+        if vlist is None: return
+        self._write_indent(ffile, '%s\n' % key, indent)
+        self._write_indent(ffile, '{\n', indent)
+        self._write_vector_list(ffile, vlist, fmt, indent+1)
+        self._write_indent(ffile, '}\n', indent)
 
 
+    def write_pov(self, ffile, indent=0):
+        PovCSGObject.write_pov(self, ffile, indent)
+        self._write_indent(ffile, 'mesh2{\n', indent)
+        self._write_block(ffile, 'vertex_vectors', self.vertex_vectors, '%f', indent+1)
+        self._write_block(ffile, 'normal_vectors', self.normal_vectors, '%f', indent+1)
+        self._write_block(ffile, 'uv_vectors', self.uv_vectors, '%f', indent+1)
+        self._write_block(ffile, 'face_indices', self.face_indices, '%i', indent+1)
+        self._write_block(ffile, 'normal_indices', self.normal_indices, '%i', indent+1)
+        self._write_block(ffile, 'uv_indices', self.uv_indices, '%i', indent+1)
+
         self._write_attributes(ffile, indent+1)
         self._write_indent(ffile, '}\n', indent)
 
 
 # mesh2 objects
 class PovTriangle(PovCSGObject):
+    __slots__ = ('vertex_vectors',)
+
     _name = 'Triangle'
     def __init__(self, vertex_vectors=None,
                        comment=None
@@ -1084,12 +2372,19 @@ class PovTriangle(PovCSGObject):
             print('Ignoring wrong triangle vertices!')
 
 
+    def _local_bounds(self):
+        if not getattr(self, 'vertex_vectors', None):
+            return None
+        return bounds_from_points([v.xyz_tuple if isinstance(v, Point3D) else v
+                                   for v in self.vertex_vectors])
+
+
 
     def _write_vector_list_float(self, ffile, vlist, indent):
         for i in vlist[:-1]:
-            self._write_indent(ffile, '<%f,%f,%f>,\n' % (i[0], i[1], i[2]), indent)
+            self._write_format(ffile, '<%f,%f,%f>,\n', (i[0], i[1], i[2]), indent)
         i = vlist[-1]
-        self._write_indent(ffile, '<%f,%f,%f>\n' % (i[0], i[1], i[2]), indent)
+        self._write_format(ffile, '<%f,%f,%f>\n', (i[0], i[1], i[2]), indent)
 
 
     def write_pov(self, ffile, indent=0):
@@ -1102,13 +2397,367 @@ class PovTriangle(PovCSGObject):
             self._write_indent(ffile, '}\n', indent)
 
 
+class PovTriangleBatch(PovMesh2):
+    """
+    PovTriangleBatch
+
+    collects single triangles and writes them as one mesh2 object,
+    identical vertices are shared by default
+    """
+    _name = 'TriangleBatch'
+    def __init__(self, triangles=None,
+                       weld=True,
+                       weld_tolerance=0.,
+                       comment=None,
+                       block_rows=None
+                        ):
+        PovMesh2.__init__(self, comment=comment, block_rows=block_rows)
+        self._weld           = weld
+        self._weld_tolerance = weld_tolerance
+        self._triangles      = []
+        self._nr_triangles   = 0
+        if triangles is not None:
+            self.add(triangles)
+
+
+    def __len__(self):
+        return self._nr_triangles
+
+
+    def add_triangle(self, v1, v2, v3):
+        self.add_triangles([[convertarray2vector(v1),
+                             convertarray2vector(v2),
+                             convertarray2vector(v3)]])
+
+
+    def add_triangles(self, triangles):
+        triangles = np.asarray(triangles, dtype=float).reshape((-1, 3, 3))
+        self._triangles.append(triangles)
+        self._nr_triangles += triangles.shape[0]
+        # the mesh is rebuild on the next write
+        self.vertex_vectors = None
+        self.face_indices   = None
+        self.invalidate()
+
+
+    def add(self, new_obj):
+        if isinstance(new_obj, (list, tuple)) and (len(new_obj) > 0) and \
+           isinstance(new_obj[0], PovTriangle):
+            self.add_triangles([[v.xyz_tuple if isinstance(v, Point3D) else v
+                                 for v in i.vertex_vectors]
+                                for i in new_obj])
+        elif isinstance(new_obj, PovTriangle):
+            self.add_triangle(*new_obj.vertex_vectors)
+        else:
+            self.add_triangles(new_obj)
+
+
+    def _local_bounds(self):
+        if self._nr_triangles == 0:
+            return None
+        return combine_bounds([bounds_from_points(t) for t in self._triangles])
+
+
+    def _build(self):
+        if self.face_indices is not None: return
+        triangles = np.concatenate(self._triangles)
+        self._triangles = [triangles]
+        vertices = triangles.reshape((-1, 3))
+        faces = np.arange(vertices.shape[0]).reshape((-1, 3))
+        if self._weld:
+            vertices, faces, _ = weld_vertices(vertices, faces,
+                                               tolerance=self._weld_tolerance)
+        self.vertex_vectors = vertices
+        self.face_indices   = _index_array(faces)
+
+
+    def write_pov(self, ffile, indent=0):
+        if self._nr_triangles == 0:
+            print('TriangleBatch needs at least one triangle to proceed!')
+            self._write_indent(ffile, '//empty triangle batch\n', indent)
+            return
+        self._build()
+        PovMesh2.write_pov(self, ffile, indent=indent)
+
+
+# primitive arrays
+#
+# the primitives of an array are stored as contiguous numpy arrays
+# instead of one object per primitive. Each item can have an index into
+# the palette of textures and a transformation matrix, the 12 values of
+# matrix < ... > or a 4x4 matrix for row vectors.
+
+def _matrix_rows(matrices, nr):
+    m = np.asarray(matrices, dtype=np.float64)
+    if m.shape[-2:] == (4, 4):
+        m = m[..., :3]
+    return np.broadcast_to(m.reshape((-1, 12)), (nr, 12))
+
+
+class PovPrimitiveArray(PovCSGObject):
+    _name = 'PrimitiveArray'
+    # name of the single primitives in the statistics
+    _item_name = None
+    # (name, dimension) of the data columns
+    _fields = ()
+    # SDL of a single item, the format is filled with the data columns
+    _item_sdl = None
+
+    # number of items which are formatted in one block
+    _block_rows = 65536
+
+    def __init__(self, palette=None, dtype=np.float64, comment=None):
+        PovCSGObject.__init__(self, comment=comment)
+        self._dtype    = np.dtype(dtype)
+        self._data     = [np.zeros((0, dim), dtype=self._dtype) for name, dim in self._fields]
+        self._colors   = None
+        self._matrices = None
+        self.set_palette(palette)
+
+
+    def __len__(self):
+        return self._data[0].shape[0]
+
+
+    def set_palette(self, palette):
+        self._palette = palette
+        if palette is not None:
+            for texture in palette:
+                if isinstance(texture, PovTextureObject):
+                    texture.add_parent(self)
+        self.invalidate()
+
+
+    """
+    add
+
+    appends items to the array, the values are broadcast to the number
+    of items in the first column, so single values are shared by all
+    new items. Items should be added in large blocks.
+
+    :param values   : data columns in the order of _fields
+    :param colors   : palette index of each item, -1 for no texture
+    :param matrices : transformation of each item
+    """
+    def add(self, *values, colors=None, matrices=None):
+        nr = np.asarray(values[0]).reshape((-1, self._fields[0][1])).shape[0]
+        old = len(self)
+        for k, ((name, dim), val) in enumerate(zip(self._fields, values)):
+            val = np.broadcast_to(np.asarray(val, dtype=self._dtype).reshape((-1, dim)), (nr, dim))
+            self._data[k] = np.concatenate((self._data[k], val))
+
+        if (colors is not None) or (self._colors is not None):
+            if self._colors is None:
+                self._colors = np.full(old, -1, dtype=np.int32)
+            if colors is None:
+                colors = -1
+            colors = np.broadcast_to(np.asarray(colors, dtype=np.int32).ravel(), (nr,))
+            self._colors = np.concatenate((self._colors, colors))
+
+        if (matrices is not None) or (self._matrices is not None):
+            identity = _matrix_rows(np.identity(4), 1).astype(self._dtype)
+            if self._matrices is None:
+                self._matrices = np.repeat(identity, old, axis=0)
+            if matrices is None:
+                matrices = identity
+            self._matrices = np.concatenate((self._matrices,
+                                             _matrix_rows(matrices, nr).astype(self._dtype)))
+
+        self.invalidate()
+
+
+    def _extent(self):
+        # (points, radii) of the items, the items are covered by the
+        # boxes around the points padded by the radii
+        return self._data[:1], 0.
+
+
+    def _item_bounds(self):
+        # (N,3) arrays of the minimum and the maximum of each item
+        points, radii = self._extent()
+        lo = np.minimum.reduce(points)
+        hi = np.maximum.reduce(points)
+        return lo - radii, hi + radii
+
+
+    def _local_bounds(self):
+        if len(self) == 0:
+            return None
+        lo, hi = self._item_bounds()
+        if self._matrices is not None:
+            # the boxes of the eight transformed corners of each item
+            m = self._matrices.astype(np.float64)
+            rot = m[:, :9].reshape((-1, 3, 3))
+            center = (lo + hi) * 0.5
+            extent = np.einsum('nij,ni->nj', np.abs(rot), (hi - lo) * 0.5)
+            center = np.einsum('nij,ni->nj', rot, center) + m[:, 9:]
+            lo, hi = center - extent, center + extent
+        return np.array([lo.min(axis=0), hi.max(axis=0)])
+
+
+    def _write_palette(self, ffile, colors, indent):
+        for c in colors:
+            texture = self._palette[c]
+            if isinstance(texture, str):
+                self._write_indent(ffile, '#declare PovPalette%i = texture{ %s }\n' % (c, texture), indent)
+            else:
+                self._write_indent(ffile, '#declare PovPalette%i =\n' % c, indent)
+                texture.write_pov(ffile, indent)
+
+
+    def _write_rows(self, ffile, rows, fmt, prefix):
+        fmt = self._float_format(ffile, prefix + fmt)
+        for start in range(0, rows.shape[0], self._block_rows):
+            stop = min(start + self._block_rows, rows.shape[0])
+            block = self._float_rows(ffile, rows[start:stop])
+            ffile.write((fmt * (stop-start)) % tuple(block.ravel().tolist()))
+
+
+    def write_pov(self, ffile, indent=0):
+        if len(self) == 0:
+            print('%s needs at least one item to proceed!' % self._name)
+            self._write_indent(ffile, '//empty %s\n' % self._name, indent)
+            return
+
+        PovCSGObject.write_pov(self, ffile, indent)
+        self._write_indent(ffile, 'union{\n', indent)
+
+        if self._is_compact(ffile):
+            prefix = ''
+        else:
+            prefix = self._indent_str(indent+1)
+        fmt = self._item_sdl
+        rows = [d for d in self._data]
+        # the matrix follows the texture, so patterns move with the item
+        matrix = ''
+        if self._matrices is not None:
+            matrix = ' matrix <' + ','.join(['%f'] * 12) + '>'
+            rows.append(self._matrices)
+        rows = np.hstack(rows)
+
+        if self._colors is None:
+            self._write_rows(ffile, rows, fmt + matrix + ' }\n', prefix)
+        else:
+            colors = np.unique(self._colors)
+            self._write_palette(ffile, colors[colors >= 0], indent+1)
+            for c in colors:
+                if c < 0:
+                    texture = ''
+                else:
+                    texture = ' texture{ PovPalette%i }' % c
+                self._write_rows(ffile, rows[self._colors == c], fmt + texture + matrix + ' }\n', prefix)
+
+        self._write_attributes(ffile, indent+1)
+        self._write_indent(ffile, 'split_union off\n', indent+1)
+        self._write_indent(ffile, '}\n', indent)
+
+
+    def do_statistics(self):
+        self.add_stat_count(self._item_name, len(self))
+
+
+class PovSphereArray(PovPrimitiveArray):
+    _name      = 'SphereArray'
+    _item_name = PovCSGSphere._name
+    _fields    = (('centers', 3), ('radii', 1))
+    _item_sdl  = 'sphere{ <%f,%f,%f>, %f'
+
+    def __init__(self, centers=None, radii=1., colors=None, matrices=None,
+                 palette=None, dtype=np.float64, comment=None):
+        PovPrimitiveArray.__init__(self, palette=palette, dtype=dtype, comment=comment)
+        if centers is not None:
+            self.add(centers, radii, colors=colors, matrices=matrices)
+
+
+    def _extent(self):
+        centers, radii = self._data
+        return [centers], radii
+
+
+class PovCylinderArray(PovPrimitiveArray):
+    _name      = 'CylinderArray'
+    _item_name = PovCSGCylinder._name
+    _fields    = (('base_points', 3), ('cap_points', 3), ('radii', 1))
+    _item_sdl  = 'cylinder{ <%f,%f,%f>, <%f,%f,%f>, %f'
+
+    def __init__(self, base_points=None, cap_points=None, radii=1., colors=None,
+                 matrices=None, palette=None, dtype=np.float64, comment=None):
+        PovPrimitiveArray.__init__(self, palette=palette, dtype=dtype, comment=comment)
+        if base_points is not None:
+            self.add(base_points, cap_points, radii, colors=colors, matrices=matrices)
+
+
+    def _extent(self):
+        base, cap, radii = self._data
+        return [base, cap], radii
+
+
+class PovBoxArray(PovPrimitiveArray):
+    _name      = 'BoxArray'
+    _item_name = PovCSGBox._name
+    _fields    = (('corners1', 3), ('corners2', 3))
+    _item_sdl  = 'box{ <%f,%f,%f>, <%f,%f,%f>'
+
+    def __init__(self, corners1=None, corners2=None, colors=None, matrices=None,
+                 palette=None, dtype=np.float64, comment=None):
+        PovPrimitiveArray.__init__(self, palette=palette, dtype=dtype, comment=comment)
+        if corners1 is not None:
+            self.add(corners1, corners2, colors=colors, matrices=matrices)
+
+
+    def _extent(self):
+        corners1, corners2 = self._data
+        return [corners1, corners2], 0.
+
+
+def correct_light_positions( lights ):
+    # applies the pending rotations of many lights with one batch of
+    # rotation matrices, the same as correct_params does for each light
+    todo = [ l for l in lights
+             if ( getattr( l, '_rotate', None ) is not None )
+                and hasattr( l, '_light_points' ) ]
+    if len( todo ) == 0:
+        return
+
+    points  = [ l._light_points() for l in todo ]
+    counts  = [ len( p ) for p in points ]
+    xyz     = np.array( [ q.xyz_tuple for p in points for q in p ] )
+    anchors = np.repeat( [ l._rotate_anchor for l in todo ], counts, axis=0 )
+    angles  = np.array( [ l._rotate.xyz for l in todo ] )
+
+    matrices = np.repeat( pov_rotate_matrices( angles ), counts, axis=0 )
+    xyz = transform_points( xyz - anchors, matrices ) + anchors
+
+    n = 0
+    for l, c in zip( todo, counts ):
+        l._set_light_points( [ Point3D( xyz[n+i] ) for i in range( c ) ] )
+        # clear all rotations since this already included
+        l._rotate = None
+        n += c
+
+
 # a simple PovFile generator
 
 class PovFile( PovBaseList ):
-    def __init__( self, filename = None, verbose = False, camera_optimize = False ):
+    def __init__( self, filename = None, verbose = False, camera_optimize = False,
+                  chunk_size = None, compact = False, cache = False,
+                  instancing = False, texture_declares = False ):
         PovBaseList.__init__( self )
         self._filename = filename
 
+        self._chunk_size   = chunk_size
+        self._compact      = compact
+        self._cache        = cache
+
+        self._instancing          = instancing
+        self._instancing_min_size = 256
+
+        self._camera_optimize     = camera_optimize
+        self._camera_margin       = 0.
+
+        self._texture_declares    = texture_declares
+        self._texture_names       = {}
+
         self._camera       = None
         self._lights       = None
 
@@ -1146,6 +2795,88 @@ class PovFile( PovBaseList ):
         self._filename = filename
 
 
+    def set_chunk_size( self, chunk_size ):
+        self._chunk_size = chunk_size
+
+
+    def set_compact( self, compact ):
+        self._compact = compact
+
+
+    def set_cache( self, cache ):
+        self._cache = cache
+
+
+    def set_instancing( self, instancing, min_size=None ):
+        self._instancing = instancing
+        if min_size is not None:
+            self._instancing_min_size = min_size
+
+
+    def set_texture_declares( self, texture_declares ):
+        self._texture_declares = texture_declares
+
+
+    """
+    fold_transforms
+
+    folds the transformations of all objects into single matrices,
+    see PovCSGObject.fold_transforms
+    """
+    def fold_transforms( self ):
+        nr = 0
+        for i in self._items:
+            if isinstance( i, PovCSGObject ):
+                nr += i.fold_transforms()
+        return nr
+
+
+    """
+    set_camera_optimize
+
+    skips all objects outside of the camera view at write time
+
+    :param camera_optimize : enables the culling
+    :param margin          : widens the view in all directions, keeps
+                             objects for reflections and shadows
+    """
+    def set_camera_optimize( self, camera_optimize, margin=None ):
+        self._camera_optimize = camera_optimize
+        if margin is not None:
+            self._camera_margin = margin
+
+
+    def _start_culling( self, f ):
+        if ( self._camera_optimize == False ) or ( self._camera is None ):
+            return
+        if hasattr( self, '_width' ) and hasattr( self, '_height' ):
+            image_aspect = float( self._width ) / self._height
+        else:
+            image_aspect = None
+        f.frustum = self._camera.frustum( image_aspect=image_aspect,
+                                          margin=self._camera_margin )
+
+
+    def _stop_culling( self, f ):
+        if f.frustum is None: return
+        pypovcullingstatistics['tested'] += f.frustum.tested
+        pypovcullingstatistics['culled'] += f.frustum.culled
+        f.frustum = None
+
+
+    def _open_emitter( self, filename ):
+        if self._compact:
+            emitter = PovCompactEmitter
+        else:
+            emitter = PovEmitter
+        if self._chunk_size is None:
+            emitter = emitter( open( filename, 'w' ) )
+        else:
+            emitter = emitter( open( filename, 'w' ), chunk_size=self._chunk_size )
+        emitter.cache = self._cache
+        return emitter
+
+
     def set_camera( self, camera ):
         self._camera = camera
 
@@ -1179,16 +2910,7 @@ class PovFile( PovBaseList ):
 
 
     # generate povfile
-    def write_povfile(self, filename = None, submit=True):
-        if filename != None:
-            self.set_filename( filename )
-
-        f = open(  self._filename, 'w' )
-        _write_prefix_file( f )
-
-        f.write('// set the povray version for this file\n')
-        f.write('#version %s;\n\n' % self._version)
-
+    def _write_header(self, f):
         # global settings pre part
         self.settings.write_pov_pre(f)
 
@@ -1240,6 +2962,10 @@ class PovFile( PovBaseList ):
             i += 1
 
         # write declares
+        self._write_declares( f, declares )
+
+
+    def _write_declares(self, f, declares):
         for key in declares:
             f.write( '#declare %s = ' % key )
             if hasattr( declares[key], 'write_pov' ):
@@ -1252,31 +2978,275 @@ class PovFile( PovBaseList ):
             #    f.write( '%s;\n' % ( self._declares[key] ) )
         f.write( '\n' )
 
-        # write camera
+
+    """
+    _collect_instances
+
+    looks for structurally identical subtrees, the objects are compared
+    without their own transformations. Every structure which is found
+    at least twice is declared once and all occurrences are written as
+    object{Name transformations}. Subtrees of instanced objects are not
+    considered separately.
+
+    :param f     : emitter of the output file
+    :param items : top-level objects
+    :return      : dictionary with the new declares
+    """
+    def _collect_instances(self, f, items):
+        f.instances = None
+        if not self._instancing:
+            return {}
+
+        # all objects in pre-order with the index of their parent
+        nodes = []
+        todo  = [ ( i, 0 ) for i in reversed( items ) ]
+        while len( todo ) > 0:
+            obj, parent = todo.pop()
+            if ( not isinstance( obj, PovCSGObject ) ) or obj.hidden:
+                continue
+            nodes.append( [ obj, parent, None ] )
+            if isinstance( obj, PovBaseList ) and not obj.is_streaming():
+                nr = len( nodes )
+                for i in reversed( obj._items ):
+                    todo.append( ( i, nr ) )
+
+        # bottom-up, the children are written as their hash, so each
+        # object is written only once and the hash of a list combines
+        # the hashes of its items
+        stubs  = {}
+        sizes  = [ 0 ] * ( len( nodes ) + 1 )
+        counts = {}
+        for nr in range( len( nodes ), 0, -1 ):
+            node = nodes[nr-1]
+            obj, parent = node[0], node[1]
+            if obj.is_streaming():
+                continue
+            rec = f.record()
+            rec.stubs = stubs
+            obj.write_pov_body( rec, indent=0 )
+            key = hashlib.sha1( ''.join( rec.fragments ).encode() ).hexdigest()
+            if isinstance( obj, PovBaseList ):
+                # the items are not written again
+                for i in obj._items:
+                    stubs.pop( id( i ), None )
+            stubs[id( obj )] = '#%s\n' % key
+            # the size of the complete body
+            sizes[nr] += rec.written - rec.stubbed
+            sizes[parent] += sizes[nr]
+            if sizes[nr] >= self._instancing_min_size:
+                node[2] = key
+                counts[key] = counts.get( key, 0 ) + 1
+
+        # top-down, descendants of instanced objects stay in the declare
+        declares  = {}
+        instances = {}
+        instanced = [ False ] * ( len( nodes ) + 1 )
+        for nr, ( obj, parent, key ) in enumerate( nodes, 1 ):
+            name = None
+            if instanced[parent]:
+                instanced[nr] = True
+            elif ( key is not None ) and ( counts[key] > 1 ):
+                name = 'Instance_%s' % key[:12]
+                if name not in declares:
+                    # only the bodies of the instances are kept
+                    rec = f.record()
+                    obj.write_pov_body( rec, indent=0 )
+                    declares[name] = PovDeclareText( ''.join( rec.fragments ) )
+                instances[id( obj )] = name
+                instanced[nr] = True
+                if obj._instance_name != name:
+                    obj._instance_name = name
+                    obj.invalidate()
+                continue
+            if obj._instance_name is not None:
+                obj._instance_name = None
+                obj.invalidate()
+
+        f.instances = instances
+        return declares
+
+
+    """
+    _collect_textures
+
+    looks for textures, pigments and strings used as texture which are
+    used by more than one object, either as the same instance or as an
+    identical copy. Finishes, normals and pigments are shared, if they
+    are used in more than one texture. All of them are declared once
+    and referenced by name.
+
+    :param f     : emitter of the output file
+    :param items : top-level objects
+    :return      : dictionary with the new declares
+    """
+    def _collect_textures(self, f, items):
+        f.declared = None
+        if not self._texture_declares:
+            return {}
+
+        # all textures and their users, strings are used as keys directly
+        textures = {}
+        users    = {}
+        todo     = list( items )
+        while len( todo ) > 0:
+            obj = todo.pop()
+            if ( not isinstance( obj, PovObject ) ) or obj.hidden:
+                continue
+            if obj._texture is not None:
+                for t in obj._texture:
+                    if isinstance( t, str ):
+                        key = t
+                    else:
+                        key = id( t )
+                    if key in users:
+                        users[key].append( obj )
+                    else:
+                        textures[key] = t
+                        users[key]    = [ obj ]
+            if isinstance( obj, PovBaseList ):
+                todo += obj._items
+
+        # components of textures
+        components = {}
+        comp_users = {}
+        for key, t in textures.items():
+            if isinstance( t, PovTexture ):
+                for c in ( t._pigment, t._normal, t._finish ):
+                    if isinstance( c, PovBasicObject ):
+                        if id( c ) in comp_users:
+                            comp_users[id( c )].append( key )
+                        else:
+                            components[id( c )] = c
+                            comp_users[id( c )] = [ key ]
+
+        declared = {}
+        declares = {}
+        f.declared = declared
+
+        def render( obj ):
+            rec = f.record()
+            if isinstance( obj, str ):
+                rec.write_indent( 'texture{\n', 0 )
+                rec.write_indent( '%s\n' % obj, 1 )
+                rec.write_indent( '}\n', 0 )
+            else:
+                obj.write_pov( rec, indent=0 )
+            return ''.join( rec.fragments )
+
+        def declare( objects, uses ):
+            groups = {}
+            for key, obj in objects.items():
+                text = render( obj )
+                if text == '': continue
+                digest = hashlib.sha1( text.encode() ).hexdigest()
+                if digest in groups:
+                    groups[digest][1].append( key )
+                else:
+                    groups[digest] = [ text, [ key ], obj ]
+            for digest, ( text, keys, obj ) in groups.items():
+                if sum( [ len( uses[key] ) for key in keys ] ) < 2:
+                    continue
+                if isinstance( obj, PovFinish ):
+                    name = 'Finish_%s'
+                elif isinstance( obj, PovNormal ):
+                    name = 'Normal_%s'
+                elif isinstance( obj, PovPigment ):
+                    name = 'Pigment_%s'
+                else:
+                    name = 'Texture_%s'
+                name = name % digest[:12]
+                declares[name] = PovDeclareText( text )
+                for key in keys:
+                    declared[key] = name
+
+        declare( components, comp_users )
+        declare( textures, users )
+
+        # objects with changed texture references must be written again
+        for key in set( declared.keys() ) | set( self._texture_names.keys() ):
+            if declared.get( key ) == self._texture_names.get( key ):
+                continue
+            if key in comp_users:
+                keys = comp_users[key]
+            else:
+                keys = [ key ]
+            for k in keys:
+                for obj in users.get( k, [] ):
+                    obj.invalidate()
+        self._texture_names = dict( declared )
+
+        return declares
+
+
+    def _write_scene_declares(self, f, items, filename=None):
+        # textures first, the instanced bodies refer to them
+        declares = self._collect_textures( f, items )
+        declares.update( self._collect_instances( f, items ) )
+        self._write_array_data( f, items, filename )
+        if len( declares ) > 0:
+            self._write_declares( f, declares )
+
+
+    def _write_array_data(self, f, items, filename):
+        # side files of unions with array emission, their names depend
+        # on the scene file, see PovCSGUnion.set_array_emission
+        unions = [ i for i in items if isinstance( i, PovCSGObjectList ) ]
+        if len( unions ) == 0:
+            return
+        if filename is None:
+            filename = self._filename
+        frame_name = os.path.splitext( os.path.basename( filename ) )[0]
+        nr = 0
+        for i in unions:
+            nr += i.write_array_data( f, frame_name )
+        if nr == 0:
+            return
+
+        f.write( '#declare PovArrayFrame = "%s";\n\n' % frame_name )
+        self.extra_files = self.collect_extra_files()
+
+
+    def _write_camera(self, f):
         if self._camera is None:
             print( 'Warning: No camera defined!' )
         else:
             self._camera.write_pov( f, indent=0 )
             f.write( '\n' )
 
-        # write objects
-        for i in self._items:
+
+    def _write_objects(self, f, items):
+        frustum = getattr( f, 'frustum', None )
+        for i in items:
             if i.hidden == False:
-                i.write_pov( f, indent=0 )
+                if ( frustum is not None ) and ( frustum.is_visible( i ) == False ):
+                    continue
+                i.write_pov_cached( f, indent=0 )
         f.write( '\n' )
 
-        # write ligths
+
+    def _write_lights(self, f, items, global_lights=True):
+        # rotate all bound lights at once, write_pov has nothing
+        # left to do for them
+        lights = []
+        if global_lights and ( self._lights is not None ):
+            lights.extend( self._lights )
+        for i in items:
+            if hasattr( i, 'collect_lights' ):
+                lights.extend( i.collect_lights() )
+        correct_light_positions( lights )
 
         # global lights
-        if self._lights is not None:
+        if global_lights and ( self._lights is not None ):
             for i in self._lights:
                 i.write_pov( f, indent=0 )
 
         # object related lights
-        for i in self._items:
+        for i in items:
             i.write_lights( f, indent=0 )
         f.write( '\n' )
 
+
+    def _write_footer(self, f):
         _write_postfix_file( f )
 
 
@@ -1286,4 +3256,33 @@ class PovFile( PovBaseList ):
         if ( self._postfix_file is not None ):
             _copy_file( f, self._postfix_file, 'PovPostFile' )
 
+
+    def write_povfile(self, filename = None, submit=True):
+        if filename != None:
+            self.set_filename( filename )
+
+        f = self._open_emitter( self._filename )
+        _write_prefix_file( f )
+
+        f.write('// set the povray version for this file\n')
+        f.write('#version %s;\n\n' % self._version)
+
+        self._write_header( f )
+
+        # write declares for shared textures and instanced objects
+        self._write_scene_declares( f, self._items )
+
+        # write camera
+        self._write_camera( f )
+
+        # write objects
+        self._start_culling( f )
+        self._write_objects( f, self._items )
+        self._stop_culling( f )
+
+        # write ligths
+        self._write_lights( f, self._items )
+
+        self._write_footer( f )
+
         f.close()
@@ -3,7 +3,7 @@
 pypovlib/pypovrayqueue.py
 
 written by: Oliver Cordes 2019-03-04
-changed by: Oliver Cordes 2020-04-04
+changed by: Oliver Cordes 2020-05-16
 
 """
 
@@ -169,10 +169,21 @@ class RQPovObj(object):
         listoffiles.append(filename)
         listoffiles.append(self._create_master_ini(filename))
 
-        # extra_files are not intrinsic for this class
-        if hasattr(self, 'extra_files'):
+        # extra_files are not intrinsic for this class, animations keep
+        # them for each frame
+        frame_extra_files = getattr(self, 'frame_extra_files', {})
+        if filename in frame_extra_files:
+            listoffiles += frame_extra_files[filename]
+        elif getattr(self, 'extra_files', None) is not None:
             listoffiles += self.extra_files
 
+        # files shared by all images, e.g. the static include of animations,
+        # images are rendered independently, so every archive needs a copy
+        if hasattr(self, 'shared_files'):
+            for i in self.shared_files:
+                if i not in listoffiles:
+                    listoffiles.append(i)
+
         print('Creating image files:')
         for i in listoffiles:
             print('  {} ...'.format(i))
@@ -437,10 +448,12 @@ class RQPovAnimation(PovAnimation, RQPovObj):
                         width=640,
                         height=480,
                         timeout=3600,
-                        sleep=5):
+                        sleep=5,
+                        static_include=False):
         PovAnimation.__init__(self, directory=directory,
                                 verbose=verbose,
-                                camera_optimize=camera_optimize)
+                                camera_optimize=camera_optimize,
+                                static_include=static_include)
 
         RQPovObj.__init__(self, config=config,
                                rq_project_name=rq_project_name,
@@ -452,15 +465,15 @@ class RQPovAnimation(PovAnimation, RQPovObj):
         self._animation_files = []
 
 
-    def write_povfile(self, filename=None):
-        # first save the standard file
-        PovFile.write_povfile(self, filename=filename)
-
-        self._animation_files.append(self._filename)
+    def _frame_written(self, filename):
+        # also called for the frames written by worker processes
+        self._animation_files.append(filename)
 
 
-    def animate(self, frames = None, duration = None, fps = None, submit=True):
-        PovAnimation.animate(self, frames=frames, duration=duration, fps=fps)
+    def animate(self, frames = None, duration = None, fps = None, submit=True,
+                      jobs = None, frame_range = None):
+        PovAnimation.animate(self, frames=frames, duration=duration, fps=fps,
+                             jobs=jobs, frame_range=frame_range)
 
         if submit:
             self.rq_execute(PROJECT_TYPE_ANIMATION, self._animation_files, directory=self._directory)
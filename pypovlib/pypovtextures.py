@@ -2,7 +2,7 @@
 #
 #
 # written by: Oliver Cordes 2015-04-10
-# changed by: Oliver Cordes 2019-08-14
+# changed by: Oliver Cordes 2020-05-16
 
 # povray syntax for finish
 #ambient COLOR | diffuse Amount | brilliance Amount |
@@ -16,14 +16,50 @@ from  pypovlib.pypovbase import PovBasicObject, PovGeometry, \
                                 convert2vector, convertarray2vector
 
 
-_fmt_key_float = '{:s} {:6f}\n'
+_fmt_key_float = '%s %f\n'
 _fmt_key_int   = '{:s} {:d}\n'
 
 normal_type_none   = 0
 normal_type_bumps  = 1
 
 
-class PovFinish( PovBasicObject ):
+"""
+PovTextureObject
+
+base class of textures and their components. The objects which use
+a texture are registered as parents, every change of an attribute
+invalidates their cached output, see PovObject.invalidate
+"""
+class PovTextureObject( PovBasicObject ):
+    _parents = None
+
+    def __setattr__( self, name, value ):
+        object.__setattr__( self, name, value )
+        if self._parents is not None:
+            self.invalidate()
+
+
+    def invalidate( self ):
+        if self._parents is None: return
+        for p in self._parents:
+            p.invalidate()
+
+
+    def add_parent( self, parent ):
+        if self._parents is None:
+            object.__setattr__( self, '_parents', [ parent ] )
+        elif parent not in self._parents:
+            self._parents.append( parent )
+
+
+    def _add_component( self, component ):
+        if isinstance( component, PovTextureObject ):
+            component.add_parent( self )
+        return component
+
+
+
+class PovFinish( PovTextureObject ):
     def __init__( self, comment=None, name=None ):
         PovBasicObject.__init__( self, comment=comment )
         self.name = name
@@ -59,40 +95,33 @@ class PovFinish( PovBasicObject ):
         return True
 
     def write_pov( self, ffile, indent=0 ):
+        if self._write_declared( ffile, 'finish', indent ): return
         if ( self.verify() == True ):
             self._write_indent( ffile, 'finish{\n', indent )
             if self.ambient is not None:
-                s = _fmt_key_float.format( 'ambient', self.ambient )
-                self._write_indent( ffile, '%s' % s, indent+1 )
+                self._write_format( ffile, _fmt_key_float, ( 'ambient', self.ambient ), indent+1 )
             if self.diffuse is not None:
-                self._write_indent( ffile, _fmt_key_float.format( 'diffuse', self.diffuse ), indent+1 )
+                self._write_format( ffile, _fmt_key_float, ( 'diffuse', self.diffuse ), indent+1 )
             if self.brilliance is not None:
-                s = _fmt_key_float.format( 'brilliance', self.brilliance )
-                self._write_indent( ffile, '%s' % s, indent+1 )
+                self._write_format( ffile, _fmt_key_float, ( 'brilliance', self.brilliance ), indent+1 )
             if self.phong is not None:
-                s = _fmt_key_float.format( 'phong', self.phong )
-                self._write_indent( ffile, '%s' % s, indent+1 )
+                self._write_format( ffile, _fmt_key_float, ( 'phong', self.phong ), indent+1 )
             if self.phong_size is not None:
-                s = _fmt_key_float.format( 'phong_size', self.phong_size )
-                self._write_indent( ffile, '%s' % s, indent+1 )
+                self._write_format( ffile, _fmt_key_float, ( 'phong_size', self.phong_size ), indent+1 )
             if self.specular is not None:
-                s = _fmt_key_float.format( 'specular', self.specular )
-                self._write_indent( ffile, '%s' % s, indent+1 )
+                self._write_format( ffile, _fmt_key_float, ( 'specular', self.specular ), indent+1 )
             if self.roughness is not None:
-                s = _fmt_key_float.format( 'roughness', self.roughness )
-                self._write_indent( ffile, '%s' % s, indent+1 )
+                self._write_format( ffile, _fmt_key_float, ( 'roughness', self.roughness ), indent+1 )
             if self.is_metallic:
                 if self.metallic is None:
                     self._write_indent( ffile, 'metallic\n' )
                 else:
-                    s = _fmt_key_float.format( 'metallic', self.metallic )
-                    self._write_indent( ffile, '%s' % s, indent+1 )
+                    self._write_format( ffile, _fmt_key_float, ( 'metallic', self.metallic ), indent+1 )
             if self.reflection is not None:
                 if ( isinstance( self.reflection, str) ):
-                    s = 'reflection { %s }' % self.reflection
+                    self._write_indent( ffile, 'reflection { %s }' % self.reflection, indent+1 )
                 else:
-                    s = _fmt_key_float.format( 'reflection', self.reflection )
-                self._write_indent( ffile, '%s' % s, indent+1 )
+                    self._write_format( ffile, _fmt_key_float, ( 'reflection', self.reflection ), indent+1 )
             if self.crand is not None:
                 pass
             if self.conserve_energy is not None:
@@ -102,7 +131,7 @@ class PovFinish( PovBasicObject ):
             self._write_indent( ffile, '}\n', indent )
 
 
-class PovImageMap( PovBasicObject ):
+class PovImageMap( PovTextureObject ):
     def __init__( self, image, map_type, once, comment=None ):
         PovBasicObject.__init__( self, comment=comment )
 
@@ -130,21 +159,21 @@ class PovImageMap( PovBasicObject ):
 
     def _write_scale( self, ffile, indent=0 ):
         if self._scale is None: return
-        self._write_indent( ffile, 'scale <%f,%f,%f>\n' % ( self._scale[0],
+        self._write_format( ffile, 'scale <%f,%f,%f>\n', ( self._scale[0],
                                                      self._scale[1],
                                                      self._scale[2] ),
                                                      indent )
 
     def _write_translate( self, ffile, indent=0 ):
         if self._translate is None: return
-        self._write_indent( ffile, 'translate <%f,%f,%f>\n' % ( self._translate[0],
+        self._write_format( ffile, 'translate <%f,%f,%f>\n', ( self._translate[0],
                                                                 self._translate[1],
                                                                 self._translate[2] ),
                                                                 indent )
 
     def _write_rotate( self, ffile, indent=0 ):
         if self._rotate is None: return
-        self._write_indent( ffile, 'rotate <%f,%f,%f>\n' % ( self._rotate[0],
+        self._write_format( ffile, 'rotate <%f,%f,%f>\n', ( self._rotate[0],
                                                              self._rotate[1],
                                                              self._rotate[2] ),
                                                              indent )
@@ -169,7 +198,7 @@ class PovImageMap( PovBasicObject ):
         self._write_indent( ffile, '}\n', indent=indent )
 
 
-class PovColorMap(PovBasicObject):
+class PovColorMap(PovTextureObject):
     def __init__(self, cmap, comment=None):
         PovBasicObject.__init__(self, comment=comment)
 
@@ -180,13 +209,13 @@ class PovColorMap(PovBasicObject):
         PovBasicObject.write_pov(self, ffile, indent=indent)
         self._write_indent(ffile, 'color_map{\n', indent=indent)
         for i in self._cmap:
-            self._write_indent(ffile, '[ %f, color %s ]\n' % (i[0], i[1]),
+            self._write_format(ffile, '[ %f, color %s ]\n', (i[0], i[1]),
                                 indent=indent+1)
         self._write_indent(ffile, '}\n', indent=indent)
 
 
 
-class PovNormal( PovBasicObject ):
+class PovNormal( PovTextureObject ):
     def __init__( self, comment=None, name=None, cmd=None ):
         PovBasicObject.__init__( self, comment=comment )
 
@@ -198,6 +227,7 @@ class PovNormal( PovBasicObject ):
 
 
     def write_pov( self, ffile, indent=0 ):
+        if self._write_declared( ffile, 'normal', indent ): return
         self._write_indent( ffile, 'normal{\n', indent=indent )
         if self._cmd is not None:
             self._write_indent( ffile, cmd+'\n',  indent=indent+1 )
@@ -205,18 +235,16 @@ class PovNormal( PovBasicObject ):
             if ( self.normal_type == normal_type_bumps ):
                 if ( self.bumps_size is None ):
                     raise ValueError( 'bumps_size must be defined!' )
-                s = _fmt_key_float.format( 'bumps', self.bumps_size )
-                self._write_indent( ffile, '%s' % s, indent+1 )
+                self._write_format( ffile, _fmt_key_float, ( 'bumps', self.bumps_size ), indent+1 )
                 if ( self.bumps_scale is not None ):
-                    s = _fmt_key_float.format( 'scale', self.bumps_scale )
-                    self._write_indent( ffile, '%s' % s, indent+1 )
+                    self._write_format( ffile, _fmt_key_float, ( 'scale', self.bumps_scale ), indent+1 )
             else:
                 pass
         self._write_indent( ffile, '}\n', indent=indent )
 
 
 
-class PovPigmentPattern(PovBasicObject):
+class PovPigmentPattern(PovTextureObject):
     def __init__(self, comment='Pattern'):
         PovBasicObject.__init__(self, comment=comment)
         self.color = None
@@ -271,7 +299,7 @@ class PovPatternPavement(PovPigmentPattern, PovGeometry):
         self._write_geometrics(ffile, indent=indent+1)
 
 
-class PovPigment(PovBasicObject, PovGeometry):
+class PovPigment(PovTextureObject, PovGeometry):
     def __init__(self,
                  comment   = None,
                  pattern   = None,
@@ -283,27 +311,28 @@ class PovPigment(PovBasicObject, PovGeometry):
                  gradient  = None ):
         PovBasicObject.__init__(self, comment)
 
-        self._pattern   = pattern
+        self._pattern   = self._add_component(pattern)
         self._color     = color
         self._rgb       = rgb
-        self._image_map = image_map
-        self._color_map = color_map
+        self._image_map = self._add_component(image_map)
+        self._color_map = self._add_component(color_map)
         self._gradient  = gradient
 
 
     def write_pov( self, ffile, indent ):
+        if self._write_declared( ffile, 'pigment', indent ): return
         self._write_indent( ffile, 'pigment{\n', indent=indent )
         if (self._pattern is not None):
             self._pattern.write_pov(ffile, indent=indent+1)
         if ( self._color is not None ):
             self._write_indent( ffile, 'color %s\n' % self._color , indent+1 )
         elif ( self._rgb is not None ):
-            self._write_indent( ffile, 'color rgb %s\n' % self._rgb , indent+1 )
+            self._write_format( ffile, 'color rgb %s\n', ( self._rgb, ), indent+1 )
         elif ( self._image_map is not None ):
             self._image_map.write_pov( ffile, indent=indent+1 )
             self._write_geometrics( ffile, indent=indent+1 )
         elif ( self._color_map is not None ) and ( self._gradient is not None ):
-            self._write_indent( ffile, 'gradient <%f,%f,%f>\n' % ( self._gradient[0],
+            self._write_format( ffile, 'gradient <%f,%f,%f>\n', ( self._gradient[0],
                                                                   self._gradient[1],
                                                                   self._gradient[2] ), indent+1 )
             self._color_map.write_pov( ffile, indent=indent+1 )
@@ -312,28 +341,29 @@ class PovPigment(PovBasicObject, PovGeometry):
         self._write_indent( ffile, '}\n', indent=indent )
 
 
-class PovTexture(PovBasicObject, PovGeometry):
+class PovTexture(PovTextureObject, PovGeometry):
     def __init__( self, comment=None, name=None, finish=None, normal=None, pigment=None ):
         PovBasicObject.__init__( self, comment=comment )
 
-        self._finish  = finish
-        self._normal  = normal
-        self._pigment = pigment
+        self._finish  = self._add_component( finish )
+        self._normal  = self._add_component( normal )
+        self._pigment = self._add_component( pigment )
 
 
     def set_finish( self, new_finish ):
-        self._finish = new_finish
+        self._finish = self._add_component( new_finish )
 
 
     def set_normal( self, new_normal ):
-        self._normal = new_normal
+        self._normal = self._add_component( new_normal )
 
 
     def set_pigment( self,  pigment ):
-        self._pigment = pigment
+        self._pigment = self._add_component( pigment )
 
 
     def write_pov( self, ffile, indent=0 ):
+        if self._write_declared( ffile, 'texture', indent ): return
         PovBasicObject.write_pov( self, ffile, indent )
         self._write_indent( ffile, 'texture{\n', indent )
         self.write_texture( ffile, indent+1 )
@@ -350,12 +380,13 @@ class PovTexture(PovBasicObject, PovGeometry):
         pass
 
 
-class PovTextureRaw( PovBasicObject ):
+class PovTextureRaw( PovTextureObject ):
     def __init__( self, comment=None, text=None ):
         PovBasicObject.__init__( self, comment=comment )
         self._text = text
 
     def write_pov( self, ffile, indent=0 ):
+        if self._write_declared( ffile, 'texture', indent ): return
         if self._text is not None:
             PovBasicObject.write_pov( self, ffile, indent )
             self._write_indent( ffile, 'texture{\n', indent )
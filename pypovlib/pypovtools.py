@@ -1,11 +1,13 @@
 # pypovtools.py
 
 # wirtten by: Oliver Cordes 2015-03-26
-# changed by: Oliver Cordes 2018-03-02
+# changed by: Oliver Cordes 2020-05-16
 
 from  pypovlib.pypovobjects import *
 
 import numpy as np
+import gc
+import tracemalloc
 
 
 # special CSG objects based on unions an differences
@@ -131,3 +133,32 @@ class PovImagePlate( PovCSGBox ):
 
     def do_statistics( self ):
         self.add_stat_count( 'ImagePlate' )
+
+
+
+# benchmarks
+
+"""
+object_memory
+
+measures the memory of scene objects with tracemalloc, the factory is
+called count times and the objects are kept alive until the
+measurement is done. Returns the number of bytes per object, e.g.
+
+    object_memory( lambda i: PovCSGSphere( [i,0,0], 1. ) )
+
+:param factory : function which creates an object from its number
+:param count   : number of created objects
+"""
+def object_memory( factory, count=100000 ):
+    gc.collect()
+    tracing = tracemalloc.is_tracing()
+    if not tracing:
+        tracemalloc.start()
+    start = tracemalloc.get_traced_memory()[0]
+    objects = [ factory( i ) for i in range( count ) ]
+    size = tracemalloc.get_traced_memory()[0] - start
+    if not tracing:
+        tracemalloc.stop()
+    del objects
+    return size / count
@@ -1,7 +1,7 @@
 # pypovwearther.py
 
 # wirtten by: Oliver Cordes 2015-09-06
-# changed by: Oliver Cordes 2016-09-24
+# changed by: Oliver Cordes 2020-05-16
 
 import sys
 
@@ -16,7 +16,15 @@ from pypovlib.pypovobjects import *
 from pypovlib.pypovbase import *
 
 
+# distributions of the drops in a field
+drop_distribution_grid   = 0
+drop_distribution_random = 1
+drop_distribution_jitter = 2
+
+
 class PovDrop( PovCSGObject ):
+    __slots__ = ( '_xyz', '_top', '_bottom', '_start' )
+
     def __init__( self, xyz, top, bottom, v, start=None ):
         PovCSGObject.__init__( self )
 
@@ -30,15 +38,22 @@ class PovDrop( PovCSGObject ):
 
 
 class PovRainDrop( PovDrop ):
+    __slots__ = ()
+
+    _name   = 'RainDrop'
+    _radius = 0.1
     def __init__( self, xyz, top, bottom, v, start=None ):
         PovDrop.__init__(  self, xyz, top, bottom, v, start=None )
 
     def write_pov( self, ffile, indent = 0 ):
-        s = PovCSGSphere( self._xyz, 0.1 )
-        s.write_pov( ffile, indent = indent )
+        self._write_indent( ffile, 'sphere{\n', indent )
+        self._write_format( ffile, '<%f,%f,%f>, %f\n', tuple( Point3D( self._xyz ) ) + ( self._radius, ), indent+1 )
+        self._write_indent( ffile, '}\n', indent )
     
 
 class PovSnowDrop( PovDrop ):
+    __slots__ = ()
+
     def __init__( self, xyz, top, bottom, v, start=None ):
         PovDrop.__init__(  self, xyz, top, bottom, v, start=None )
 
@@ -46,8 +61,21 @@ class PovSnowDrop( PovDrop ):
         pass
 
 
+# drop fields
+#
+# the drops of a field are not single objects, the positions and the
+# velocities are kept in (N,3) numpy arrays. The field moves all drops
+# with one array operation per frame and writes them in blocks of
+# _block_rows drops with a single % operation.
+
 class PovDropField( PovCSGUnion ):
-    def __init__( self, x1, y1, x2, y2, z1, z2, nx, ny, nz, distribution, comment=None  ):
+    _drop_name  = 'Drop'
+    # format of a single drop filled with the position and _radius,
+    # None writes nothing
+    _drop_fmt   = None
+    _block_rows = 65536
+    def __init__( self, x1, y1, x2, y2, z1, z2, nx, ny, nz, distribution,
+                  comment=None, v=0.1, seed=None ):
         PovCSGUnion.__init__( self, comment=comment )
 
         self._x1 = x1
@@ -62,40 +90,176 @@ class PovDropField( PovCSGUnion ):
         self._nz = nz
         self._distribution = distribution
 
-        self._v = 0.1
-        
+        self._v = v
+        self._rng = np.random.default_rng( seed )
+
+        self._positions  = None
+        self._velocities = None
+
         # create the drops
         self._create_field()
 
 
-    def _create_field_homogenious( self ):
+    def __len__( self ):
+        return self._positions.shape[0]
+
+
+    def _grid( self ):
         x_v = np.linspace( self._x1, self._x2, self._nx )
         y_v = np.linspace( self._y1, self._y2, self._ny )
         z_v = np.linspace( self._z1, self._z2, self._nz )
 
-        for x in x_v:
-            for y in y_v:
-                for z in z_v:
-                    self._create_drop( np.array( [x,y,z] ), self._z2, self._z1, self._v )
+        # same order as x, y, z loops
+        grid = np.meshgrid( x_v, y_v, z_v, indexing='ij' )
+        return np.stack( [ g.ravel() for g in grid ], axis=1 )
+
+
+    def _create_field_homogenious( self ):
+        return self._grid()
+
+
+    def _create_field_random( self ):
+        nr = self._nx * self._ny * self._nz
+        return self._rng.uniform( self._lower(), self._upper(), size=( nr, 3 ) )
+
+
+    def _create_field_jitter( self ):
+        # moves each grid point randomly inside of its grid cell
+        cells = np.array( [ self._nx, self._ny, self._nz ] ) - 1
+        cells[cells < 1] = 1
+        spacing = ( self._upper() - self._lower() ) / cells
+        positions = self._grid()
+        positions += self._rng.uniform( -0.5, 0.5, size=positions.shape ) * spacing
+        return np.clip( positions, self._lower(), self._upper() )
+
 
-                    
     def _create_field( self ):
-        if self._distribution == 0:
-            self._create_field_homogenious()        # create the drops
+        if self._distribution == drop_distribution_grid:
+            positions = self._create_field_homogenious()
+        elif self._distribution == drop_distribution_random:
+            positions = self._create_field_random()
+        elif self._distribution == drop_distribution_jitter:
+            positions = self._create_field_jitter()
+        else:
+            print( 'WARNING: unknown drop distribution %s! Using an empty field!' % self._distribution )
+            positions = np.zeros( ( 0, 3 ) )
 
+        self.set_positions( positions )
+        self.set_velocity( self._v )
 
-    # abstract procedure to create a single drop 
-    def _create_drop( self, xyz, top, bottom, v ):
-        pass
 
+    def _lower( self ):
+        return np.array( [ self._x1, self._y1, self._z1 ], dtype=np.float64 )
 
 
+    def _upper( self ):
+        return np.array( [ self._x2, self._y2, self._z2 ], dtype=np.float64 )
 
-class PovRainField( PovDropField ):
-    def __init__( self, x1, y1, x2, y2, z1, z2, nx, ny, nz, distribution ):
-        PovDropField.__init__( self, x1, y2, x2, y2, z1, z2, nx, ny, nz, distribution, comment='Rainfield' )
+
+    def set_positions( self, positions ):
+        self._positions = np.array( positions, dtype=np.float64 ).reshape( ( -1, 3 ) )
+        self.invalidate()
+
+
+    """
+    set_velocity
+
+    sets the velocities of the drops, a number is the falling speed
+    along -z, a vector is used for all drops and a (N,3) array gives
+    the velocity of each drop
+    """
+    def set_velocity( self, v ):
+        nr = self._positions.shape[0]
+        if np.ndim( v ) == 0:
+            v = [ 0., 0., -v ]
+        self._velocities = np.array( np.broadcast_to( np.asarray( v, dtype=np.float64 ), ( nr, 3 ) ) )
 
 
-    def _create_drop( self, xyz, top, bottom, v ):
-        drop = PovRainDrop( xyz, top, bottom, v )
-        self.add( drop )
+    """
+    move
+
+    moves all drops for the time dt, drops which leave the box of the
+    field enter it again from the opposite side
+    """
+    def move( self, dt ):
+        if self._positions.shape[0] == 0: return
+        lower = self._lower()
+        size  = self._upper() - lower
+        positions = self._positions + self._velocities * dt
+        outside = ( positions < lower ) | ( positions > lower + size )
+        outside[:,size <= 0.] = False
+        if outside.any():
+            size = np.where( size > 0., size, 1. )
+            positions = np.where( outside, lower + np.mod( positions - lower, size ), positions )
+        self._positions = positions
+        self.invalidate()
+
+
+    # animation handling
+    def update_timedelta( self, time_delta ):
+        self.move( time_delta )
+
+
+    def has_animation( self ):
+        return self.is_animated()
+
+
+    def is_streaming( self ):
+        return False
+
+
+    def _local_bounds( self ):
+        if ( self._drop_fmt is None ) or ( self._positions.shape[0] == 0 ):
+            return None
+        return np.array( [ self._positions.min( axis=0 ) - self._radius,
+                           self._positions.max( axis=0 ) + self._radius ] )
+
+
+    def _write_drops( self, ffile, indent=0 ):
+        nr = self._positions.shape[0]
+        if self._is_compact( ffile ):
+            prefix = ''
+        else:
+            prefix = self._indent_str( indent )
+        line = self._float_format( ffile, prefix + self._drop_fmt + '\n' )
+        for start in range( 0, nr, self._block_rows ):
+            stop = min( start + self._block_rows, nr )
+            rows = np.empty( ( stop-start, 4 ) )
+            rows[:,:3] = self._positions[start:stop]
+            rows[:,3]  = self._radius
+            rows = self._float_rows( ffile, rows )
+            ffile.write( ( line * ( stop-start ) ) % tuple( rows.ravel().tolist() ) )
+
+
+    def write_pov( self, ffile, indent = 0 ):
+        if ( self._drop_fmt is None ) or ( self._positions.shape[0] == 0 ):
+            self._write_indent( ffile, '//empty drop field\n', indent )
+            return
+        PovCSGObject.write_pov( self, ffile, indent=indent )
+        self._write_indent( ffile, 'union{\n', indent )
+
+        self._write_drops( ffile, indent=indent+1 )
+        self._write_attributes( ffile, indent+1 )
+
+        if not self._split_union:
+            self._write_indent( ffile, 'split_union off\n', indent+1 )
+
+        self._write_indent( ffile, '}\n', indent )
+
+
+    def do_statistics( self ):
+        PovCSGUnion.do_statistics( self )
+        if self._drop_fmt is not None:
+            self.add_stat_count( self._drop_name, self._positions.shape[0] )
+
+
+
+
+class PovRainField( PovDropField ):
+    _drop_name = PovRainDrop._name
+    _radius    = PovRainDrop._radius
+    _drop_fmt  = 'sphere{ <%f,%f,%f>, %f }'
+    def __init__( self, x1, y1, x2, y2, z1, z2, nx, ny, nz, distribution,
+                  v=0.1, seed=None ):
+        PovDropField.__init__( self, x1, y1, x2, y2, z1, z2, nx, ny, nz, distribution,
+                               comment='Rainfield', v=v, seed=seed )
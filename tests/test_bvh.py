@@ -0,0 +1,57 @@
+# test_bvh.py
+
+# written by: Oliver Cordes 2020-05-16
+
+import gc
+
+from pypovlib.pypovobjects import *
+from pypovlib.pypovbvh import PovBVH, _PovBVHLink
+
+
+def _union(n):
+    u = PovCSGUnion()
+    for i in range(n):
+        u.add(PovCSGSphere([i,0,0], 0.4))
+    return u
+
+
+def _links(obj):
+    return [p for p in obj._parents if isinstance(p, _PovBVHLink)]
+
+
+def test_close_removes_links():
+    u = _union(4)
+    b = PovBVH(u)
+    assert len(_links(u._items[0])) == 1
+    b.close()
+    assert _links(u._items[0]) == []
+
+
+def test_old_index_is_released():
+    u = _union(4)
+    for k in range(5):
+        b = PovBVH(u)
+        gc.collect()
+    assert len(_links(u._items[0])) <= 2
+    # changes of the objects still work
+    u._items[0].translate = [0,5,0]
+    assert b.query_point([0,5,0]) == [u._items[0]]
+
+
+def test_replaced_item_list():
+    u = _union(4)
+    b = PovBVH(u)
+    s = PovCSGSphere([100,0,0], 1)
+    old = u._items[0]
+    u._items = [s]
+    assert len(b) == 1
+    assert b.query_point([100,0,0]) == [s]
+    assert _links(old) == []
+
+
+def test_unbounded_objects_never_match():
+    s1 = PovCSGSphere([0,0,0], 1)
+    s2 = PovCSGSphere([5,0,0], 1)
+    b = PovBVH([s1, s2, PovCSGMacro('foo')])
+    assert b.nearest([0,0,0], k=3) == [s1, s2]
+    assert b.query_point([0,0,0], radius=np.inf) == [s1, s2]
@@ -0,0 +1,59 @@
+# test_cache.py
+
+# written by: Oliver Cordes 2020-05-16
+
+from pypovlib.pypovobjects import *
+
+
+def _write(f, tmp_path, name):
+    filename = str(tmp_path / name)
+    f.write_povfile(filename)
+    with open(filename) as ff:
+        return ff.read()
+
+
+def test_cache_reuses_unchanged_objects(tmp_path):
+    f = PovFile(cache=True)
+    s = PovCSGSphere([0,0,0], 1)
+    f.add(s)
+
+    first = _write(f, tmp_path, 'a.pov')
+    assert _write(f, tmp_path, 'b.pov') == first
+    assert s._pov_cache is not None
+
+    s.translate = [1,0,0]
+    assert _write(f, tmp_path, 'c.pov') != first
+
+
+def test_cache_texture_change(tmp_path):
+    pigment = PovPigment(color='Red')
+    texture = PovTexture(pigment=pigment)
+    f = PovFile(cache=True)
+    u = PovCSGUnion()
+    s = PovCSGSphere([0,0,0], 1)
+    s.set_texture(texture)
+    u.add(s)
+    f.add(u)
+
+    assert 'color Red' in _write(f, tmp_path, 'a.pov')
+
+    texture.set_pigment(PovPigment(color='Blue'))
+    second = _write(f, tmp_path, 'b.pov')
+    assert 'color Blue' in second
+    assert 'color Red' not in second
+
+
+def test_cache_texture_component_change(tmp_path):
+    finish = PovFinish()
+    finish.ambient = 0.1
+    f = PovFile(cache=True)
+    for i in range(2):
+        s = PovCSGSphere([i,0,0], 1)
+        s.set_texture(PovTexture(finish=finish))
+        f.add(s)
+
+    assert 'ambient 0.100000' in _write(f, tmp_path, 'a.pov')
+
+    finish.ambient = 0.5
+    second = _write(f, tmp_path, 'b.pov')
+    assert second.count('ambient 0.500000') == 2
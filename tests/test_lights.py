@@ -0,0 +1,72 @@
+# test_lights.py
+
+# written by: Oliver Cordes 2020-05-16
+
+import io
+import os
+
+from pypovlib.pypovobjects import *
+from pypovlib.pypovlights import *
+from pypovlib.pypovcamera import PovCamera
+from pypovlib.pypovanimation import PovAnimation
+
+
+def _vector(text):
+    # the first vector after light_source{
+    line = text.split('light_source{', 1)[1].split('\n')[1].strip()
+    return Point3D([float(v) for v in line.strip('<>').split(',')])
+
+
+def _light_position(light):
+    f = io.StringIO()
+    light.write_pov(f)
+    return _vector(f.getvalue())
+
+
+def test_rotate_time_function():
+    l = PovBasicLightObject([10,0,0], 'White')
+    l.set_time_function('rotate', lambda t, f: [0,90*f,0])
+
+    positions = []
+    for fnr in range(3):
+        l.update_properties(fnr * 0.1, fnr)
+        positions.append(_light_position(l))
+
+    assert positions[0] == Point3D([10,0,0])
+    assert positions[1] == Point3D([0,0,-10])
+    assert positions[2] == Point3D([-10,0,0])
+
+
+def test_translate_time_function():
+    l = PovBasicLightObject([0,0,0], 'White')
+    l.set_time_function('translate', lambda t, f: [f,0,0])
+    l.update_properties(0.2, 2)
+
+    f = io.StringIO()
+    l.write_pov(f)
+    assert 'translate <2.000000,0.000000,0.000000>' in f.getvalue()
+
+
+def test_animated_light(tmp_path):
+    a = PovAnimation(directory=str(tmp_path), name_prefix='light')
+    a.set_camera(PovCamera(location=[0,5,-10], look_at=[0,0,0]))
+    b = PovCSGSphere([0,0,0], 1)
+    l = PovSpotLight([10,0,0], 'White', [0,0,0])
+    l.set_time_function('rotate', lambda t, f: [0,90*f,0])
+    b.set_lights(l)
+    a.add(b)
+
+    assert a.needs_timeline() == False
+    a.animate(frames=3, fps=1)
+
+    frames = [open(os.path.join(str(tmp_path), 'light%05i.pov' % fnr)).read()
+              for fnr in range(3)]
+    assert _vector(frames[0]) == Point3D([10,0,0])
+    assert _vector(frames[1]) == Point3D([0,0,-10])
+    assert _vector(frames[2]) == Point3D([-10,0,0])
+
+    # a single frame gives the same file
+    frame = os.path.join(str(tmp_path), 'light00002.pov')
+    os.remove(frame)
+    a.write_frame(2)
+    assert open(frame).read() == frames[2]
@@ -0,0 +1,39 @@
+# test_matrix.py
+
+# written by: Oliver Cordes 2020-05-16
+
+import numpy as np
+
+from pypovlib.pypovbase import *
+
+
+def test_angle_helpers_follow_pov_rotate():
+    p = Point3D([0,1,2])
+    for helper, angles in ((angle_X, [90,0,0]), (angle_Y, [0,30,0]), (angle_Z, [0,0,-45])):
+        m = helper(sum(angles))
+        expected = transform_points(p.xyz, pov_rotate_matrix(angles))[0]
+
+        assert np.allclose(m.apply(p).xyz, expected)
+        assert np.allclose((m * p).xyz, expected)
+
+    assert np.allclose(angle_X(90).apply(Point3D([0,1,0])).xyz, [0,0,1])
+
+
+def test_create_rotation_matrix_follows_pov_rotate():
+    for axis in range(3):
+        vector = np.identity(3)[axis]
+        angles = vector * 37.
+        m = create_rotation_matrix(vector, 37.)
+
+        assert np.allclose(m.matrix, pov_rotate_matrix(angles))
+
+
+def test_compose_and_inverse():
+    rot = angle_X(90)
+    move = Matrix3D(translation=[1,2,3])
+    p = Point3D([0,1,0])
+
+    assert np.allclose((rot @ move).apply(p).xyz, move.apply(rot.apply(p)).xyz)
+    assert np.allclose((rot @ move).inverse().apply((rot @ move).apply(p)).xyz, p.xyz)
+    assert np.allclose((rot @ move).matrix,
+                       pov_rotate_matrix([90,0,0]).dot(pov_translate_matrix([1,2,3])))
@@ -0,0 +1,86 @@
+# test_objects.py
+
+# written by: Oliver Cordes 2020-05-16
+
+from pypovlib.pypovobjects import *
+
+
+def test_collect_macro_defs():
+    s = PovCSGSphere([0,0,0], 1)
+    s.add_macro('#macro A() #end')
+    u = PovCSGUnion()
+    u.add(s)
+    u.add_macro('#macro B() #end')
+    f = PovFile()
+    f.add(u)
+
+    assert u.collect_macro_defs() == ['#macro B() #end', '#macro A() #end']
+    assert f.collect_macro_defs() == ['#macro B() #end', '#macro A() #end']
+
+
+def test_primitive_array_texture_before_matrix():
+    import io
+    from pypovlib.pypovbase import PovEmitter
+
+    s = PovSphereArray([[0,0,0]], 1., colors=[0], palette=['pigment { color Red }'],
+                       matrices=pov_translate_matrix([1,0,0]))
+    e = PovEmitter(io.StringIO())
+    s.write_pov(e)
+    e.flush()
+    line = [l for l in e._ffile.getvalue().splitlines() if 'sphere{' in l][0]
+
+    assert line.index('texture{') < line.index('matrix <')
+    assert s.bounding_box().tolist() == [[0,-1,-1], [2,1,1]]
+    assert PovBoxArray([[1,0,0]], [[0,1,1]]).bounding_box().tolist() == [[0,0,0], [1,1,1]]
+
+
+def test_primitives_have_no_dict():
+    objs = [PovCSGSphere([0,0,0], 1), PovCSGBox([0,0,0], [1,1,1]),
+            PovCSGCylinder([0,0,0], [1,0,0], 1), PovCSGCone([0,0,0], 1, [1,0,0], .5),
+            PovCSGTorus(1, .2), PovTriangle([[0,0,0], [1,0,0], [0,1,0]])]
+    for o in objs:
+        assert not hasattr(o, '__dict__')
+
+    class MySphere(PovCSGSphere):
+        pass
+
+    s = MySphere([0,0,0], 1)
+    s.strength = 2
+    assert s.strength == 2
+
+
+def test_compact_numbers():
+    import io
+    from pypovlib.pypovbase import PovCompactEmitter
+
+    s = PovCSGSphere([0.25,-0.0000001,100], 1.5)
+    s.set_texture('pigment{ image_map{ png "a.png" } }')
+    s.translate = [1.5,0,-2]
+    e = PovCompactEmitter(io.StringIO())
+    s.write_pov(e)
+    e.flush()
+    lines = e._ffile.getvalue().splitlines()
+    assert '<0.25,0,100>, 1.5' in lines
+    assert 'translate <1.5,0,-2>' in lines
+
+
+def test_regroup_keeps_arrays_and_order():
+    u = PovCSGUnion()
+    u.set_array_emission(min_count=4)
+    m1 = PovCSGMacro('A()')
+    u.add(m1)
+    spheres = [PovCSGSphere([i,0,0], 0.4) for i in range(6)]
+    boxes = []
+    for i in range(6):
+        b = PovCSGBox([i,2,0], [i+1,3,1])
+        b.rotate = [0,0,10]
+        boxes.append(b)
+    m2 = PovCSGMacro('B()')
+    u.add(boxes[:3] + spheres + [m2] + boxes[3:])
+
+    assert u.regroup(2) > 0
+    items = u._items
+    # the array items and the unbounded items keep their order
+    assert [i for i in items if not isinstance(i, PovCSGGroup)] == [m1] + spheres + [m2]
+    assert isinstance(items[1], PovCSGGroup)
+    assert len(u._array_groups(None, items)) == 1